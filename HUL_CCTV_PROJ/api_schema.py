@@ -0,0 +1,160 @@
+"""
+API schema and docs. With API_SCHEMA_MODE = 'live', drf_yasg builds the schema by
+introspecting every view on each /swagger/ request. With 'static', workers never import
+drf_yasg: the views' schema decorators are no-ops, and /swagger/, /redoc/ and
+/swagger.json serve the file `manage.py generate_openapi` wrote at deploy time, kept
+in memory and answered with an ETag.
+
+Views import `swagger_auto_schema` and `openapi` from here instead of from drf_yasg.
+"""
+import os
+import hashlib
+import threading
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.templatetags.static import static
+from django.urls import path, reverse
+from django.views.decorators.http import condition
+
+STATIC = getattr(settings, "API_SCHEMA_MODE", "live") == "static"
+
+API_TITLE = "Camera Stream API"
+API_VERSION = "v1"
+API_DESCRIPTION = "API documentation for camera streaming and management"
+
+
+# -----------------------------------------
+# FUNCTION: Decorator Shim
+# -----------------------------------------
+if STATIC:
+    def swagger_auto_schema(*args, **kwargs):
+        return lambda view: view
+
+    class _OpenAPIStub:
+        """Stands in for drf_yasg.openapi: constants and constructors all become None."""
+
+        def __getattr__(self, name):
+            return None if name.isupper() else (lambda *args, **kwargs: None)
+
+    openapi = _OpenAPIStub()
+else:
+    from drf_yasg.utils import swagger_auto_schema  # noqa: F401
+    from drf_yasg import openapi
+
+
+def api_info():
+    return openapi.Info(
+        title=API_TITLE,
+        default_version=API_VERSION,
+        description=API_DESCRIPTION,
+        terms_of_service="https://www.yourapp.com/terms/",
+        contact=openapi.Contact(email="contact@yourapp.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+# -----------------------------------------
+# FUNCTION: Static Schema
+# -----------------------------------------
+class SchemaFile:
+    """The generated schema, re-read only when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.data = None
+        self.etag = None
+
+    def load(self):
+        """Returns True if a schema is available."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path, "rb") as f:
+                    self.data = f.read()
+                self.etag = hashlib.sha1(self.data).hexdigest()
+                self._mtime = mtime
+        return True
+
+
+_schema_file = SchemaFile(getattr(settings, "API_SCHEMA_FILE", ""))
+
+
+def schema_etag(request, *args, **kwargs):
+    return _schema_file.etag if _schema_file.load() else None
+
+
+@condition(etag_func=schema_etag)
+def static_schema(request):
+    if not _schema_file.load():
+        return JsonResponse(
+            {"message": "API schema not generated; run `manage.py generate_openapi`", "status": 503}, status=503
+        )
+    response = HttpResponse(_schema_file.data, content_type="application/json")
+    response["Cache-Control"] = "no-cache"  # Revalidate with the ETag; a redeploy changes it
+    return response
+
+
+SWAGGER_UI_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="{css}"></head>
+<body><div id="swagger-ui"></div>
+<script src="{bundle}"></script><script src="{preset}"></script>
+<script>window.ui = SwaggerUIBundle({{url: "{spec}", dom_id: "#swagger-ui", deepLinking: true,
+presets: [SwaggerUIBundle.presets.apis, SwaggerUIStandalonePreset], layout: "StandaloneLayout"}});</script>
+</body></html>"""
+
+REDOC_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body><redoc spec-url="{spec}"></redoc><script src="{redoc}"></script></body></html>"""
+
+
+def spec_url():
+    return getattr(settings, "SWAGGER_SETTINGS", {}).get("SPEC_URL") or reverse("schema-json")
+
+
+def swagger_ui(request):
+    # The live drf_yasg UI fetches its schema from /swagger/?format=openapi; keep that URL working.
+    if request.GET.get("format") == "openapi":
+        return static_schema(request)
+    return HttpResponse(SWAGGER_UI_PAGE.format(
+        title=API_TITLE,
+        css=static("drf-yasg/swagger-ui-dist/swagger-ui.css"),
+        bundle=static("drf-yasg/swagger-ui-dist/swagger-ui-bundle.js"),
+        preset=static("drf-yasg/swagger-ui-dist/swagger-ui-standalone-preset.js"),
+        spec=spec_url(),
+    ))
+
+
+def redoc_ui(request):
+    return HttpResponse(REDOC_PAGE.format(title=API_TITLE, redoc=static("drf-yasg/redoc/redoc.min.js"), spec=spec_url()))
+
+
+# -----------------------------------------
+# FUNCTION: URL Patterns
+# -----------------------------------------
+def schema_urlpatterns():
+    if STATIC:
+        return [
+            path('swagger.json', static_schema, name='schema-json'),
+            path('swagger/', swagger_ui, name='schema-swagger-ui'),
+            path('redoc/', redoc_ui, name='schema-redoc'),
+        ]
+
+    from rest_framework import permissions
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        api_info(),
+        public=True,
+        permission_classes=[permissions.AllowAny],  # Allow public access to Swagger UI
+    )
+    return [
+        path('swagger.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+        path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+        path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    ]
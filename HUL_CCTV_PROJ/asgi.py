@@ -2,6 +2,9 @@
 ASGI config for HUL_CCTV_PROJ project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections to /ws/streams/ get the multi-camera
+frame transport (see multi_cam_stream.websocket). Serve it with an ASGI server
+that speaks WebSocket, e.g. ``uvicorn HUL_CCTV_PROJ.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +16,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HUL_CCTV_PROJ.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from multi_cam_stream.websocket import WS_PATH, stream_socket  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == WS_PATH:
+            return await stream_socket(scope, receive, send)
+        await receive()
+        return await send({"type": "websocket.close", "code": 1000})  # Rejects the handshake
+    return await django_application(scope, receive, send)
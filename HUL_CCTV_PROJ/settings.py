@@ -1,7 +1,9 @@
 import os
+import json
+import importlib.util
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
-from celery.schedules import crontab
 # Load environment variables from .env file
 load_dotenv()
 
@@ -36,6 +38,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'multi_cam_stream.signing.SignedStreamMiddleware',  # Signed stream URLs skip everything below
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,12 +68,54 @@ TEMPLATES = [
 WSGI_APPLICATION = 'HUL_CCTV_PROJ.wsgi.application'
 
 # Database Configuration (Use .env variables for production settings)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE selects the backend: sqlite (default), postgresql or mysql.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 600))  # Seconds to keep a connection open; 0 closes per request
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 20))  # Seconds a writer waits on a locked database
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'hul_cctv'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+elif DB_ENGINE == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.getenv('DB_NAME', 'hul_cctv'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            },
+        }
+    }
+else:
+    # SQLite runs in WAL mode (see multi_cam_stream.apps) so readers never block the writer.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': SQLITE_BUSY_TIMEOUT,
+            },
+        }
     }
-}
 
 # Password Validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -86,14 +131,117 @@ AUTH_USER_MODEL = 'users.User'
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
-# Celery Beat Schedule (Ping cameras task every 1 hour)
-CELERY_BEAT_SCHEDULE = {
-    'ping-cameras-and-send-report-every-hour': {
-        'task': 'multi_cam_stream.tasks.ping_cameras_and_send_report',  # Path to your task
-        'schedule': crontab(minute=0, hour='*'),  # Every 1 hour
-    },
+# Celery Beat Schedule (camera health is watched continuously by `manage.py monitor_cameras`)
+CELERY_BEAT_SCHEDULE = {}
+
+# Camera Health Monitor
+HEALTH_PROBE_RATE = float(os.getenv('HEALTH_PROBE_RATE', 5))  # Probes per second across all cameras
+HEALTH_NOTIFY_INTERVAL = int(os.getenv('HEALTH_NOTIFY_INTERVAL', 120))  # Seconds between batched change emails
+HEALTH_NOTIFY_EMAILS = [email for email in os.getenv('TO_EMAIL', '').split(',') if email]
+
+# Cluster Stream Placement
+# Leave CLUSTER_NODE_ID empty to run as a single node. Each ingest node needs a unique id and the
+# base URL clients can reach it on, e.g. for two local nodes:
+#   CLUSTER_NODE_ID=a CLUSTER_NODE_URL=http://127.0.0.1:8001 python manage.py runserver 8001
+#   CLUSTER_NODE_ID=b CLUSTER_NODE_URL=http://127.0.0.1:8002 python manage.py runserver 8002
+CLUSTER_NODE_ID = os.getenv('CLUSTER_NODE_ID', '')
+CLUSTER_NODE_URL = os.getenv('CLUSTER_NODE_URL', '')
+CLUSTER_REDIS_URL = os.getenv('CLUSTER_REDIS_URL', 'redis://localhost:6379/2')
+CLUSTER_HEARTBEAT_INTERVAL = int(os.getenv('CLUSTER_HEARTBEAT_INTERVAL', 5))  # Seconds between heartbeats
+CLUSTER_NODE_TTL = int(os.getenv('CLUSTER_NODE_TTL', 15))  # Seconds before a silent node leaves the ring
+CLUSTER_FEED_MODE = os.getenv('CLUSTER_FEED_MODE', 'redirect')  # 'redirect' or 'proxy' for non-local video_feed
+
+# Stream Admission Control
+# Budget for camera streams on this node. New streams beyond it preempt lower-priority ones,
+# wait in a queue or get a 503. Leave the CPU/memory budgets at 0 to derive them from the machine
+# (80% of the cores, 70% of the RAM).
+STREAM_MAX_CONCURRENT = int(os.getenv('STREAM_MAX_CONCURRENT', 30))
+STREAM_CPU_BUDGET = float(os.getenv('STREAM_CPU_BUDGET', 0))  # Cores
+STREAM_MEMORY_BUDGET_MB = float(os.getenv('STREAM_MEMORY_BUDGET_MB', 0))
+STREAM_TARGET_FPS = float(os.getenv('STREAM_TARGET_FPS', 5))  # Per-viewer rate where a camera's profile fps is unknown; clients may ask for less with ?fps=
+STREAM_RTSP_TIMEOUT = float(os.getenv('STREAM_RTSP_TIMEOUT', 10))  # Seconds ffmpeg waits on a silent camera before exiting
+STREAM_RTSP_TIMEOUT_OPTION = os.getenv('STREAM_RTSP_TIMEOUT_OPTION', '-timeout')  # '-stimeout' for ffmpeg 4.x and older
+STREAM_HLS_ROOT = os.getenv('STREAM_HLS_ROOT', '')  # HLS segment directory; defaults to /dev/shm/hul_cctv_hls
+STREAM_PREVIEW_DIR = os.getenv('STREAM_PREVIEW_DIR', '')  # Thumbnail cache; defaults to BASE_DIR/previews
+STREAM_PREVIEW_INTERVAL = int(os.getenv('STREAM_PREVIEW_INTERVAL', 5))  # Minutes between thumbnails of a camera
+STREAM_URL_TTL = int(os.getenv('STREAM_URL_TTL', 3600))  # Seconds a signed stream URL can be opened (HLS players keep refetching it)
+STREAM_REQUIRE_SIGNED_URLS = os.getenv('STREAM_REQUIRE_SIGNED_URLS', 'False') == 'True'
+# Load testing only: an ffmpeg lavfi source every camera stream plays instead of its RTSP URL, e.g.
+#   STREAM_SYNTHETIC_SOURCE='testsrc2=size=1280x720:rate=25'
+STREAM_SYNTHETIC_SOURCE = os.getenv('STREAM_SYNTHETIC_SOURCE', '')
+# Set to an nginx `internal` location prefix to let the proxy send preview and HLS segment bytes, e.g.
+#   location /_protected/hls/ { internal; alias /dev/shm/hul_cctv_hls/; }
+#   location /_protected/previews/ { internal; alias /srv/hul_cctv/previews/; }
+STREAM_ACCEL_REDIRECT_PREFIX = os.getenv('STREAM_ACCEL_REDIRECT_PREFIX', '')
+CELERY_BEAT_SCHEDULE['refresh-camera-previews'] = {
+    'task': 'multi_cam_stream.tasks.refresh_camera_previews',
+    'schedule': timedelta(minutes=STREAM_PREVIEW_INTERVAL),
 }
 
+# Instant Replay
+# Every encoded frame of every stream goes into one shared-memory arena of STREAM_REPLAY_BUDGET_MB per
+# web process (capped to half of free /dev/shm). When it is full the oldest frames of all cameras are
+# evicted first, so a camera's history is STREAM_REPLAY_SECONDS or what the budget holds, whichever is less.
+STREAM_REPLAY_SECONDS = float(os.getenv('STREAM_REPLAY_SECONDS', 60))  # Longest replay or clip
+STREAM_REPLAY_BUDGET_MB = int(os.getenv('STREAM_REPLAY_BUDGET_MB', 256))  # About 60s of 30 cameras at 5 fps, 640x480
+
+# Stream Degradation
+# Cameras stream at the fps, resolution and JPEG quality of their profile (Camera.stream_*). When node CPU
+# or the mean JPEG encode time crosses the HIGH threshold, fps and quality of low-priority cameras are
+# lowered step by step; they are restored once CPU stays under CPU_LOW and encode time under half its limit.
+STREAM_DEGRADATION = os.getenv('STREAM_DEGRADATION', 'True') == 'True'
+STREAM_DEGRADE_CPU_HIGH = float(os.getenv('STREAM_DEGRADE_CPU_HIGH', 0.85))  # Share of all cores busy
+STREAM_DEGRADE_CPU_LOW = float(os.getenv('STREAM_DEGRADE_CPU_LOW', 0.6))
+STREAM_DEGRADE_ENCODE_MS = float(os.getenv('STREAM_DEGRADE_ENCODE_MS', 50))  # Mean per-frame encode time across streams
+
+# Frame Analytics
+# Processors to run on streaming cameras, as JSON mapping a FrameProcessor path to camera ids ([] for all), e.g.
+#   STREAM_ANALYTICS_PROCESSORS='{"multi_cam_stream.analytics.MotionLevelProcessor": [1, 2]}'
+# multi_cam_stream.motion.MotionEventProcessor also records the searchable motion event timeline.
+STREAM_ANALYTICS_PROCESSORS = json.loads(os.getenv('STREAM_ANALYTICS_PROCESSORS', '{}'))
+STREAM_ANALYTICS_WORKERS = int(os.getenv('STREAM_ANALYTICS_WORKERS', 0))  # 0: the cores STREAM_CPU_BUDGET leaves free
+STREAM_MOTION_DIR = os.getenv('STREAM_MOTION_DIR', '')  # Motion event thumbnails; defaults to BASE_DIR/motion
+STREAM_MOTION_RETENTION_DAYS = int(os.getenv('STREAM_MOTION_RETENTION_DAYS', 30))  # 0 keeps motion events forever
+CELERY_BEAT_SCHEDULE['prune-motion-events'] = {
+    'task': 'multi_cam_stream.tasks.prune_motion_events',
+    'schedule': timedelta(hours=1),
+}
+
+# JWT Authentication
+# Login returns an access/refresh pair; API requests send `Authorization: Bearer <access>` and are
+# authenticated from the token's claims without a session or user lookup. Session auth stays as a
+# fallback for the admin and the browsable API.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.CachedJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 1))),
+    'UPDATE_LAST_LOGIN': False,
+}
+JWT_REVOCATION_REDIS_URL = os.getenv('JWT_REVOCATION_REDIS_URL', 'redis://localhost:6379/3')  # Logout/password reset revocation list
+JWT_REVOCATION_CHECK_INTERVAL = int(os.getenv('JWT_REVOCATION_CHECK_INTERVAL', 5))  # Seconds a worker trusts its cached check of a token
+JWT_REVOCATION_FAIL_OPEN = os.getenv('JWT_REVOCATION_FAIL_OPEN', 'False') == 'True'  # Accept tokens unchecked while Redis is down
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv('JWT_CLAIMS_CACHE_SIZE', 2048))  # Decoded tokens kept per worker
+SWAGGER_SETTINGS = {
+    'SECURITY_DEFINITIONS': {'Bearer': {'type': 'apiKey', 'name': 'Authorization', 'in': 'header'}},
+}
+
+# API Schema
+# 'live': drf_yasg introspects every view on each /swagger/ request (development).
+# 'static': workers serve API_SCHEMA_FILE, written at deploy time by `manage.py generate_openapi`
+# (run with API_SCHEMA_MODE=live), and never import drf_yasg; its UI assets are still collected.
+API_SCHEMA_MODE = os.getenv('API_SCHEMA_MODE', 'live')
+API_SCHEMA_FILE = os.getenv('API_SCHEMA_FILE', str(BASE_DIR / 'openapi.json'))
+if API_SCHEMA_MODE == 'static':
+    INSTALLED_APPS.remove('drf_yasg')
+    _drf_yasg_spec = importlib.util.find_spec('drf_yasg')  # Locates the package without importing it
+    if _drf_yasg_spec is not None:
+        STATICFILES_DIRS = [os.path.join(_drf_yasg_spec.submodule_search_locations[0], 'static')]
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOW_CREDENTIALS = True
@@ -105,7 +253,7 @@ CORS_ALLOWED_ORIGINS = [
     "https://www.cctv.indusvision.in",
 ]
 CORS_ALLOW_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
-CORS_ALLOW_HEADERS = ["accept", "accept-encoding", "authorization", "content-type", "dnt", "origin", "user-agent", "x-csrftoken", "x-requested-with"]
+CORS_ALLOW_HEADERS = ["accept", "accept-encoding", "authorization", "content-type", "dnt", "origin", "user-agent", "x-csrftoken", "x-requested-with", "x-stream-session"]
 
 # Email Configuration (Use .env for email settings)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
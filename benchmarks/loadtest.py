@@ -0,0 +1,522 @@
+"""
+End-to-end load test: N simulated dashboard clients against a running server.
+
+Each client bootstraps like the dashboard (seracs -> sections -> cameras), then tours
+the sections: every --tour-interval seconds it calls multi_stream/<section>, drops the
+previous section's feeds and holds the new section's video_feed streams open, counting
+the frames it receives. The report gives request latency percentiles, time to first
+frame, delivered fps per client, error rates and the server's CPU and memory, sampled
+from /proc (Linux) for the server process and all its children (stream workers, ffmpeg).
+
+Against a throwaway server with synthetic cameras (no RTSP needed), from the repo root:
+
+    python benchmarks/loadtest.py --spawn --db /tmp/loadtest.sqlite3 --seed 4x6 --clients 20 --duration 120
+
+--spawn starts `manage.py runserver` with STREAM_SYNTHETIC_SOURCE set, so every camera
+plays an ffmpeg test pattern; --seed creates a "Load test" serac with 4 sections of 6
+cameras. Against a server that is already running:
+
+    python benchmarks/loadtest.py --url http://10.0.0.5:8000 --server-pid 4242 --serac "Load test"
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from multi_cam_stream.tracing import percentile  # Stdlib only; the same p50/p95 as the server's trace summary
+
+SYNTHETIC_SOURCE = "testsrc2=size=1280x720:rate=25"
+SEED_SERAC = "Load test"
+REQUEST_TIMEOUT = 30  # Seconds for one API request
+FIRST_FRAME_TIMEOUT = 30  # Seconds a feed may take to deliver its first frame
+FRAME_TIMEOUT = 15  # Seconds without a frame before a feed counts as stalled
+HEARTBEAT_INTERVAL = 20  # Seconds; the server expires stream sessions after 60 s without one
+SAMPLE_INTERVAL = 1.0  # Seconds between server resource samples
+SERVER_START_TIMEOUT = 30
+SHUTDOWN_GRACE = 15  # Seconds past --duration before stuck clients are cancelled
+
+# Creates (or reuses) the seed serac, its sections and cameras; prints nothing on success.
+_SEED = (
+    "import os, sys, django; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HUL_CCTV_PROJ.settings'); django.setup();"
+    "from django.core.management import call_command; call_command('migrate', verbosity=0);"
+    "from multi_cam_stream.models import Seracs, Section, Camera;"
+    "sections, cameras = map(int, sys.argv[1].split('x'));"
+    "serac, _ = Seracs.objects.get_or_create(name=sys.argv[2]);"
+    "[Camera.objects.get_or_create("
+    " name=f'load-{s}-{c}', section=Section.objects.get_or_create(name=f'{sys.argv[2]} {s}', serac=serac)[0],"
+    " defaults={'ip_address': '127.0.0.1', 'is_active': True})"
+    " for s in range(1, sections + 1) for c in range(1, cameras + 1)]"
+)
+
+
+# -----------------------------------------
+# Measurements
+# -----------------------------------------
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # {request name: [seconds]}
+        self.requests = Counter()
+        self.errors = Counter()  # {(request name, kind)}
+        self.feeds = defaultdict(list)  # {client: [(frames, seconds open)]}
+
+    def record(self, name, seconds):
+        self.requests[name] += 1
+        self.latencies[name].append(seconds)
+
+    def error(self, name, kind):
+        self.requests[name] += 1
+        self.errors[(name, kind)] += 1
+
+
+def percentiles(values):
+    """Nearest-rank latency percentiles in ms, as in the server's trace summary."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p90_ms": round(percentile(ordered, 90) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+class ResourceSampler:
+    """CPU and RSS of a process and its descendants, read from /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.samples = []  # (cpu cores busy, rss MB, processes, ffmpeg processes)
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_mb = os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+    def _tree(self):
+        """{pid: (name, cpu ticks, rss pages)} for the process and all its descendants."""
+        procs, children = {}, defaultdict(list)
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            name = stat[stat.index("(") + 1:stat.rindex(")")]
+            fields = stat[stat.rindex(")") + 2:].split()
+            pid = int(entry)
+            procs[pid] = (name, int(fields[11]) + int(fields[12]), int(fields[21]))
+            children[int(fields[1])].append(pid)
+        tree, stack = {}, [self.pid]
+        while stack:
+            pid = stack.pop()
+            if pid in procs:
+                tree[pid] = procs[pid]
+                stack.extend(children[pid])
+        return tree
+
+    async def run(self):
+        previous, previous_at = self._tree(), time.monotonic()
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            tree, now = self._tree(), time.monotonic()
+            ticks = sum(cpu - previous.get(pid, (None, 0))[1] for pid, (_, cpu, _) in tree.items())
+            self.samples.append((
+                ticks / self._clock_ticks / (now - previous_at),
+                sum(rss for *_, rss in tree.values()) * self._page_mb,
+                len(tree),
+                sum(1 for name, *_ in tree.values() if name == "ffmpeg"),
+            ))
+            previous, previous_at = tree, now
+
+    def summary(self):
+        if not self.samples:
+            return None
+        cpu, rss, processes, ffmpeg = zip(*self.samples)
+        return {
+            "cpu_cores_avg": round(statistics.mean(cpu), 2),
+            "cpu_cores_peak": round(max(cpu), 2),
+            "rss_mb_avg": round(statistics.mean(rss), 1),
+            "rss_mb_peak": round(max(rss), 1),
+            "processes_peak": max(processes),
+            "ffmpeg_peak": max(ffmpeg),
+            "machine_cores": os.cpu_count(),
+        }
+
+
+# -----------------------------------------
+# HTTP
+# -----------------------------------------
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+async def open_request(base_url, method, path, headers=None, body=None):
+    """Sends one HTTP/1.1 request on a new connection; returns (status, headers, reader, writer)."""
+    parts = urlsplit(base_url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    if body is not None:
+        lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = (await reader.readline()).strip()
+        if not line:
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    return status, response_headers, reader, writer
+
+
+async def read_body(response_headers, reader):
+    if "content-length" in response_headers:
+        return await reader.readexactly(int(response_headers["content-length"]))
+    return await reader.read()
+
+
+async def read_part(reader):
+    """Reads one multipart/x-mixed-replace part; returns its size, or None at EOF."""
+    length = None
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return length
+
+
+# -----------------------------------------
+# Simulated Dashboard Client
+# -----------------------------------------
+class DashboardClient:
+    def __init__(self, index, args, stats):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.headers = {}
+        self.session_id = None
+        self.feeds = []  # Running feed tasks of the current section
+
+    async def call(self, name, method, path, body=None):
+        """One API request, timed; returns the decoded JSON or None after recording the error."""
+        started = time.perf_counter()
+        writer = None
+        try:
+            status, headers, reader, writer = await asyncio.wait_for(
+                open_request(self.args.url, method, path, self.headers, body), REQUEST_TIMEOUT
+            )
+            data = await asyncio.wait_for(read_body(headers, reader), REQUEST_TIMEOUT)
+            if status >= 400:
+                raise HTTPError(status)
+            result = json.loads(data) if data else {}
+        except HTTPError as e:
+            self.stats.error(name, str(e.status))
+            return None
+        except asyncio.TimeoutError:
+            self.stats.error(name, "timeout")
+            return None
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            self.stats.error(name, type(e).__name__)
+            return None
+        finally:
+            if writer is not None:
+                writer.close()
+        self.stats.record(name, time.perf_counter() - started)
+        return result
+
+    async def login(self):
+        body = json.dumps({"username": self.args.username, "password": self.args.password}).encode()
+        data = await self.call("login", "POST", "/api/login/", body)
+        if data:
+            self.headers["Authorization"] = f"Bearer {data['results']['access']}"
+
+    async def bootstrap(self):
+        """Walks seracs -> sections -> cameras like the dashboard; returns the section ids to tour."""
+        seracs = (await self.call("seracs", "GET", "/api/seracs/") or {}).get("results", [])
+        if self.args.serac:
+            seracs = [s for s in seracs if self.args.serac in (str(s["id"]), s["name"])]
+        section_ids = []
+        for serac in seracs:
+            data = await self.call("sections", "GET", f"/api/sections/?serac_id={serac['id']}") or {}
+            section_ids += [section["id"] for section in data.get("results", [])]
+        if section_ids:
+            await self.call("cameras", "GET", f"/api/cameras/?section_id={section_ids[0]}")
+        return section_ids
+
+    async def switch(self, section_id):
+        if self.session_id:
+            self.headers["X-Stream-Session"] = self.session_id
+        data = await self.call("multi_stream", "GET", f"/api/multi_stream/{section_id}/")
+        await self.stop_feeds()
+        if not data:
+            return
+        self.session_id = data.get("session_id")
+        streams = list(data.get("streams", {}).items())[:self.args.grid or None]
+        self.feeds = [asyncio.create_task(self.feed(url)) for _, url in streams]
+
+    async def stop_feeds(self):
+        for task in self.feeds:
+            task.cancel()
+        await asyncio.gather(*self.feeds, return_exceptions=True)
+        self.feeds = []
+
+    async def feed(self, url):
+        """Holds one video_feed open, counting frames, until cancelled."""
+        path = url if url.startswith("/") else urlsplit(url)._replace(scheme="", netloc="").geturl()
+        if self.args.fps:
+            path += ("&" if "?" in path else "?") + urlencode({"fps": self.args.fps})
+        started = time.perf_counter()
+        frames, opened_at, writer = 0, None, None
+        try:
+            status, headers, reader, writer = await asyncio.wait_for(
+                open_request(self.args.url, "GET", path, self.headers), REQUEST_TIMEOUT
+            )
+            if status != 200:
+                self.stats.error("video_feed", str(status))
+                return
+            if await asyncio.wait_for(read_part(reader), FIRST_FRAME_TIMEOUT) is None:
+                self.stats.error("video_feed", "closed")
+                return
+            opened_at = time.perf_counter()
+            frames = 1
+            self.stats.record("first_frame", opened_at - started)
+            while True:
+                if await asyncio.wait_for(read_part(reader), FRAME_TIMEOUT) is None:
+                    self.stats.error("video_feed", "closed")
+                    return
+                frames += 1
+        except asyncio.CancelledError:
+            pass  # Section switched or the test ended
+        except asyncio.TimeoutError:
+            self.stats.error("video_feed", "stalled" if opened_at else "no_first_frame")
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            self.stats.error("video_feed", type(e).__name__)
+        finally:
+            if writer is not None:
+                writer.close()
+            if opened_at is not None:
+                self.stats.feeds[self.index].append((frames, time.perf_counter() - opened_at))
+
+    async def run(self, deadline):
+        await asyncio.sleep(random.uniform(0, self.args.ramp_up))
+        if self.args.username:
+            await self.login()
+        section_ids = await self.bootstrap()
+        if not section_ids:
+            self.stats.error("bootstrap", "no_sections")
+            return
+        # Clients start at different sections, as operators in different areas would.
+        tour = section_ids[self.index % len(section_ids):] + section_ids[:self.index % len(section_ids)]
+        step = 0
+        try:
+            while time.monotonic() < deadline:
+                await self.switch(tour[step % len(tour)])
+                step += 1
+                stay_until = min(deadline, time.monotonic() + self.args.tour_interval * random.uniform(0.8, 1.2))
+                while time.monotonic() < stay_until:
+                    await asyncio.sleep(min(HEARTBEAT_INTERVAL, max(stay_until - time.monotonic(), 0)))
+                    if self.session_id and time.monotonic() < stay_until:
+                        await self.call("heartbeat", "POST", "/api/multi_stream/heartbeat/")
+        finally:
+            await self.stop_feeds()
+            if self.session_id:
+                await self.call("leave", "POST", "/api/multi_stream/leave/")
+
+
+# -----------------------------------------
+# Server
+# -----------------------------------------
+def seed(args):
+    subprocess.run([sys.executable, "-W", "ignore", "-c", _SEED, args.seed, SEED_SERAC],
+                   cwd=ROOT, env=server_env(args), check=True)
+    if not args.serac:
+        args.serac = SEED_SERAC
+
+
+def server_env(args):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SECRET_KEY", "load-test")
+    env.setdefault("STREAM_SYNTHETIC_SOURCE", SYNTHETIC_SOURCE)
+    if args.db:
+        env["DB_NAME"] = args.db
+    return env
+
+
+def spawn_server(args):
+    """Starts runserver in its own process group, so stream workers and ffmpeg are stopped with it."""
+    port = urlsplit(args.url).port or 80
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"],
+        cwd=ROOT, env=server_env(args), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    started = time.monotonic()
+    while time.monotonic() - started < SERVER_START_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), 1).close()
+            return process
+        except OSError:
+            time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f"Server did not listen on port {port} within {SERVER_START_TIMEOUT}s")
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+# -----------------------------------------
+# Report
+# -----------------------------------------
+def build_report(args, stats, sampler, elapsed):
+    per_client = []
+    for client in range(args.clients):
+        feeds = stats.feeds.get(client, [])
+        # Frames after the first over the time since it arrived, weighted by how long each feed stayed open.
+        open_seconds = sum(seconds for _, seconds in feeds)
+        per_client.append({
+            "feeds": len(feeds),
+            "frames": sum(frames for frames, _ in feeds),
+            "fps_per_feed": round(sum(frames - 1 for frames, _ in feeds) / open_seconds, 2) if open_seconds else 0.0,
+        })
+    fps = [client["fps_per_feed"] for client in per_client]
+    total_requests = sum(stats.requests.values())
+    return {
+        "config": {
+            "url": args.url, "clients": args.clients, "duration_s": args.duration, "tour_interval_s": args.tour_interval,
+            "grid": args.grid, "fps": args.fps, "serac": args.serac,
+        },
+        "elapsed_s": round(elapsed, 1),
+        "latency": {name: percentiles(values) for name, values in sorted(stats.latencies.items())},
+        "fps_per_client": {
+            "min": round(min(fps), 2) if fps else None,
+            "p50": round(percentile(sorted(fps), 50), 2) if fps else None,
+            "max": round(max(fps), 2) if fps else None,
+            "frames_total": sum(client["frames"] for client in per_client),
+            "frames_per_second_total": round(sum(client["frames"] for client in per_client) / elapsed, 1),
+        },
+        "errors": {
+            "total": sum(stats.errors.values()),
+            "rate": round(sum(stats.errors.values()) / total_requests, 4) if total_requests else 0.0,
+            "by_kind": {f"{name} {kind}": count for (name, kind), count in stats.errors.most_common()},
+        },
+        "server": sampler.summary() if sampler else None,
+        "clients": per_client,
+    }
+
+
+def print_report(report):
+    config = report["config"]
+    print(f"{config['clients']} clients for {report['elapsed_s']}s against {config['url']}, "
+          f"switching sections every ~{config['tour_interval_s']}s")
+    print(f"\n{'request':<14} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, row in report["latency"].items():
+        print(f"{name:<14} {row['count']:>7} {row['p50_ms']:>9} {row['p90_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+
+    fps = report["fps_per_client"]
+    print(f"\ndelivered fps per feed, by client: min {fps['min']}  p50 {fps['p50']}  max {fps['max']}  "
+          f"({fps['frames_total']} frames, {fps['frames_per_second_total']} frames/s in total)")
+
+    errors = report["errors"]
+    print(f"errors: {errors['total']} ({errors['rate'] * 100:.2f}% of requests)")
+    for kind, count in errors["by_kind"].items():
+        print(f"  {kind:<30} {count:>6}")
+
+    server = report["server"]
+    if server:
+        print(f"server: CPU {server['cpu_cores_avg']} cores avg, {server['cpu_cores_peak']} peak "
+              f"(of {server['machine_cores']}); RSS {server['rss_mb_avg']} MB avg, {server['rss_mb_peak']} MB peak; "
+              f"{server['processes_peak']} processes, {server['ffmpeg_peak']} ffmpeg at peak")
+    else:
+        print("server: not sampled (use --spawn or --server-pid)")
+
+
+async def run(args, server_pid):
+    stats = Stats()
+    sampler = ResourceSampler(server_pid) if server_pid else None
+    sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+    started = time.monotonic()
+    deadline = started + args.duration
+    clients = [DashboardClient(i, args, stats).run(deadline) for i in range(args.clients)]
+    await asyncio.gather(
+        *(asyncio.wait_for(client, args.duration + args.ramp_up + SHUTDOWN_GRACE) for client in clients),
+        return_exceptions=True,
+    )
+    if sampler_task:
+        sampler_task.cancel()
+    return build_report(args, stats, sampler, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--tour-interval", type=float, default=20, help="Seconds on a section before switching (+-20%%)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Clients start spread over this many seconds")
+    parser.add_argument("--grid", type=int, default=0, help="Feeds a client opens per section (0: all)")
+    parser.add_argument("--fps", type=float, help="?fps= requested on every feed")
+    parser.add_argument("--serac", help="Tour only this serac (id or name)")
+    parser.add_argument("--username", help="Log in and send a bearer token")
+    parser.add_argument("--password")
+    parser.add_argument("--server-pid", type=int, help="Sample CPU/RSS of this process and its children")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a local runserver with synthetic cameras on --url's port and stop it afterwards")
+    parser.add_argument("--db", help="DB_NAME for --spawn and --seed (use a scratch SQLite file)")
+    parser.add_argument("--seed", metavar="SECTIONSxCAMERAS",
+                        help=f"Create a '{SEED_SERAC}' serac with this many sections and cameras per section")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args)
+    server = spawn_server(args) if args.spawn else None
+    try:
+        report = asyncio.run(run(args, server.pid if server else args.server_pid))
+    finally:
+        if server:
+            stop_server(server)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Startup benchmark for the web, Celery and management entry points.
+
+Each entry point is run in a fresh interpreter several times. For every run we
+record wall time, peak RSS of the interpreter, whether cv2/numpy got imported
+and how many child processes it left behind (a Manager started at import time
+shows up here). Run from the repository root:
+
+    python benchmarks/startup.py --runs 5
+
+Settings come from the environment, so e.g. `API_SCHEMA_MODE=static` measures workers
+that serve the pre-generated OpenAPI schema without importing drf_yasg.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Printed by every probe as its last line, so the harness can read what was loaded.
+_REPORT = (
+    "import sys, json, multiprocessing;"
+    "print(json.dumps({"
+    "'cv2': 'cv2' in sys.modules, 'numpy': 'numpy' in sys.modules, 'drf_yasg': 'drf_yasg' in sys.modules,"
+    "'children': len(multiprocessing.active_children())}))"
+)
+
+ENTRY_POINTS = {
+    # What a WSGI worker does before serving its first request.
+    "web": (
+        "import django, os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HUL_CCTV_PROJ.settings');"
+        "from HUL_CCTV_PROJ.wsgi import application;"
+        "from django.urls import get_resolver; get_resolver().url_patterns;"
+    ),
+    # What `celery -A HUL_CCTV_PROJ worker` does before consuming tasks.
+    "celery": (
+        "import django, os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HUL_CCTV_PROJ.settings');"
+        "django.setup(); from HUL_CCTV_PROJ.celery import app; app.loader.import_default_modules();"
+    ),
+    # `manage.py check` runs system checks, which import the URLconf.
+    "manage": (
+        "import os, sys; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HUL_CCTV_PROJ.settings');"
+        "from django.core.management import execute_from_command_line;"
+        "execute_from_command_line(['manage.py', 'check']);"
+    ),
+}
+
+
+def run_once(code):
+    """Runs one probe; returns wall seconds, peak RSS in MB and the probe's report."""
+    # Output goes to files, not pipes: a probe that wrote more than a pipe holds (a long traceback, check
+    # warnings) would block on it while the harness waits for it to exit.
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-W", "ignore", "-c", code + _REPORT],
+            cwd=ROOT,
+            stdout=out,
+            stderr=err,
+        )
+        # wait4 gives the rusage of exactly this child, so runs do not blur into each other.
+        _, exit_status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(exit_status)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode(errors="replace")
+        stderr = err.read().decode(errors="replace")
+    if process.returncode != 0:
+        raise RuntimeError(f"Probe failed with exit code {process.returncode}:\n{stderr}")
+    report = json.loads(stdout.strip().splitlines()[-1])
+    return wall, rusage.ru_maxrss / 1024.0, report
+
+
+def benchmark(names, runs):
+    results = {}
+    for name in names:
+        walls, rss, report = [], [], None
+        for _ in range(runs):
+            wall, peak_rss, report = run_once(ENTRY_POINTS[name])
+            walls.append(wall)
+            rss.append(peak_rss)
+        results[name] = {
+            "wall_ms_median": round(statistics.median(walls) * 1000, 1),
+            "wall_ms_min": round(min(walls) * 1000, 1),
+            "peak_rss_mb_median": round(statistics.median(rss), 1),
+            **report,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--entry", choices=sorted(ENTRY_POINTS), action="append")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SECRET_KEY", "startup-benchmark")
+    results = benchmark(args.entry or list(ENTRY_POINTS), args.runs)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'entry':<8} {'wall ms (median)':>17} {'wall ms (min)':>14} {'RSS MB':>8} "
+          f"{'cv2':>5} {'numpy':>6} {'drf_yasg':>9} {'children':>9}")
+    for name, row in results.items():
+        print(f"{name:<8} {row['wall_ms_median']:>17} {row['wall_ms_min']:>14} {row['peak_rss_mb_median']:>8} "
+              f"{str(row['cv2']):>5} {str(row['numpy']):>6} {str(row['drf_yasg']):>9} {row['children']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Seracs, Section, Camera
+from .models import Seracs, Section, Camera, CameraHealthEvent, MotionEvent
 
 
 @admin.register(Seracs)
@@ -15,6 +15,20 @@ class SectionAdmin(admin.ModelAdmin):
 
 @admin.register(Camera)
 class CameraAdmin(admin.ModelAdmin):
-    list_display = ('id' ,'name', 'ip_address', 'port', 'is_active', 'section')
-    list_editable = ('is_active',)
+    list_display = ('id' ,'name', 'ip_address', 'port', 'is_active', 'section', 'stream_fps', 'jpeg_quality', 'stream_priority')
+    list_editable = ('is_active', 'stream_priority')
     ordering = ('id',)
+
+
+@admin.register(CameraHealthEvent)
+class CameraHealthEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'camera', 'state', 'occurred_at', 'detail')
+    list_filter = ('state',)
+    ordering = ('-occurred_at',)
+
+
+@admin.register(MotionEvent)
+class MotionEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'camera', 'start_time', 'end_time', 'peak_intensity')
+    list_filter = ('camera',)
+    ordering = ('-start_time',)
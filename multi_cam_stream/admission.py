@@ -0,0 +1,333 @@
+import os
+import time
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+PRIORITIES = {
+    "grid": 10,  # Thumbnails in a section grid
+    "full": 20,  # Single camera opened in full view
+}
+DEFAULT_PRIORITY = PRIORITIES["grid"]
+MIN_PRIORITY = min(PRIORITIES.values())
+MAX_PRIORITY = max(PRIORITIES.values())
+DEFAULT_STREAM_CPU = 0.35  # Cores per stream assumed until real usage is measured
+DEFAULT_STREAM_MEMORY_MB = 120  # Resident MB per stream assumed until measured
+SAMPLE_INTERVAL = 5  # Seconds between /proc samples
+COST_SMOOTHING = 0.3  # EWMA weight of the newest sample
+QUEUE_TTL = 30  # Seconds a queued request waits before it is dropped
+MAX_QUEUE_LENGTH = 50
+RETRY_AFTER = 5  # Seconds clients are told to wait when queued or rejected
+
+ADMITTED = "admitted"
+QUEUED = "queued"
+REJECTED = "rejected"
+
+INGEST = "ingest"  # Kind of a camera's ingest worker; its admission key is the bare camera id
+HLS_REMUX = "hls"  # Kind of a camera's HLS remux; keyed (HLS_REMUX, camera_id)
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def parse_priority(value, default=DEFAULT_PRIORITY):
+    """
+    Accepts a priority name ("grid", "full") or a number. Numbers are clamped to the
+    range of the named priorities, so no client can outrank a full view.
+    """
+    if value in (None, ""):
+        return default
+    if str(value).lower() in PRIORITIES:
+        return PRIORITIES[str(value).lower()]
+    try:
+        return min(max(int(value), MIN_PRIORITY), MAX_PRIORITY)
+    except (TypeError, ValueError, OverflowError):
+        return default
+
+
+def split_stream_key(key):
+    """Returns (kind, camera_id) for an admission key: a camera id, or a (kind, camera_id) tuple."""
+    return key if isinstance(key, tuple) else (INGEST, key)
+
+
+def read_process_usage(pid):
+    """Returns (cpu seconds used so far, resident MB) for a pid, or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    # Fields after "(comm)": utime and stime are the 12th and 13th.
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return cpu_seconds, resident_pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def default_memory_budget_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) / 1024 * 0.7
+    except OSError:
+        pass
+    return 0  # Unknown; memory is then not enforced
+
+
+class AdmissionDecision:
+    def __init__(self, state, camera_id, priority, preempted=(), reason=""):
+        self.state = state
+        self.camera_id = camera_id
+        self.priority = priority
+        self.preempted = list(preempted)
+        self.reason = reason
+
+    @property
+    def admitted(self):
+        return self.state == ADMITTED
+
+    def as_dict(self):
+        return {"state": self.state, "priority": self.priority, "reason": self.reason}
+
+
+class AdmissionController:
+    """
+    Decides whether a camera stream may start on this node.
+
+    Each running stream has a priority (the highest priority any viewer asked
+    for) and a measured CPU/memory cost. A new stream is admitted if it fits
+    the node budget and MAX_CONCURRENT_STREAMS; otherwise lower-priority
+    streams are preempted to make room, or the request is queued or rejected.
+    Preempted and queued streams start again, by priority, as capacity frees up.
+
+    Ingest workers are keyed by camera id; other per-camera processes that share
+    the budget, such as HLS remuxes, by (kind, camera_id) — see split_stream_key().
+    """
+
+    def __init__(self, max_streams, cpu_budget, memory_budget_mb, keep_queued=None):
+        self.max_streams = max_streams
+        self.cpu_budget = cpu_budget
+        self.memory_budget_mb = memory_budget_mb
+        self.keep_queued = keep_queued  # Callable; queued cameras it returns True for never expire
+        self._streams = {}  # {camera_id: {"priority", "cpu", "memory_mb", "admitted_at", "url", "usage"}}
+        self._queue = {}  # {camera_id: {"priority", "url", "queued_at"}}
+        self._lock = threading.Lock()
+        self.preemptions = 0
+        self.rejections = 0
+
+    @classmethod
+    def from_settings(cls, max_streams, keep_queued=None):
+        return cls(
+            max_streams=getattr(settings, "STREAM_MAX_CONCURRENT", max_streams),
+            cpu_budget=getattr(settings, "STREAM_CPU_BUDGET", 0) or (os.cpu_count() or 1) * 0.8,
+            memory_budget_mb=getattr(settings, "STREAM_MEMORY_BUDGET_MB", 0) or default_memory_budget_mb(),
+            keep_queued=keep_queued,
+        )
+
+    # --- cost model -------------------------------------------------------
+    def _estimated_cost(self):
+        measured = [s for s in self._streams.values() if s["usage"] is not None]
+        if not measured:
+            return DEFAULT_STREAM_CPU, DEFAULT_STREAM_MEMORY_MB
+        cpu = sum(s["cpu"] for s in measured) / len(measured)
+        memory = sum(s["memory_mb"] for s in measured) / len(measured)
+        return max(cpu, 0.01), max(memory, 1)
+
+    def _used(self):
+        cpu = sum(s["cpu"] for s in self._streams.values())
+        memory = sum(s["memory_mb"] for s in self._streams.values())
+        return cpu, memory
+
+    def _fits(self, cpu, memory, freed_cpu=0.0, freed_memory=0.0, freed_slots=0):
+        used_cpu, used_memory = self._used()
+        if len(self._streams) - freed_slots + 1 > self.max_streams:
+            return False
+        if used_cpu - freed_cpu + cpu > self.cpu_budget:
+            return False
+        if self.memory_budget_mb and used_memory - freed_memory + memory > self.memory_budget_mb:
+            return False
+        return True
+
+    # --- decisions --------------------------------------------------------
+    def request(self, camera_id, priority, url=None, allow_queue=True):
+        with self._lock:
+            stream = self._streams.get(camera_id)
+            if stream is not None:
+                stream["priority"] = max(stream["priority"], priority)
+                return AdmissionDecision(ADMITTED, camera_id, stream["priority"], reason="already running")
+
+            cpu, memory = self._estimated_cost()
+            if self._fits(cpu, memory):
+                self._admit(camera_id, priority, url, cpu, memory)
+                return AdmissionDecision(ADMITTED, camera_id, priority)
+
+            victims = self._pick_victims(priority, cpu, memory)
+            if victims is not None:
+                for victim in victims:
+                    victim_stream = self._streams.pop(victim)
+                    self._enqueue(victim, victim_stream["priority"], victim_stream["url"])
+                self.preemptions += len(victims)
+                self._admit(camera_id, priority, url, cpu, memory)
+                logger.warning(f"Preempted cameras {victims} (lower priority) to admit camera {camera_id} at priority {priority}")
+                return AdmissionDecision(ADMITTED, camera_id, priority, preempted=victims, reason="preempted lower priority")
+
+            if allow_queue and len(self._queue) < MAX_QUEUE_LENGTH:
+                self._enqueue(camera_id, priority, url)
+                return AdmissionDecision(QUEUED, camera_id, priority, reason="node at capacity")
+
+            self.rejections += 1
+            return AdmissionDecision(REJECTED, camera_id, priority, reason="node at capacity")
+
+    def _admit(self, camera_id, priority, url, cpu, memory):
+        self._queue.pop(camera_id, None)
+        self._streams[camera_id] = {
+            "priority": priority, "cpu": cpu, "memory_mb": memory,
+            "admitted_at": time.time(), "url": url, "usage": None,
+        }
+
+    def _enqueue(self, camera_id, priority, url):
+        queued = self._queue.get(camera_id)
+        if queued:
+            queued["priority"] = max(queued["priority"], priority)
+            queued["queued_at"] = time.time()
+            return
+        self._queue[camera_id] = {"priority": priority, "url": url, "queued_at": time.time()}
+
+    def _pick_victims(self, priority, cpu, memory):
+        """Lowest-priority, most expensive streams first, until the newcomer fits; None if impossible."""
+        candidates = sorted(
+            ((cid, s) for cid, s in self._streams.items() if s["priority"] < priority),
+            key=lambda item: (item[1]["priority"], -item[1]["cpu"]),
+        )
+        victims, freed_cpu, freed_memory = [], 0.0, 0.0
+        for camera_id, stream in candidates:
+            victims.append(camera_id)
+            freed_cpu += stream["cpu"]
+            freed_memory += stream["memory_mb"]
+            if self._fits(cpu, memory, freed_cpu, freed_memory, len(victims)):
+                return victims
+        return None
+
+    def release(self, camera_id):
+        """Frees a stream's share; returns queued (camera_id, url, priority) entries that now fit."""
+        with self._lock:
+            self._streams.pop(camera_id, None)
+            return self._drain_queue()
+
+    def _drain_queue(self):
+        now = time.time()
+        for camera_id, queued in list(self._queue.items()):
+            if now - queued["queued_at"] > QUEUE_TTL and not (self.keep_queued and self.keep_queued(camera_id)):
+                self._queue.pop(camera_id)
+
+        ready = []
+        cpu, memory = self._estimated_cost()
+        for camera_id, queued in sorted(self._queue.items(), key=lambda item: -item[1]["priority"]):
+            if queued["url"] is None or not self._fits(cpu, memory):
+                continue
+            self._admit(camera_id, queued["priority"], queued["url"], cpu, memory)
+            ready.append((camera_id, queued["url"], queued["priority"]))
+        return ready
+
+    def is_admitted(self, camera_id):
+        with self._lock:
+            return camera_id in self._streams
+
+    def running_longer_than(self, seconds):
+        """Admitted camera ids that have been running for more than `seconds`."""
+        cutoff = time.time() - seconds
+        with self._lock:
+            return [camera_id for camera_id, stream in self._streams.items() if stream["admitted_at"] < cutoff]
+
+    # --- measurement ------------------------------------------------------
+    def sample(self, pids_for_camera):
+        """
+        Updates per-stream cost from /proc. `pids_for_camera(camera_id)` returns
+        the pids that belong to a stream (worker and ffmpeg).
+        Returns camera ids that are admitted but no longer have a live process.
+        """
+        now = time.time()
+        with self._lock:
+            streams = list(self._streams.items())
+
+        gone = []
+        for camera_id, stream in streams:
+            usages = [read_process_usage(pid) for pid in pids_for_camera(camera_id)]
+            usages = [usage for usage in usages if usage is not None]
+            if not usages:
+                if now - stream["admitted_at"] > SAMPLE_INTERVAL * 2:
+                    gone.append(camera_id)
+                continue
+            cpu_seconds = sum(usage[0] for usage in usages)
+            memory_mb = sum(usage[1] for usage in usages)
+            with self._lock:
+                if camera_id not in self._streams:
+                    continue
+                previous = stream["usage"]
+                stream["usage"] = (now, cpu_seconds)
+                stream["memory_mb"] = memory_mb
+                if previous is not None and now > previous[0]:
+                    cores = max(cpu_seconds - previous[1], 0) / (now - previous[0])
+                    stream["cpu"] = COST_SMOOTHING * cores + (1 - COST_SMOOTHING) * stream["cpu"]
+        return gone
+
+    def snapshot(self):
+        with self._lock:
+            used_cpu, used_memory = self._used()
+            estimated_cpu, estimated_memory = self._estimated_cost()
+            return {
+                "budget": {
+                    "max_streams": self.max_streams,
+                    "cpu_cores": round(self.cpu_budget, 2),
+                    "memory_mb": round(self.memory_budget_mb, 1),
+                },
+                "used": {
+                    "streams": len(self._streams),
+                    "cpu_cores": round(used_cpu, 2),
+                    "memory_mb": round(used_memory, 1),
+                },
+                "estimated_stream_cost": {"cpu_cores": round(estimated_cpu, 3), "memory_mb": round(estimated_memory, 1)},
+                "streams": [
+                    {
+                        "camera_id": split_stream_key(key)[1],
+                        "kind": split_stream_key(key)[0],
+                        "priority": stream["priority"],
+                        "cpu_cores": round(stream["cpu"], 3),
+                        "memory_mb": round(stream["memory_mb"], 1),
+                        "measured": stream["usage"] is not None,
+                        "running_seconds": round(time.time() - stream["admitted_at"], 1),
+                    }
+                    for key, stream in sorted(self._streams.items(), key=lambda item: split_stream_key(item[0]))
+                ],
+                "queue": [
+                    {"camera_id": split_stream_key(key)[1], "kind": split_stream_key(key)[0], "priority": queued["priority"],
+                     "waiting_seconds": round(time.time() - queued["queued_at"], 1)}
+                    for key, queued in sorted(self._queue.items(), key=lambda item: -item[1]["priority"])
+                ],
+                "preemptions": self.preemptions,
+                "rejections": self.rejections,
+            }
+
+
+def start_admission_sampler(controller, pids_for_camera, on_gone, interval=SAMPLE_INTERVAL):
+    """Starts a daemon thread that measures stream cost and reconciles streams that died on their own."""
+
+    def sample():
+        while True:
+            time.sleep(interval)
+            try:
+                gone = controller.sample(pids_for_camera)
+                if gone:
+                    on_gone(gone)
+            except Exception as e:
+                logger.error(f"Admission sampler failed: {e}")
+
+    thread = threading.Thread(target=sample, name="stream-admission-sampler", daemon=True)
+    thread.start()
+    return thread
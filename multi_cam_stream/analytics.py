@@ -0,0 +1,300 @@
+"""
+Frame analytics plugins. A scheduler thread samples the newest JPEG of each analysed
+camera, groups the frames that are due into one batch per processor and hands the
+batch to a low-priority process pool sized to the CPU the stream budget leaves free.
+Workers decode and downsample the JPEGs, stack them into one array and run the
+processor on all of them at once. Results are published per camera to shared state.
+
+Analytics only read what the ingest workers already publish and never hold a lock
+the viewing path needs; when the pool falls behind, frames are skipped, not queued.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+SCHEDULER_TICK = 0.2  # Seconds between scheduling passes
+WORKER_NICENESS = 10  # Pool workers yield the CPU to stream workers and web requests
+# Frame width -> cv2 flag decoding the 640-wide stream JPEG at the nearest size at or above it.
+REDUCED_DECODE = ((80, "IMREAD_REDUCED_COLOR_8"), (160, "IMREAD_REDUCED_COLOR_4"), (320, "IMREAD_REDUCED_COLOR_2"))
+
+
+class FrameProcessor:
+    """
+    Base class for analytics plugins.
+
+    `process_batch` gets every frame due in one scheduling pass as a stacked uint8 BGR
+    array of shape (N, height, width, 3), downsampled to `input_size`, plus the camera
+    id of each row, and returns one JSON-serialisable result per row. With
+    `needs_previous`, it also gets each camera's previous sample, stacked the same way.
+    Instances live in pool workers and a camera's frames may go to any worker, so keep
+    no per-camera state between batches.
+
+    A second instance lives in the scheduler: `on_result` sees each camera's results in
+    order, with the analysed JPEG, and is the place for per-camera state such as turning
+    results into events. It runs on the scheduler's result thread, so keep it short.
+    """
+
+    name = None
+    input_size = (160, 120)  # (width, height)
+    interval = 1.0  # Seconds between samples of one camera
+    max_batch = 32  # Frames per batch; more due cameras are split over several batches
+    needs_previous = False
+
+    def process_batch(self, frames, camera_ids, previous=None):
+        raise NotImplementedError
+
+    def on_result(self, camera_id, result, captured_at, jpeg):
+        pass
+
+    def on_camera_gone(self, camera_id):
+        """The camera stopped streaming."""
+
+
+class MotionLevelProcessor(FrameProcessor):
+    """Share of pixels whose brightness changed noticeably since the camera's previous sample."""
+
+    name = "motion"
+    needs_previous = True
+    threshold = 25  # Grey-level difference that counts as change
+
+    def process_batch(self, frames, camera_ids, previous=None):
+        import numpy as np
+
+        weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)  # BGR to luma
+        changed = np.abs(frames @ weights - previous @ weights) > self.threshold
+        return [{"level": round(float(level), 4)} for level in changed.mean(axis=(1, 2))]
+
+
+# -----------------------------------------
+# FUNCTION: Pool Workers
+# -----------------------------------------
+_processors = {}  # {dotted path: FrameProcessor}, per pool worker
+
+
+def _init_worker(paths):
+    try:
+        os.nice(WORKER_NICENESS)
+    except OSError:
+        pass
+    for path in paths:
+        _processors[path] = import_string(path)()
+
+
+def _decode(jpeg, size):
+    import cv2
+    import numpy as np
+
+    flag = next((getattr(cv2, name) for width, name in REDUCED_DECODE if width >= size[0]), cv2.IMREAD_COLOR)
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), flag)
+    if (frame.shape[1], frame.shape[0]) != tuple(size):
+        frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def run_batch(path, camera_ids, jpegs, previous_jpegs):
+    """Pool task: decodes and stacks one batch and runs the processor on it; returns (results, seconds)."""
+    import numpy as np
+
+    processor = _processors[path]
+    started = time.perf_counter()
+    frames = np.stack([_decode(jpeg, processor.input_size) for jpeg in jpegs])
+    previous = np.stack([_decode(jpeg, processor.input_size) for jpeg in previous_jpegs]) if previous_jpegs else None
+    results = processor.process_batch(frames, camera_ids, previous)
+    if len(results) != len(camera_ids):
+        raise ValueError(f"{path} returned {len(results)} results for {len(camera_ids)} frames")
+    return results, time.perf_counter() - started
+
+
+# -----------------------------------------
+# FUNCTION: Scheduler
+# -----------------------------------------
+class ProcessorSchedule:
+    """Scheduler-side view of one processor: which cameras it wants and when each is next due."""
+
+    def __init__(self, path, camera_ids):
+        self.path = path
+        self.processor = import_string(path)()  # Scheduler-side instance, for on_result
+        self.name = self.processor.name or path.rsplit(".", 1)[-1]
+        self.camera_ids = set(camera_ids) if camera_ids else None  # None: every streaming camera
+        self.next_due = {}  # {camera_id: monotonic time}
+        self.last_seq = {}  # {camera_id: seq of the last frame sampled}
+        self.previous = {}  # {camera_id: JPEG of the last frame sampled}
+        self.in_flight = 0
+        self.batches = 0
+        self.frames = 0
+        self.skipped = 0  # Passes with due frames while every slot was busy
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def wants(self, camera_id):
+        return self.camera_ids is None or camera_id in self.camera_ids
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "cameras": sorted(self.camera_ids) if self.camera_ids is not None else "all",
+            "interval": self.processor.interval,
+            "in_flight": self.in_flight,
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_ms": round(self.busy_seconds / self.batches * 1000, 2) if self.batches else None,
+            "skipped_passes": self.skipped,
+            "errors": self.errors,
+        }
+
+
+class AnalyticsScheduler:
+    def __init__(self, shared, results, processors, workers):
+        self.shared = shared
+        self.results = results  # Manager dict: {camera_id: {processor name: latest result}}
+        self.schedules = [ProcessorSchedule(path, camera_ids) for path, camera_ids in processors.items()]
+        self.workers = workers
+        self.pool = self._new_pool()
+        self.pool_restarts = 0
+        self._lock = threading.Lock()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=([s.path for s in self.schedules],)
+        )
+
+    def _replace_pool(self, broken):
+        """Swaps a pool whose worker died (which breaks it for good) for a fresh one, once per broken pool."""
+        with self._lock:
+            if self.pool is not broken:
+                return  # Another batch of the same pool already replaced it
+            self.pool = self._new_pool()
+            self.pool_restarts += 1
+        broken.shutdown(wait=False)
+        logger.warning(f"Analytics pool broke (a worker died); started a new one, restart {self.pool_restarts}")
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="analytics-scheduler", daemon=True)
+        thread.start()
+        logger.info(f"Analytics started with {self.workers} workers: {[s.name for s in self.schedules]}")
+        return thread
+
+    def _run(self):
+        while True:
+            try:
+                self.schedule_pass()
+            except Exception as e:
+                logger.error(f"Analytics scheduling failed: {e}")
+            time.sleep(SCHEDULER_TICK)
+
+    def schedule_pass(self):
+        frame_info = dict(self.shared.frame_info)
+        now = time.monotonic()
+        for camera_id in [camera_id for camera_id in self.results.keys() if camera_id not in frame_info]:
+            self.results.pop(camera_id, None)  # Stream stopped
+
+        for schedule in self.schedules:
+            for camera_id in [camera_id for camera_id in schedule.last_seq if camera_id not in frame_info]:
+                for state in (schedule.next_due, schedule.last_seq, schedule.previous):
+                    state.pop(camera_id, None)
+                self.notify_gone(schedule, camera_id)
+            due = [
+                camera_id for camera_id, (seq, _) in frame_info.items()
+                if schedule.wants(camera_id) and schedule.next_due.get(camera_id, 0) <= now
+                and schedule.last_seq.get(camera_id) != seq
+            ]
+            if not due:
+                continue
+            with self._lock:
+                free_slots = self.workers - schedule.in_flight
+            if free_slots <= 0:
+                schedule.skipped += 1  # Stay due; the newest frame is sampled once a slot frees up
+                continue
+            max_batch = schedule.processor.max_batch
+            for start in range(0, min(len(due), free_slots * max_batch), max_batch):
+                self.submit(schedule, due[start:start + max_batch], now)
+
+    def submit(self, schedule, camera_ids, now):
+        batch_ids, jpegs, previous_jpegs, captured = [], [], [], []
+        for camera_id in camera_ids:
+            frame = self.shared.replay.read_latest(camera_id)
+            if frame is None:
+                continue
+            _, seq, captured_at, jpeg = frame
+            previous = schedule.previous.get(camera_id)
+            schedule.previous[camera_id] = jpeg
+            schedule.last_seq[camera_id] = seq
+            schedule.next_due[camera_id] = now + schedule.processor.interval
+            if schedule.processor.needs_previous:
+                if previous is None:
+                    continue  # First sample only primes the comparison
+                previous_jpegs.append(previous)
+            batch_ids.append(camera_id)
+            jpegs.append(jpeg)
+            captured.append(captured_at)
+        if not batch_ids:
+            return
+
+        pool = self.pool
+        try:
+            future = pool.submit(run_batch, schedule.path, batch_ids, jpegs, previous_jpegs)
+        except BrokenProcessPool as e:
+            schedule.errors += 1
+            logger.error(f"Analytics processor {schedule.name} could not submit cameras {batch_ids}: {e}")
+            self._replace_pool(pool)
+            return
+        # Counted only once submitted, so a failed submit never leaves a slot taken for good.
+        with self._lock:
+            schedule.in_flight += 1
+        future.add_done_callback(lambda f: self.publish(schedule, batch_ids, captured, jpegs, f, pool))
+
+    def publish(self, schedule, camera_ids, captured, jpegs, future, pool=None):
+        with self._lock:
+            schedule.in_flight -= 1
+        try:
+            results, seconds = future.result()
+        except Exception as e:
+            schedule.errors += 1
+            logger.error(f"Analytics processor {schedule.name} failed on cameras {camera_ids}: {e}")
+            if isinstance(e, BrokenProcessPool) and pool is not None:
+                self._replace_pool(pool)
+            return
+        schedule.batches += 1
+        schedule.frames += len(camera_ids)
+        schedule.busy_seconds += seconds
+        processed_at = time.time()
+        for camera_id, result, captured_at, jpeg in zip(camera_ids, results, captured, jpegs):
+            entry = {"result": result, "captured_at": captured_at, "processed_at": processed_at, "batch_size": len(camera_ids)}
+            self.results[camera_id] = {**self.results.get(camera_id, {}), schedule.name: entry}
+            try:
+                schedule.processor.on_result(camera_id, result, captured_at, jpeg)
+            except Exception as e:
+                schedule.errors += 1
+                logger.error(f"Analytics processor {schedule.name} failed handling camera {camera_id}: {e}")
+
+    def notify_gone(self, schedule, camera_id):
+        try:
+            schedule.processor.on_camera_gone(camera_id)
+        except Exception as e:
+            logger.error(f"Analytics processor {schedule.name} failed closing camera {camera_id}: {e}")
+
+    def snapshot(self):
+        return {
+            "workers": self.workers,
+            "pool_restarts": self.pool_restarts,
+            "processors": [schedule.stats() for schedule in self.schedules],
+        }
+
+
+def analytics_workers(cpu_budget):
+    """Pool size: STREAM_ANALYTICS_WORKERS, or the cores the stream CPU budget leaves free (at least one)."""
+    configured = getattr(settings, "STREAM_ANALYTICS_WORKERS", 0)
+    if configured:
+        return configured
+    return max(1, int((os.cpu_count() or 1) - cpu_budget))
@@ -1,4 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Switch SQLite to WAL so concurrent stream requests do not hit "database is locked"."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL;')
+        cursor.execute('PRAGMA synchronous=NORMAL;')
 
 
 class MultiCamStreamConfig(AppConfig):
@@ -8,3 +18,4 @@ class MultiCamStreamConfig(AppConfig):
     def ready(self):
         """Ensure cleanup.py runs when Django starts."""
         from multi_cam_stream import cleanup
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='multi_cam_stream.sqlite_wal')
@@ -0,0 +1,189 @@
+import time
+import bisect
+import hashlib
+import logging
+import threading
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+VIRTUAL_NODES = 128  # Ring points per ingest node; more points spread cameras more evenly
+NODES_KEY = "cluster:nodes"  # Sorted set {node_id: last heartbeat}
+NODE_URLS_KEY = "cluster:node_urls"  # Hash {node_id: base URL}
+FORWARDED_HEADER = "HTTP_X_CLUSTER_FORWARDED"  # Set on proxied requests to stop forwarding loops
+FORWARDED_PARAM = "forwarded"  # Same, for redirected requests
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping camera ids to node ids.
+
+    Adding or removing a node only moves the cameras whose ring segment
+    that node gains or loses (about 1/N of them); everything else stays put.
+    """
+
+    def __init__(self, nodes=(), virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = frozenset(nodes)
+        points = []
+        for node in self.nodes:
+            for replica in range(virtual_nodes):
+                points.append((_hash(f"{node}#{replica}"), node))
+        points.sort()
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, camera_id):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(f"camera:{camera_id}")) % len(self._keys)
+        return self._owners[index]
+
+    def placement(self, camera_ids):
+        return {camera_id: self.owner(camera_id) for camera_id in camera_ids}
+
+
+class NodeRegistry:
+    """Redis-backed registry of ingest nodes; a node is live while its heartbeat is fresh."""
+
+    def __init__(self, redis_url, ttl):
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+        self.ttl = ttl
+
+    def heartbeat(self, node_id, url):
+        pipe = self.redis.pipeline()
+        pipe.zadd(NODES_KEY, {node_id: time.time()})
+        pipe.hset(NODE_URLS_KEY, node_id, url)
+        pipe.execute()
+
+    def leave(self, node_id):
+        pipe = self.redis.pipeline()
+        pipe.zrem(NODES_KEY, node_id)
+        pipe.hdel(NODE_URLS_KEY, node_id)
+        pipe.execute()
+
+    def live_nodes(self):
+        """Returns {node_id: url} for nodes with a heartbeat newer than the TTL."""
+        cutoff = time.time() - self.ttl
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(NODES_KEY, "-inf", cutoff)
+        pipe.zrangebyscore(NODES_KEY, cutoff, "+inf")
+        pipe.hgetall(NODE_URLS_KEY)
+        _, node_ids, urls = pipe.execute()
+        urls = {key.decode(): value.decode() for key, value in urls.items()}
+        return {node_id.decode(): urls.get(node_id.decode(), "") for node_id in node_ids}
+
+
+class ClusterPlacement:
+    """
+    This node's view of the cluster: heartbeats into the registry, keeps a
+    cached hash ring, and reports cameras it no longer owns when the ring changes.
+    """
+
+    def __init__(self, node_id, node_url, registry, interval, on_cameras_moved=None):
+        self.node_id = node_id
+        self.node_url = node_url.rstrip("/")
+        self.registry = registry
+        self.interval = interval
+        self.on_cameras_moved = on_cameras_moved
+        self.local_cameras = None  # Callable returning camera ids running on this node
+        self._nodes = {node_id: self.node_url}
+        self._ring = HashRing([node_id])
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="cluster-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.refresh()
+
+    def refresh(self):
+        try:
+            self.registry.heartbeat(self.node_id, self.node_url)
+            nodes = self.registry.live_nodes()
+        except Exception as e:
+            # Keep serving with the last known ring; a registry outage must not stop streams.
+            logger.error(f"Cluster registry unavailable, keeping last known ring: {e}")
+            return
+        nodes[self.node_id] = self.node_url
+
+        with self._lock:
+            if set(nodes) == set(self._nodes):
+                self._nodes = nodes
+                return
+            logger.info(f"Cluster membership changed: {sorted(self._nodes)} -> {sorted(nodes)}")
+            self._nodes = nodes
+            self._ring = HashRing(nodes)
+
+        if self.on_cameras_moved and self.local_cameras:
+            moved = {camera_id for camera_id in self.local_cameras() if not self.is_local(camera_id)}
+            if moved:
+                logger.info(f"Releasing cameras now owned by other nodes: {sorted(moved)}")
+                self.on_cameras_moved(moved)
+
+    def owner(self, camera_id):
+        """Returns (node_id, base_url) of the node that should ingest this camera."""
+        with self._lock:
+            node_id = self._ring.owner(camera_id)
+            return node_id, self._nodes.get(node_id, "")
+
+    def is_local(self, camera_id):
+        return self.owner(camera_id)[0] == self.node_id
+
+    def stream_url(self, camera_id, path):
+        """Absolute URL for a camera's stream on its owner node, or the plain path if owned here."""
+        node_id, url = self.owner(camera_id)
+        if node_id == self.node_id or not url:
+            return path
+        return f"{url}{path}"
+
+    def snapshot(self, camera_ids=()):
+        with self._lock:
+            nodes = dict(self._nodes)
+            ring = self._ring
+        return {
+            "node_id": self.node_id,
+            "nodes": nodes,
+            "placement": ring.placement(camera_ids),
+        }
+
+
+_cluster = None
+_cluster_lock = threading.Lock()
+
+
+def cluster_enabled():
+    return bool(getattr(settings, "CLUSTER_NODE_ID", ""))
+
+
+def get_cluster(on_cameras_moved=None, local_cameras=None):
+    """Returns this process's ClusterPlacement, starting it on first use; None when clustering is off."""
+    global _cluster
+    if not cluster_enabled():
+        return None
+    with _cluster_lock:
+        if _cluster is None:
+            registry = NodeRegistry(settings.CLUSTER_REDIS_URL, settings.CLUSTER_NODE_TTL)
+            _cluster = ClusterPlacement(
+                settings.CLUSTER_NODE_ID,
+                settings.CLUSTER_NODE_URL,
+                registry,
+                settings.CLUSTER_HEARTBEAT_INTERVAL,
+                on_cameras_moved=on_cameras_moved,
+            )
+            _cluster.local_cameras = local_cameras
+            _cluster.start()
+        return _cluster
@@ -0,0 +1,279 @@
+"""
+Per-camera stream profiles and degradation under load. Each camera's Camera row sets
+its capture fps, resolution, JPEG quality and priority. When node CPU or the cameras'
+encode latency crosses a threshold, the controller lowers fps and quality one level at
+a time, lowest priority first, and undoes the levels, highest priority first, once load
+has stayed low for RESTORE_AFTER seconds. Ingest workers read their effective profile
+from shared state: quality applies to the next frame, lower fps by skipping frames.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+DEFAULT_PROFILE = {"capture_fps": 5, "width": 640, "height": 480, "quality": 80}
+LEVELS = [  # (fps factor, quality factor); level 0 is the camera's own profile
+    (1.0, 1.0),
+    (1.0, 0.75),
+    (0.6, 0.75),
+    (0.4, 0.6),
+    (0.2, 0.5),
+]
+MAX_LEVEL = len(LEVELS) - 1
+MIN_FPS = 1
+MIN_QUALITY = 30
+CONTROL_INTERVAL = 5  # Seconds between load samples
+STEP_INTERVAL = 10  # Seconds between degradation steps, so each step shows up in CPU before the next
+RESTORE_AFTER = 30  # Seconds of low load before a level is undone
+PROFILE_RELOAD_INTERVAL = 60  # Seconds between re-reads of the profiles of streaming cameras
+EVENT_HISTORY = 200  # Degradation events kept for the API
+
+_PROFILE_FIELDS = ("id", "stream_fps", "stream_width", "stream_height", "jpeg_quality", "stream_priority")
+
+
+def read_cpu_times():
+    """Returns (busy, total) jiffies of the whole node from /proc/stat, or None."""
+    try:
+        with open("/proc/stat") as f:
+            values = [int(value) for value in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    return sum(values) - idle, sum(values)
+
+
+def profile_from_row(row):
+    return {
+        "capture_fps": row["stream_fps"],
+        "width": row["stream_width"],
+        "height": row["stream_height"],
+        "quality": row["jpeg_quality"],
+    }, row["stream_priority"]
+
+
+def effective_profile(base, level):
+    """The profile a worker runs at `level`: capture settings unchanged, output fps and quality lowered."""
+    fps_factor, quality_factor = LEVELS[level]
+    return {
+        **base,
+        "fps": max(round(base["capture_fps"] * fps_factor, 1), min(MIN_FPS, base["capture_fps"])),
+        "quality": max(round(base["quality"] * quality_factor), min(MIN_QUALITY, base["quality"])),
+        "level": level,
+    }
+
+
+class DegradationController:
+    """
+    Tracks the profile and degradation level of every stream this process started and
+    publishes each camera's effective profile to `shared.stream_profiles`.
+    """
+
+    def __init__(self, shared, cpu_high, cpu_low, encode_ms_high, enabled=True):
+        self.shared = shared
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.encode_ms_high = encode_ms_high
+        self.enabled = enabled
+        self._cameras = {}  # {camera_id: {"base", "priority", "level"}}
+        self._lock = threading.Lock()
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.cpu = None  # Node CPU busy share over the last sample
+        self.encode_ms = None  # Mean recent encode time across streaming cameras
+        self._cpu_times = read_cpu_times()
+        self._last_step = 0.0
+        self._calm_since = None
+        self._exhausted = False  # Overloaded with nothing left to degrade; logged once
+        self._profiles_loaded_at = time.time()
+
+    @classmethod
+    def from_settings(cls, shared):
+        return cls(
+            shared,
+            cpu_high=getattr(settings, "STREAM_DEGRADE_CPU_HIGH", 0.85),
+            cpu_low=getattr(settings, "STREAM_DEGRADE_CPU_LOW", 0.6),
+            encode_ms_high=getattr(settings, "STREAM_DEGRADE_ENCODE_MS", 50),
+            enabled=getattr(settings, "STREAM_DEGRADATION", True),
+        )
+
+    # --- profiles ---------------------------------------------------------
+    def track(self, camera_id):
+        """Loads a camera's profile before its worker starts; the worker reads it at startup."""
+        from .models import Camera
+
+        row = Camera.objects.filter(id=camera_id).values(*_PROFILE_FIELDS).first()
+        base, priority = profile_from_row(row) if row else (dict(DEFAULT_PROFILE), Camera.PRIORITY_NORMAL)
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            if camera is None:
+                camera = self._cameras[camera_id] = {"level": 0}
+            camera["base"], camera["priority"] = base, priority
+            self._publish(camera_id, camera)
+
+    def forget(self, camera_id):
+        """Stops tracking a stream that has been cleaned up; a restart begins again at level 0."""
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def _publish(self, camera_id, camera):
+        try:
+            self.shared.stream_profiles[camera_id] = effective_profile(camera["base"], camera["level"])
+        except Exception as e:
+            logger.error(f"Could not publish stream profile for camera {camera_id}: {e}")
+
+    def reload_profiles(self):
+        """Applies profile edits to running streams."""
+        from .models import Camera
+
+        with self._lock:
+            camera_ids = list(self._cameras)
+        rows = Camera.objects.filter(id__in=camera_ids).values(*_PROFILE_FIELDS)
+        with self._lock:
+            for row in rows:
+                camera = self._cameras.get(row["id"])
+                base, priority = profile_from_row(row)
+                if camera is not None and (base, priority) != (camera["base"], camera["priority"]):
+                    logger.info(f"Stream profile of camera {row['id']} changed to {base}, priority {priority}")
+                    camera["base"], camera["priority"] = base, priority
+                    self._publish(row["id"], camera)
+
+    # --- control ----------------------------------------------------------
+    def measure(self):
+        times = read_cpu_times()
+        if times and self._cpu_times and times[1] > self._cpu_times[1]:
+            self.cpu = (times[0] - self._cpu_times[0]) / (times[1] - self._cpu_times[1])
+        self._cpu_times = times
+
+        with self._lock:
+            camera_ids = list(self._cameras)
+        latencies = []
+        for camera_id in camera_ids:
+            stats = self.shared.ingest_stats.get(camera_id)
+            if stats and stats.get("recent_encode_ms") is not None:
+                latencies.append(stats["recent_encode_ms"])
+        self.encode_ms = sum(latencies) / len(latencies) if latencies else None
+
+    def sample(self, now=None):
+        """Measures load and moves one group of cameras one level if it calls for it."""
+        now = now or time.time()
+        if now - self._profiles_loaded_at >= PROFILE_RELOAD_INTERVAL:
+            self._profiles_loaded_at = now
+            self.reload_profiles()
+        self.measure()
+        if not self.enabled:
+            return
+
+        reasons = []
+        if self.cpu is not None and self.cpu >= self.cpu_high:
+            reasons.append(f"node CPU {self.cpu:.0%} >= {self.cpu_high:.0%}")
+        if self.encode_ms is not None and self.encode_ms >= self.encode_ms_high:
+            reasons.append(f"encode latency {self.encode_ms:.1f} ms >= {self.encode_ms_high} ms")
+        calm = (self.cpu is None or self.cpu <= self.cpu_low) and (
+            self.encode_ms is None or self.encode_ms <= self.encode_ms_high / 2
+        )
+
+        if reasons:
+            self._calm_since = None
+            if now - self._last_step >= STEP_INTERVAL:
+                self._step(now, +1, "; ".join(reasons))
+        elif calm:
+            self._exhausted = False
+            self._calm_since = self._calm_since or now
+            if now - self._calm_since >= RESTORE_AFTER and now - self._last_step >= RESTORE_AFTER:
+                self._step(now, -1, f"load low for {RESTORE_AFTER}s: {self.describe_load()}")
+        else:
+            self._calm_since = None
+
+    def describe_load(self):
+        cpu = f"{self.cpu:.0%}" if self.cpu is not None else "n/a"
+        encode_ms = f"{self.encode_ms:.1f} ms" if self.encode_ms is not None else "n/a"
+        return f"node CPU {cpu}, encode latency {encode_ms}"
+
+    def _step(self, now, direction, reason):
+        """Degrades (+1) the lowest-priority, least-degraded group or restores (-1) the highest-priority, most-degraded one."""
+        from .models import Camera
+
+        with self._lock:
+            if direction > 0:
+                # Camera.PRIORITY_HIGH streams are never degraded.
+                candidates = [(c["priority"], c["level"]) for c in self._cameras.values()
+                              if c["priority"] < Camera.PRIORITY_HIGH and c["level"] < MAX_LEVEL]
+                group = min(candidates) if candidates else None
+            else:
+                candidates = [(c["priority"], c["level"]) for c in self._cameras.values() if c["level"] > 0]
+                group = max(candidates) if candidates else None
+            if group is None:
+                if direction > 0 and not self._exhausted:
+                    self._exhausted = True
+                    logger.warning(f"Stream load too high ({reason}) and no camera left to degrade")
+                return
+            camera_ids = sorted(cid for cid, c in self._cameras.items() if (c["priority"], c["level"]) == group)
+            level = group[1] + direction
+            for camera_id in camera_ids:
+                camera = self._cameras[camera_id]
+                camera["level"] = level
+                self._publish(camera_id, camera)
+            self._last_step = now
+
+        action = "degrade" if direction > 0 else "restore"
+        fps_factor, quality_factor = LEVELS[level]
+        self.events.append({
+            "time": now,
+            "action": action,
+            "level": level,
+            "priority": group[0],
+            "camera_ids": camera_ids,
+            "fps_factor": fps_factor,
+            "quality_factor": quality_factor,
+            "reason": reason,
+        })
+        message = (f"Stream {action}: cameras {camera_ids} (priority {group[0]}) to level {level} "
+                   f"(fps x{fps_factor}, quality x{quality_factor}) - {reason}")
+        if direction > 0:
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    def camera_state(self, camera_id):
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            return effective_profile(camera["base"], camera["level"]) if camera else None
+
+    def snapshot(self, limit=50):
+        with self._lock:
+            cameras = [
+                {"camera_id": camera_id, "priority": camera["priority"],
+                 **effective_profile(camera["base"], camera["level"])}
+                for camera_id, camera in sorted(self._cameras.items())
+            ]
+        return {
+            "enabled": self.enabled,
+            "thresholds": {"cpu_high": self.cpu_high, "cpu_low": self.cpu_low, "encode_ms_high": self.encode_ms_high},
+            "load": {
+                "cpu": round(self.cpu, 3) if self.cpu is not None else None,
+                "encode_ms": round(self.encode_ms, 2) if self.encode_ms is not None else None,
+            },
+            "cameras": cameras,
+            "events": list(self.events)[-limit:][::-1],
+        }
+
+
+def start_degradation_controller(controller, interval=CONTROL_INTERVAL):
+    """Starts a daemon thread that samples load and steps camera profiles."""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                controller.sample()
+            except Exception as e:
+                logger.error(f"Degradation controller failed: {e}")
+
+    thread = threading.Thread(target=run, name="stream-degradation", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,173 @@
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+from .models import Camera
+from .utils import ChunkSink
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per database round trip
+EXPORT_FORMATS = ("csv", "xlsx")
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# (header, queryset lookup). Column names match the import format where they overlap.
+CAMERA_EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("name", "name"),
+    ("ip_address", "ip_address"),
+    ("port", "port"),
+    ("username", "username"),
+    ("is_active", "is_active"),
+    ("stream_fps", "stream_fps"),
+    ("stream_width", "stream_width"),
+    ("stream_height", "stream_height"),
+    ("jpeg_quality", "jpeg_quality"),
+    ("stream_priority", "stream_priority"),
+    ("section", "section_id"),
+    ("section_name", "section__name"),
+    ("serac", "section__serac_id"),
+    ("serac_name", "section__serac__name"),
+]
+PASSWORD_COLUMN = ("password", "password")
+
+
+def camera_export_columns(include_passwords=False):
+    columns = list(CAMERA_EXPORT_COLUMNS)
+    if include_passwords:
+        columns.insert(5, PASSWORD_COLUMN)
+    return columns
+
+
+def iter_camera_rows(columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one tuple per camera, joined to its section and Serac, without caching the queryset."""
+    lookups = [lookup for _, lookup in columns]
+    queryset = Camera.objects.order_by("id").values_list(*lookups)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+# -----------------------------------------
+# CSV Writer
+# -----------------------------------------
+class _Echo:
+    """File-like object that hands written data straight back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    """Yields the CSV export one encoded line at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns]).encode("utf-8")
+    for row in rows:
+        yield writer.writerow(["" if value is None else value for value in row]).encode("utf-8")
+
+
+# -----------------------------------------
+# XLSX Writer (write-only, no third-party dependency)
+# -----------------------------------------
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL_XML = '</sheetData></worksheet>'
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _xlsx_row(row_number, values, letters):
+    cells = "".join(_xlsx_cell(f"{letters[i]}{row_number}", value) for i, value in enumerate(values))
+    return f'<row r="{row_number}">{cells}</row>'
+
+
+def stream_xlsx(columns, rows, sheet_name="Cameras", flush_every=500):
+    """Yields a single-sheet XLSX workbook incrementally; rows are written as inline strings."""
+    sink = ChunkSink()
+    letters = [_column_letter(i) for i in range(len(columns))]
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr("[Content_Types].xml", _CONTENT_TYPES_XML)
+        workbook.writestr("_rels/.rels", _ROOT_RELS_XML)
+        workbook.writestr("xl/workbook.xml", _WORKBOOK_XML.format(sheet=escape(sheet_name)))
+        workbook.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS_XML)
+        yield sink.drain()
+
+        with workbook.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD_XML.encode("utf-8"))
+            sheet.write(_xlsx_row(1, [header for header, _ in columns], letters).encode("utf-8"))
+            for row_number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(row_number, row, letters).encode("utf-8"))
+                if row_number % flush_every == 0:
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(_SHEET_TAIL_XML.encode("utf-8"))
+
+    yield sink.drain()
+
+
+def stream_camera_export(fmt, include_passwords=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Returns an iterator of bytes for the full camera export in the given format."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+    columns = camera_export_columns(include_passwords)
+    rows = iter_camera_rows(columns, chunk_size=chunk_size)
+    if fmt == "xlsx":
+        return stream_xlsx(columns, rows)
+    return stream_csv(columns, rows)
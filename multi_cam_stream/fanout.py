@@ -0,0 +1,252 @@
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from .roi import ROI_REFRESH_INTERVAL, request_roi
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+POLL_INTERVAL = 0.05  # Seconds between checks of a camera's newest frame in the replay arena
+STALL_TIMEOUT = 15  # Seconds a viewer may block on a single frame write before it is disconnected
+NO_FRAME_TIMEOUT = 30  # Seconds without a new frame (camera stopped or preempted) before a viewer's stream ends
+FPS_WINDOW = 5  # Seconds of deliveries used for a viewer's delivered fps
+
+
+class ViewerSlot:
+    """
+    One viewer's single-frame mailbox. The channel overwrites it with the newest
+    frame; a slow viewer skips whatever it had not picked up yet (counted as dropped)
+    instead of queueing frames behind its socket.
+    """
+
+    def __init__(self, camera_id, fps, client="", roi=None):
+        self.viewer_id = uuid.uuid4().hex[:12]
+        self.camera_id = camera_id
+        self.roi = roi  # ROI key, None for the full frame
+        self.fps = fps
+        self.client = client
+        self.opened_at = time.time()
+        self.delivered = 0
+        self.dropped = 0
+        self.stalled = False
+        self.last_delivery = None
+        self.sending_since = None  # Monotonic start of the frame write in progress, if any
+        self._deliveries = deque()  # Delivery times inside FPS_WINDOW
+        self._frame = None  # (seq, timestamp, jpeg)
+        self._taken_seq = None
+        self._cond = threading.Condition()
+        self.listener = None  # Optional callable run (on the channel thread) after each publish
+        self.on_stall = None  # Optional callable(slot) that releases the viewer once it has stalled
+
+    def publish(self, seq, timestamp, jpeg):
+        with self._cond:
+            if self._frame is not None and self._frame[0] != self._taken_seq:
+                self.dropped += 1  # Previous frame was never picked up
+            self._frame = (seq, timestamp, jpeg)
+            self._cond.notify()
+        if self.listener is not None:
+            self.listener()
+
+    def take(self, timeout):
+        """Waits up to `timeout` for a frame newer than the last one taken; returns it or None."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame is not None and self._frame[0] != self._taken_seq, timeout):
+                return None
+            self._taken_seq = self._frame[0]
+            return self._frame
+
+    def check_stall(self, now):
+        """Marks the slot stalled once a write has been in progress for STALL_TIMEOUT; True the first time."""
+        sending_since = self.sending_since
+        if self.stalled or sending_since is None or now - sending_since <= STALL_TIMEOUT:
+            return False
+        self.stalled = True
+        return True
+
+    def mark_delivered(self, now):
+        self.delivered += 1
+        self.last_delivery = now
+        self._deliveries.append(now)
+        while self._deliveries and now - self._deliveries[0] > FPS_WINDOW:
+            self._deliveries.popleft()
+
+    def stats(self):
+        now = time.time()
+        window = min(FPS_WINDOW, now - self.opened_at) or 1
+        recent = sum(1 for delivered_at in self._deliveries if now - delivered_at <= FPS_WINDOW)
+        return {
+            "viewer_id": self.viewer_id,
+            "camera_id": self.camera_id,
+            "roi": self.roi,
+            "client": self.client,
+            "target_fps": self.fps,
+            "delivered_fps": round(recent / window, 2),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "stalled": self.stalled,
+            "seconds_since_delivery": round(now - self.last_delivery, 2) if self.last_delivery else None,
+            "connected_seconds": round(now - self.opened_at, 1),
+        }
+
+
+class CameraChannel:
+    """
+    Reads one camera's newest frame from the replay arena once for all of its viewers and
+    fans the newest frame out to their slots. Runs only while it has viewers.
+    """
+
+    roi = None
+
+    def __init__(self, hub, camera_id):
+        self.hub = hub
+        self.camera_id = camera_id
+        self.viewers = {}  # {viewer_id: ViewerSlot}
+        self._thread = None
+        self._last_seen = None  # Arena serial (ROI seq, for ROI channels) of the last frame fanned out
+
+    @property
+    def key(self):
+        return (self.camera_id, self.roi)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"frame-channel-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self.hub.lock:
+                if not self.viewers:
+                    self.hub.channels.pop(self.key, None)
+                    return
+                viewers = list(self.viewers.values())
+            try:
+                frame = self.poll()
+                if frame is not None:
+                    for viewer in viewers:
+                        viewer.publish(*frame)
+            except Exception as e:
+                logger.error(f"Frame channel for camera {self.camera_id} failed to read: {e}")
+                self._last_seen = None
+            self.check_stalls(viewers, time.monotonic())
+            time.sleep(POLL_INTERVAL)
+
+    def check_stalls(self, viewers, now):
+        """
+        Releases viewers whose current write has blocked for STALL_TIMEOUT. Their serving
+        thread is still stuck in the write; the generator ends when it resumes.
+        """
+        for viewer in viewers:
+            if not viewer.check_stall(now):
+                continue
+            logger.warning(
+                f"Viewer {viewer.viewer_id} of camera {self.camera_id} stalled for {STALL_TIMEOUT}s; disconnecting"
+            )
+            try:
+                (viewer.on_stall or self.hub.close)(viewer)
+            except Exception as e:
+                logger.error(f"Could not release stalled viewer {viewer.viewer_id}: {e}")
+
+    def poll(self):
+        """Returns (seq, timestamp, jpeg) if the camera has a frame newer than the last one, else None."""
+        frame = self.hub.shared.replay.read_latest(self.camera_id, after=self._last_seen)
+        if frame is None:
+            return None  # Nothing new, or the stream stopped or is not producing yet
+        self._last_seen, seq, captured_at, jpeg = frame
+        return seq, captured_at, jpeg
+
+
+class RoiChannel(CameraChannel):
+    """
+    Fans out one ROI sub-stream, encoded once by the camera's ingest worker for every
+    viewer of that ROI in every process, and keeps the worker's demand for it alive.
+    """
+
+    def __init__(self, hub, camera_id, roi):
+        super().__init__(hub, camera_id)
+        self.roi = roi
+        self._requested_at = 0.0
+
+    def poll(self):
+        shared = self.hub.shared
+        now = time.time()
+        if now - self._requested_at >= ROI_REFRESH_INTERVAL:
+            request_roi(shared, self.camera_id, self.roi, now)
+            self._requested_at = now
+        if shared.roi_seqs.get((self.camera_id, self.roi)) in (None, self._last_seen):
+            return None  # Nothing new; the crop itself is only fetched once its seq moves
+        frame = shared.roi_frames.get((self.camera_id, self.roi))
+        if frame is None or frame[0] == self._last_seen:
+            return None
+        self._last_seen = frame[0]
+        return frame
+
+
+class FrameHub:
+    """Per-process registry of camera channels and their viewer slots."""
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.channels = {}  # {(camera_id, roi): CameraChannel}; roi is None for the full frame
+        self.lock = threading.Lock()
+
+    def open(self, camera_id, fps, client="", roi=None):
+        slot = ViewerSlot(camera_id, fps, client, roi)
+        with self.lock:
+            channel = self.channels.get((camera_id, roi))
+            started = channel is None
+            if started:
+                channel = CameraChannel(self, camera_id) if roi is None else RoiChannel(self, camera_id, roi)
+                self.channels[(camera_id, roi)] = channel
+            channel.viewers[slot.viewer_id] = slot
+        if started:
+            channel.start()
+        return slot
+
+    def close(self, slot):
+        """Removes a viewer from its channel; True if it was still open."""
+        with self.lock:
+            channel = self.channels.get((slot.camera_id, slot.roi))
+            return channel is not None and channel.viewers.pop(slot.viewer_id, None) is not None
+
+    def stream(self, slot, timeout=1.0):
+        """
+        Yields (seq, timestamp, jpeg) for one viewer, at most `slot.fps` per second.
+        Stops once the viewer has stalled on a write for STALL_TIMEOUT (flagged by its
+        channel while the write is still blocked) or has had no frame for NO_FRAME_TIMEOUT.
+        """
+        interval = 1.0 / slot.fps
+        next_due = 0.0
+        last_frame = time.monotonic()
+        while not slot.stalled:
+            wait = next_due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)  # Pacing: newer frames keep replacing the slot meanwhile
+            frame = slot.take(timeout)
+            if frame is None:
+                if time.monotonic() - last_frame > NO_FRAME_TIMEOUT:
+                    logger.info(f"Viewer {slot.viewer_id} of camera {slot.camera_id} got no frame "
+                                f"for {NO_FRAME_TIMEOUT}s; ending its stream")
+                    return
+                continue
+            sent_at = last_frame = slot.sending_since = time.monotonic()
+            yield frame
+            # Resumed once the server has written the frame out; a long gap means the client stopped reading.
+            if slot.check_stall(time.monotonic()):
+                logger.warning(
+                    f"Viewer {slot.viewer_id} of camera {slot.camera_id} stalled for "
+                    f"{time.monotonic() - sent_at:.1f}s; disconnecting"
+                )
+            slot.sending_since = None
+            if slot.stalled:
+                return
+            slot.mark_delivered(time.time())
+            next_due = sent_at + interval
+
+    def snapshot(self):
+        with self.lock:
+            viewers = [slot for channel in self.channels.values() for slot in channel.viewers.values()]
+        return [slot.stats() for slot in viewers]
@@ -0,0 +1,239 @@
+"""
+Continuous camera health monitor. Each camera is probed on its own schedule: suspect,
+down and flapping cameras often, long-stable ones with exponential backoff, all under
+one global probe rate. Up/down transitions are debounced, stored as CameraHealthEvent
+rows and emailed in batches that list only what changed.
+"""
+import time
+import heapq
+import random
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.core.mail import send_mail
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+PROBE_TIMEOUT = 3  # Seconds to open a TCP connection to the camera's RTSP port
+MIN_INTERVAL = 15  # Seconds between probes of a suspect, flapping or freshly failed camera
+BASE_INTERVAL = 60  # Interval after a camera comes up; also the backoff cap for cameras that stay down
+MAX_INTERVAL = 900  # Backoff cap for long-stable healthy cameras
+BACKOFF_FACTOR = 2
+JITTER = 0.1  # +-10% on every interval so cameras added together drift apart
+DOWN_AFTER = 3  # Consecutive failed probes before a camera is declared down
+UP_AFTER = 2  # Consecutive good probes before it is declared up again
+FLAP_WINDOW = 1800  # Seconds over which raw result changes are counted
+FLAP_THRESHOLD = 4  # Raw result changes within FLAP_WINDOW that mark a camera as flapping
+RELOAD_INTERVAL = 60  # Seconds between re-reading the camera list
+UP, DOWN, UNKNOWN = "up", "down", "unknown"
+
+
+class CameraHealth:
+    """Probe history and schedule of one camera."""
+
+    def __init__(self, camera_id, name, address, port):
+        self.camera_id = camera_id
+        self.name = name
+        self.address = address
+        self.port = port
+        self.state = UNKNOWN  # Debounced state
+        self.streak = 0  # Consecutive probes that disagree with `state`
+        self.last_ok = None  # Raw result of the last probe
+        self.flips = deque()  # Times the raw result changed, within FLAP_WINDOW
+        self.interval = MIN_INTERVAL
+        self.next_probe = 0.0
+        self.last_probe = None
+        self.detail = ""
+
+    def flapping(self):
+        return len(self.flips) >= FLAP_THRESHOLD
+
+    def record(self, ok, now, detail):
+        """Applies a probe result; returns the previous state if the debounced state changed, else None."""
+        flipped = self.last_ok is not None and ok != self.last_ok
+        if flipped:
+            self.flips.append(now)
+        while self.flips and now - self.flips[0] > FLAP_WINDOW:
+            self.flips.popleft()
+        self.last_ok = ok
+        self.last_probe = now
+        self.detail = detail
+
+        observed = UP if ok else DOWN
+        if observed == self.state:
+            self.streak = 0
+            return None
+        self.streak = 1 if flipped or self.streak == 0 else self.streak + 1
+        if self.streak < (UP_AFTER if ok else DOWN_AFTER):
+            return None
+        previous, self.state, self.streak = self.state, observed, 0
+        return previous
+
+    def reschedule(self, now, changed):
+        if self.streak or self.flapping() or self.state == UNKNOWN:
+            self.interval = MIN_INTERVAL  # Confirm or refute quickly
+        elif changed:
+            self.interval = MIN_INTERVAL if self.state == DOWN else BASE_INTERVAL
+        else:
+            cap = MAX_INTERVAL if self.state == UP else BASE_INTERVAL
+            self.interval = min(self.interval * BACKOFF_FACTOR, cap)
+        self.next_probe = now + self.interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class ProbeRateLimiter:
+    """Spaces probe starts at least 1/rate seconds apart across all cameras."""
+
+    def __init__(self, rate):
+        self.spacing = 1.0 / rate
+        self.next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(self.next_slot, now)
+        self.next_slot = slot + self.spacing
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def probe_camera(address, port, timeout=PROBE_TIMEOUT):
+    """Opens and closes a TCP connection to the RTSP port; returns (ok, detail)."""
+    started = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+    except asyncio.TimeoutError:
+        return False, f"no answer on port {port} within {timeout}s"
+    except OSError as e:
+        return False, e.strerror or str(e)
+    writer.close()
+    try:
+        await writer.wait_closed()  # Lets the transport go now, not when the loop gets round to it
+    except OSError:
+        pass  # Reset while closing; the camera did answer
+    return True, f"port {port} answered in {(time.monotonic() - started) * 1000:.0f} ms"
+
+
+class HealthMonitor:
+    def __init__(self, probe_rate, notify_interval, recipients, from_email=None):
+        self.cameras = {}  # {camera_id: CameraHealth}
+        self.schedule = []  # Heap of (next_probe, camera_id)
+        self.limiter = ProbeRateLimiter(probe_rate)
+        self.probe_rate = probe_rate
+        self.notify_interval = notify_interval
+        self.recipients = recipients
+        self.from_email = from_email
+        self.pending = []  # Transitions not yet notified: (time, CameraHealth, previous, state, detail)
+        self.probes = 0
+        self._tasks = set()
+
+    async def run(self):
+        last_reload = last_notify = 0.0
+        while True:
+            now = time.time()
+            if now - last_reload >= RELOAD_INTERVAL:
+                await self.reload(now)
+                last_reload = now
+            if self.pending and now - last_notify >= self.notify_interval:
+                await self.notify()
+                last_notify = now
+
+            if not self.schedule or self.schedule[0][0] > now:
+                wait = self.schedule[0][0] - now if self.schedule else 1.0
+                await asyncio.sleep(min(max(wait, 0), 1.0))
+                continue
+            _, camera_id = heapq.heappop(self.schedule)
+            health = self.cameras.get(camera_id)
+            if health is None:
+                continue  # Removed since it was scheduled
+            await self.limiter.wait()
+            task = asyncio.create_task(self.probe(health))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def reload(self, now):
+        from .models import Camera
+
+        rows = await sync_to_async(list)(
+            Camera.objects.filter(is_active=True).values_list("id", "name", "ip_address", "port")
+        )
+        seen = set()
+        # New cameras are spread over the time the rate limit needs for all of them.
+        spread = min(BASE_INTERVAL, len(rows) / self.probe_rate)
+        for camera_id, name, address, port in rows:
+            seen.add(camera_id)
+            health = self.cameras.get(camera_id)
+            if health is None:
+                health = self.cameras[camera_id] = CameraHealth(camera_id, name, address, port)
+                health.next_probe = now + random.uniform(0, spread)
+                heapq.heappush(self.schedule, (health.next_probe, camera_id))
+            else:
+                health.name, health.address, health.port = name, address, port
+        for camera_id in set(self.cameras) - seen:
+            del self.cameras[camera_id]
+
+        states = [health.state for health in self.cameras.values()]
+        load = sum(1.0 / health.interval for health in self.cameras.values())
+        logger.info(
+            f"Health monitor: {states.count(UP)} up, {states.count(DOWN)} down, {states.count(UNKNOWN)} unknown, "
+            f"{sum(health.flapping() for health in self.cameras.values())} flapping; "
+            f"{load:.2f} probes/s wanted, limit {self.probe_rate}/s, {self.probes} probes so far"
+        )
+
+    async def probe(self, health):
+        ok, detail = await probe_camera(health.address, health.port)
+        self.probes += 1
+        now = time.time()
+        previous = health.record(ok, now, detail)
+        health.reschedule(now, changed=previous is not None)
+        if self.cameras.get(health.camera_id) is health:
+            heapq.heappush(self.schedule, (health.next_probe, health.camera_id))
+        # Reaching "up" on the first probes after start is not news; reaching "down" is.
+        if previous is not None and not (previous == UNKNOWN and health.state == UP):
+            await self.emit(health, previous, now)
+
+    async def emit(self, health, previous, now):
+        from .models import CameraHealthEvent
+
+        logger.warning(f"Camera {health.camera_id} ({health.name}) is {health.state.upper()}: {health.detail}")
+        self.pending.append((now, health, previous, health.state, health.detail))
+        try:
+            await sync_to_async(CameraHealthEvent.objects.create)(
+                camera_id=health.camera_id,
+                state=health.state,
+                occurred_at=datetime.fromtimestamp(now, tz=dt_timezone.utc),
+                detail=health.detail[:255],
+            )
+        except Exception as e:
+            logger.error(f"Could not record health event for camera {health.camera_id}: {e}")
+
+    async def notify(self):
+        """Emails the transitions since the last notification; kept for the next attempt if sending fails."""
+        batch, self.pending = self.pending, []
+        if not self.recipients:
+            return
+        down = sum(1 for *_, state, _ in batch if state == DOWN)
+        lines = []
+        for at, health, previous, state, detail in batch:
+            icon = "🔴" if state == DOWN else "🟢"
+            flapping = " (flapping)" if health.flapping() else ""
+            lines.append(
+                f"{icon} {health.name} ({health.address}) {previous} -> {state} at "
+                f"{time.strftime('%H:%M:%S', time.localtime(at))}{flapping}: {detail}"
+            )
+        still_down = sum(1 for health in self.cameras.values() if health.state == DOWN)
+        message = "\n".join(lines) + f"\n\nCurrently down: {still_down} of {len(self.cameras)} cameras"
+        try:
+            await sync_to_async(send_mail)(
+                subject=f"Camera status changes: {down} down, {len(batch) - down} up",
+                message=message,
+                from_email=self.from_email,
+                recipient_list=self.recipients,
+                fail_silently=False,
+            )
+        except Exception as e:
+            logger.error(f"Could not send camera status email: {e}")
+            self.pending = batch + self.pending
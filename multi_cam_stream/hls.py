@@ -0,0 +1,322 @@
+"""
+HLS delivery: ffmpeg remuxes the camera's H.264 into short MPEG-TS segments
+with `-c:v copy` (no decode, no re-encode) in a per-camera directory on tmpfs.
+Remuxes read the camera like ingest workers do (same RTSP timeouts, same synthetic
+source) and are admitted against the same node budget.
+"""
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, Http404
+from django.utils.http import http_date
+from .admission import AdmissionDecision, ADMITTED, REJECTED, DEFAULT_PRIORITY, HLS_REMUX
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+PLAYLIST_NAME = "index.m3u8"
+ACCESS_MARKER = ".last_access"  # Touched on every playlist request, so all web workers see viewer activity
+SEGMENT_PATTERN = "seg_%05d.ts"
+HLS_FILE_RE = re.compile(r"^(index\.m3u8|seg_\d{5}\.ts)$")
+SEGMENT_SECONDS = 2
+PLAYLIST_LENGTH = 6  # Segments listed in the playlist
+IDLE_TIMEOUT = 60  # Seconds without a playlist request before a remux is stopped
+PRUNE_INTERVAL = 10  # Seconds between pruning passes
+STALE_SEGMENT_SECONDS = SEGMENT_SECONDS * (PLAYLIST_LENGTH + 4)  # Older segments are no longer listed anywhere
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def remux_key(camera_id):
+    """Admission key of a camera's HLS remux; distinct from the camera's ingest worker."""
+    return (HLS_REMUX, camera_id)
+
+
+def hls_root():
+    """Directory holding one subdirectory per camera; tmpfs (/dev/shm) when available."""
+    root = getattr(settings, "STREAM_HLS_ROOT", "")
+    if not root:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        root = os.path.join(base, "hul_cctv_hls")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def camera_dir(camera_id):
+    return os.path.join(hls_root(), str(int(camera_id)))
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def playlist_is_live(camera_id):
+    """True while some process (possibly another web worker) is still writing this camera's playlist."""
+    return time.time() - _mtime(os.path.join(camera_dir(camera_id), PLAYLIST_NAME)) < SEGMENT_SECONDS * 3
+
+
+def mark_access(camera_id):
+    path = os.path.join(camera_dir(camera_id), ACCESS_MARKER)
+    try:
+        with open(path, "a"):
+            os.utime(path)
+    except OSError:
+        pass
+
+
+class HlsRemuxer:
+    """
+    Runs and supervises one `-c:v copy` ffmpeg per camera that is being watched over HLS.
+    Each remux takes its share of the node budget from the stream AdmissionController,
+    keyed (HLS_REMUX, camera_id), so it can be rejected or preempted like an ingest worker.
+    """
+
+    def __init__(self, admission, source_args, on_released=None):
+        self.admission = admission
+        self.source_args = source_args  # Callable(camera_url) -> ffmpeg input arguments, shared with ingest
+        self.on_released = on_released  # Callable receiving the queued streams a stopped remux made room for
+        self._processes = {}  # {camera_id: subprocess.Popen}
+        self._last_access = {}  # {camera_id: time of the last playlist request}
+        self._lock = threading.Lock()
+        self._pruner = None
+
+    def keep_alive(self, camera_id):
+        """Records player activity without a camera URL; False if nothing is remuxing this camera."""
+        with self._lock:
+            process = self._processes.get(camera_id)
+            if process is not None and process.poll() is None:
+                self._last_access[camera_id] = time.time()
+                return True
+        if playlist_is_live(camera_id):
+            mark_access(camera_id)
+            return True
+        return False
+
+    def ensure(self, camera_id, camera_url, priority=DEFAULT_PRIORITY):
+        """
+        Starts the remux if needed; returns the AdmissionDecision. The caller stops the
+        streams in `decision.preempted`, which gave up their share to this remux.
+        """
+        key = remux_key(camera_id)
+        with self._lock:
+            process = self._processes.get(camera_id)
+            if process is not None and process.poll() is None:
+                self._last_access[camera_id] = time.time()
+                return self.admission.request(key, priority, allow_queue=False)
+            if process is None and playlist_is_live(camera_id):
+                mark_access(camera_id)  # Another worker runs this remux; keep it alive
+                return AdmissionDecision(ADMITTED, key, priority, reason="remuxed by another worker")
+            # No URL: a remux that loses its place is stopped, never restarted from the queue.
+            decision = self.admission.request(key, priority, allow_queue=False)
+            if not decision.admitted:
+                logger.warning(f"HLS remux for camera {camera_id} {decision.state} at priority {priority}: {decision.reason}")
+                return decision
+            self._last_access[camera_id] = time.time()
+            try:
+                self._processes[camera_id] = self._spawn(camera_id, camera_url)
+            except Exception as e:
+                logger.error(f"Failed to start HLS remux for camera {camera_id}: {e}")
+                self._last_access.pop(camera_id, None)
+                self._processes.pop(camera_id, None)
+                ready = self.admission.release(key)
+                if self.on_released and ready:
+                    self.on_released(ready)
+                return AdmissionDecision(REJECTED, key, priority, reason="remux failed to start")
+            mark_access(camera_id)
+            if self._pruner is None:
+                self._pruner = threading.Thread(target=self._prune_loop, name="hls-pruner", daemon=True)
+                self._pruner.start()
+            return decision
+
+    def _spawn(self, camera_id, camera_url):
+        directory = camera_dir(camera_id)
+        shutil.rmtree(directory, ignore_errors=True)  # Segments of an earlier run would confuse players
+        os.makedirs(directory, exist_ok=True)
+        if getattr(settings, "STREAM_SYNTHETIC_SOURCE", ""):
+            # A lavfi test pattern is raw video; encode it, with a keyframe at every segment boundary.
+            codec = ["-c:v", "libx264", "-preset", "ultrafast", "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})"]
+        else:
+            codec = ["-c:v", "copy"]
+        ffmpeg_cmd = [
+            "ffmpeg", *self.source_args(camera_url),
+            "-an", *codec, "-f", "hls",
+            "-hls_time", str(SEGMENT_SECONDS),
+            "-hls_list_size", str(PLAYLIST_LENGTH),
+            "-hls_flags", "delete_segments+omit_endlist+temp_file",
+            "-hls_segment_filename", os.path.join(directory, SEGMENT_PATTERN),
+            os.path.join(directory, PLAYLIST_NAME),
+        ]
+        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        logger.info(f"Started HLS remux {process.pid} for camera {camera_id} in {directory}")
+        return process
+
+    def pids(self, camera_id):
+        """The remux's ffmpeg pid, for admission cost sampling; empty once it has exited."""
+        with self._lock:
+            process = self._processes.get(camera_id)
+        return [process.pid] if process is not None and process.poll() is None else []
+
+    def stop(self, camera_id):
+        """Stops a camera's remux and gives its share of the node budget back."""
+        with self._lock:
+            process = self._processes.pop(camera_id, None)
+            self._last_access.pop(camera_id, None)
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(camera_dir(camera_id), ignore_errors=True)
+        logger.info(f"Stopped HLS remux for camera {camera_id}")
+        ready = self.admission.release(remux_key(camera_id))
+        if self.on_released and ready:
+            self.on_released(ready)
+
+    def is_ready(self, camera_id):
+        return os.path.exists(os.path.join(camera_dir(camera_id), PLAYLIST_NAME))
+
+    def _prune_loop(self):
+        while True:
+            time.sleep(PRUNE_INTERVAL)
+            try:
+                self.prune()
+            except Exception as e:
+                logger.error(f"HLS pruning failed: {e}")
+
+    def prune(self):
+        """Stops idle or dead remuxes, deletes segments no playlist lists any more and orphaned camera dirs."""
+        now = time.time()
+        with self._lock:
+            idle = [
+                camera_id for camera_id, process in self._processes.items()
+                if process.poll() is not None or now - max(
+                    self._last_access.get(camera_id, 0), _mtime(os.path.join(camera_dir(camera_id), ACCESS_MARKER))
+                ) > IDLE_TIMEOUT
+            ]
+        for camera_id in idle:
+            self.stop(camera_id)
+
+        root = hls_root()
+        with self._lock:
+            running = {str(camera_id) for camera_id in self._processes}
+        for name in os.listdir(root):
+            directory = os.path.join(root, name)
+            if name not in running:
+                # Left behind by a crashed process; directories another worker still writes to are kept.
+                if now - max(_mtime(os.path.join(directory, PLAYLIST_NAME)), _mtime(directory)) > STALE_SEGMENT_SECONDS:
+                    shutil.rmtree(directory, ignore_errors=True)
+                continue
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                if filename.endswith(".ts") and now - os.path.getmtime(path) > STALE_SEGMENT_SECONDS:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "camera_id": camera_id,
+                    "pid": process.pid,
+                    "running": process.poll() is None,
+                    "ready": self.is_ready(camera_id),
+                    "idle_seconds": round(now - self._last_access.get(camera_id, now), 1),
+                }
+                for camera_id, process in sorted(self._processes.items())
+            ]
+
+
+def serve_hls_file(request, camera_id, filename):
+    """
+    Serves a playlist or segment. The playlist changes every segment and must not be cached;
+    a segment never changes once written, so it is cacheable for as long as it can be listed.
+    Single byte ranges are answered with 206.
+    """
+    if not HLS_FILE_RE.match(filename):
+        raise Http404("Unknown HLS file")
+    path = os.path.join(camera_dir(camera_id), filename)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("HLS file not available (yet)")
+
+    if filename == PLAYLIST_NAME:
+        mark_access(camera_id)
+        content_type = "application/vnd.apple.mpegurl"
+        cache_control = "no-cache"
+        if getattr(request, "stream_signed", False):
+            return signed_playlist_response(request, path, content_type, cache_control)
+    else:
+        content_type = "video/mp2t"
+        cache_control = f"public, max-age={STALE_SEGMENT_SECONDS}, immutable"
+        accel_prefix = settings.STREAM_ACCEL_REDIRECT_PREFIX
+        if accel_prefix:
+            # The front proxy reads the segment from tmpfs itself, including range requests.
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = f"{accel_prefix}hls/{int(camera_id)}/{filename}"
+            response["Cache-Control"] = cache_control
+            return response
+
+    size = stat.st_size
+    start, end = 0, size - 1
+    match = RANGE_RE.match(request.headers.get("Range", ""))
+    ranged = bool(match and (match.group(1) or match.group(2)))  # Multi-range requests get the whole file
+    if ranged:
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start = max(size - int(match.group(2)), 0)  # Suffix range: the last N bytes
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        raise Http404("HLS segment already pruned")
+    if ranged:
+        with f:
+            f.seek(start)
+            response = HttpResponse(f.read(end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        response = FileResponse(f, content_type=content_type)
+        response["Content-Length"] = str(size)
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = cache_control
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
+
+
+def signed_playlist_response(request, path, content_type, cache_control):
+    """
+    Copies the request's signed query onto each segment line, since relative segment URLs drop
+    the query string; it already verified, signed parameters included, so the segments verify too.
+    """
+    query = request.META.get("QUERY_STRING", "")
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        raise Http404("HLS file not available (yet)")
+    body = "\n".join(line if not line or line.startswith("#") else f"{line}?{query}" for line in lines) + "\n"
+    response = HttpResponse(body, content_type=content_type)
+    response["Cache-Control"] = cache_control
+    return response
+
@@ -0,0 +1,269 @@
+import io
+import csv
+import json
+import logging
+from django.db import connections, router, transaction
+from rest_framework import serializers
+from .models import Section, Camera
+from .serializers import SectionSerializer, CameraSerializer
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+IMPORT_BATCH_SIZE = 500  # Rows validated and written per bulk_create
+MAX_REPORTED_ERRORS = 1000  # Cap on per-row errors kept in the report
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+
+class ImportFormatError(Exception):
+    """Raised when the uploaded file cannot be parsed in the requested format."""
+
+
+# -----------------------------------------
+# Import Specs (one per importable model)
+# -----------------------------------------
+class ImportSpec:
+    """Describes how rows of one model are validated, matched and upserted."""
+    model = None
+    serializer_class = None
+    update_fields = ()
+
+    def natural_key(self, data):
+        raise NotImplementedError
+
+    def existing_ids(self, keys):
+        """Maps natural keys already in the database to their primary keys."""
+        raise NotImplementedError
+
+
+class CameraImportSpec(ImportSpec):
+    """Cameras are matched on `id` if given, else on (ip_address, port)."""
+    model = Camera
+    serializer_class = CameraSerializer
+    update_fields = (
+        "name", "ip_address", "port", "username", "password", "is_active", "section",
+        "stream_fps", "stream_width", "stream_height", "jpeg_quality", "stream_priority",
+    )
+
+    def natural_key(self, data):
+        return (data["ip_address"], data.get("port", 554))
+
+    def existing_ids(self, keys):
+        ips = {ip for ip, _ in keys}
+        rows = Camera.objects.filter(ip_address__in=ips).values_list("ip_address", "port", "id")
+        return {(ip, port): pk for ip, port, pk in rows if (ip, port) in keys}
+
+
+class SectionImportSpec(ImportSpec):
+    """Sections are matched on `id` if given, else on (name, serac)."""
+    model = Section
+    serializer_class = SectionSerializer
+    update_fields = ("name", "serac")
+
+    def natural_key(self, data):
+        serac = data.get("serac")
+        return (data["name"], serac.pk if serac else None)
+
+    def existing_ids(self, keys):
+        names = {name for name, _ in keys}
+        rows = Section.objects.filter(name__in=names).values_list("name", "serac_id", "id")
+        return {(name, serac_id): pk for name, serac_id, pk in rows if (name, serac_id) in keys}
+
+
+IMPORT_SPECS = {
+    "cameras": CameraImportSpec(),
+    "sections": SectionImportSpec(),
+}
+
+
+# -----------------------------------------
+# FUNCTION: Streaming Row Parsers
+# -----------------------------------------
+def detect_format(filename, default="csv"):
+    """Guesses the import format from a file name."""
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+def iter_rows(fileobj, fmt):
+    """
+    Yields (row_number, dict) pairs from a binary file object one line at a time.
+    Raises ImportFormatError for text that is not UTF-8 or not parseable as CSV.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ImportFormatError(f"Unsupported import format '{fmt}'")
+
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            if not reader.fieldnames:
+                raise ImportFormatError("CSV file has no header row")
+            for row_number, row in enumerate(reader, start=1):
+                # Blank cells mean "not provided", so let serializer defaults apply.
+                yield row_number, {key: value for key, value in row.items() if key and value != ""}
+        else:
+            for row_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield row_number, ImportFormatError(f"Invalid JSON: {e}")
+                    continue
+                if not isinstance(row, dict):
+                    yield row_number, ImportFormatError("Each line must be a JSON object")
+                    continue
+                yield row_number, row
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"File is not UTF-8 encoded: {e.reason}")
+    except csv.Error as e:
+        raise ImportFormatError(f"Malformed CSV: {e}")
+    finally:
+        # Leave the underlying upload open; the caller owns it.
+        text.detach()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# -----------------------------------------
+# FUNCTION: Bulk Import
+# -----------------------------------------
+class ImportReport:
+    """Per-import counters and per-row errors returned to the caller."""
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _parse_row_id(raw_id):
+    if raw_id in (None, ""):
+        return None
+    try:
+        return int(raw_id)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({"id": ["A valid integer is required."]})
+
+
+def _import_batch(spec, serializer, batch, report):
+    """Validates one batch of rows and upserts the valid ones with one query per set of columns present."""
+    by_id = {}  # row id -> validated data; later rows are merged over earlier ones
+    by_key = {}  # natural key -> validated data; later rows are merged over earlier ones
+    for row_number, row in batch:
+        report.total += 1
+        if isinstance(row, Exception):
+            report.add_error(row_number, {"non_field_errors": [str(row)]})
+            continue
+        try:
+            row_id = _parse_row_id(row.get("id"))
+            data = serializer.run_validation(row)
+        except serializers.ValidationError as e:
+            report.add_error(row_number, e.detail)
+            continue
+        rows, key = (by_id, row_id) if row_id is not None else (by_key, spec.natural_key(data))
+        if key in rows:
+            # A later row for the same record updates the earlier one; columns it leaves out are kept.
+            report.updated += 1
+            data = {**rows[key], **data}
+        rows[key] = data
+
+    if not by_id and not by_key:
+        return
+
+    matched = spec.existing_ids(set(by_key)) if by_key else {}
+    known_ids = set(spec.model.objects.filter(pk__in=list(by_id)).values_list("pk", flat=True)) if by_id else set()
+
+    objs = []
+    for row_id, data in by_id.items():
+        if row_id in known_ids:
+            report.updated += 1
+        else:
+            report.created += 1
+        objs.append((spec.model(pk=row_id, **data), data))
+    for key, data in by_key.items():
+        pk = matched.get(key)
+        if pk is not None and pk in by_id:
+            # Same row already upserted by id in this batch; the id row wins.
+            report.updated += 1
+            continue
+        if pk is not None:
+            report.updated += 1
+        else:
+            report.created += 1
+        objs.append((spec.model(pk=pk, **data), data))
+
+    # Matched rows only update the columns they carry; a file without e.g. is_active keeps the stored value.
+    # New rows get model defaults for the rest either way.
+    groups = {}
+    for obj, data in objs:
+        fields = tuple(field for field in spec.update_fields if field in data)
+        groups.setdefault(fields, []).append(obj)
+    for fields, group in groups.items():
+        _upsert(spec.model, group, fields)
+
+
+def _upsert(model, objs, update_fields):
+    """bulk_create that updates `update_fields` of rows whose primary key already exists."""
+    if not update_fields:
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+        return
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target; PostgreSQL and SQLite require one.
+    features = connections[router.db_for_write(model)].features
+    conflict_target = {"unique_fields": ["id"]} if features.supports_update_conflicts_with_target else {}
+    model.objects.bulk_create(objs, update_conflicts=True, update_fields=list(update_fields), **conflict_target)
+
+
+def bulk_import(resource, fileobj, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Streams rows from `fileobj`, validates them through the model's serializer
+    and upserts valid rows in batches inside one transaction.
+    Returns an ImportReport; invalid rows are reported, not raised.
+    """
+    spec = IMPORT_SPECS[resource]
+    serializer = spec.serializer_class()
+    report = ImportReport()
+
+    with transaction.atomic():
+        for batch in _batched(iter_rows(fileobj, fmt), batch_size):
+            _import_batch(spec, serializer, batch, report)
+
+    logger.info(
+        f"Bulk import of {resource}: {report.total} rows, {report.created} created, "
+        f"{report.updated} updated, {report.failed} failed"
+    )
+    return report
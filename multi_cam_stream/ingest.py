@@ -0,0 +1,172 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+POOL_SIZE = 3  # Preallocated raw frame buffers per camera: one being read, one ready, one being encoded
+STATS_INTERVAL = 2  # Seconds between stats published to shared state
+
+
+class FrameReader:
+    """
+    Reader stage: a thread that reads raw frames from ffmpeg's stdout into a small
+    pool of preallocated buffers with readinto, so ffmpeg's pipe keeps draining
+    while the encoder works. Only the newest complete frame is kept ready; if the
+    encoder has not taken it by the time the next one is read, it is dropped.
+    """
+
+    def __init__(self, pipe, frame_size, pool_size=POOL_SIZE):
+        self.pipe = pipe
+        self.frame_size = frame_size
+        self.pool_size = pool_size
+        self._free = [bytearray(frame_size) for _ in range(pool_size)]
+        self._ready = None  # Newest complete frame not yet taken by the encoder
+        self._reading = False  # Whether the reader currently holds a buffer
+        self._cond = threading.Condition()
+        self.eof = False
+        # Counters
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_calls = 0  # readinto calls; a frame spans several pipe-sized chunks
+        self.read_seconds = 0.0  # Time spent blocked in readinto
+        self._thread = threading.Thread(target=self._run, name="frame-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    if self._free:
+                        buffer = self._free.pop()
+                    else:
+                        # Encoder holds the rest; the unclaimed ready frame is the stale one.
+                        buffer, self._ready = self._ready, None
+                        self.frames_dropped += 1
+                    self._reading = True
+                if not self._read_into(buffer):
+                    return
+                with self._cond:
+                    if self._ready is not None:
+                        self._free.append(self._ready)
+                        self.frames_dropped += 1
+                    self._ready = buffer
+                    self._reading = False
+                    self.frames_read += 1
+                    self._cond.notify()
+        except Exception as e:
+            logger.error(f"Frame reader failed: {e}")
+        finally:
+            with self._cond:
+                self.eof = True
+                self._cond.notify()
+
+    def _read_into(self, buffer):
+        """Fills `buffer` with exactly one frame; False at end of stream."""
+        view = memoryview(buffer)
+        filled = 0
+        started = time.perf_counter()
+        while filled < self.frame_size:
+            count = self.pipe.readinto(view[filled:])
+            self.read_calls += 1
+            if not count:
+                return False  # ffmpeg exited or closed stdout
+            filled += count
+        self.read_seconds += time.perf_counter() - started
+        return True
+
+    def take(self, timeout):
+        """Encoder stage: waits for the newest frame; returns its buffer, or None on timeout/EOF."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready is not None or self.eof, timeout)
+            buffer, self._ready = self._ready, None
+            return buffer
+
+    def release(self, buffer):
+        with self._cond:
+            self._free.append(buffer)
+
+    def occupancy(self):
+        with self._cond:
+            free = len(self._free)
+            reading = int(self._reading)
+            ready = int(self._ready is not None)
+        return {"free": free, "reading": reading, "ready": ready, "encoding": self.pool_size - free - reading - ready}
+
+
+class IngestStats:
+    """
+    Per-camera pipeline counters, published to shared state every STATS_INTERVAL. Rates
+    cover the current ffmpeg; reconnect counts and staleness span the worker's lifetime.
+    """
+
+    def __init__(self, camera_id, stats_dict):
+        self.camera_id = camera_id
+        self.stats_dict = stats_dict
+        self.reader = None
+        self.rois = None  # RoiEncoder of the worker, if any
+        self.profile = None  # Effective stream profile the worker runs with
+        self.reconnects = 0  # ffmpeg respawns after a drop
+        self.last_exit_code = None
+        self.stale_since = None  # Set while viewers are shown the last good frame
+        self._last_published = 0.0
+
+    def attach(self, reader):
+        """Starts counting for a newly spawned ffmpeg."""
+        self.reader = reader
+        self.started = time.time()
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+        self.frames_skipped = 0  # Read but not encoded, to run below the capture fps of a degraded profile
+        self.publish_seconds = 0.0  # Manager round trips for the buffer and frame info
+        self._window = (0, 0.0)  # (frames_encoded, encode_seconds) at the last publish
+
+    def maybe_publish(self, now, force=False):
+        if not force and now - self._last_published < STATS_INTERVAL:
+            return
+        self._last_published = now
+        elapsed = max(now - self.started, 1e-6)
+        reader = self.reader
+        window_frames = self.frames_encoded - self._window[0]
+        window_seconds = self.encode_seconds - self._window[1]
+        self._window = (self.frames_encoded, self.encode_seconds)
+        try:
+            self.stats_dict[self.camera_id] = {
+                "updated_at": now,
+                "frames_read": reader.frames_read,
+                "frames_encoded": self.frames_encoded,
+                "frames_dropped": reader.frames_dropped,
+                "reads_per_frame": round(reader.read_calls / reader.frames_read, 1) if reader.frames_read else None,
+                "read_fps": round(reader.frames_read / elapsed, 2),
+                "encode_fps": round(self.frames_encoded / elapsed, 2),
+                "reader_wait": round(reader.read_seconds / elapsed, 3),  # Share of time waiting on ffmpeg for data
+                "encoder_busy": round(self.encode_seconds / elapsed, 3),  # Share of time encoding
+                "publish_busy": round(self.publish_seconds / elapsed, 3),
+                "avg_encode_ms": round(self.encode_seconds / self.frames_encoded * 1000, 2) if self.frames_encoded else None,
+                # Since the last publish; what the degradation controller watches
+                "recent_encode_ms": round(window_seconds / window_frames * 1000, 2) if window_frames else None,
+                "frames_skipped": self.frames_skipped,
+                "profile": self.profile,
+                "buffers": reader.occupancy(),
+                "reconnects": self.reconnects,
+                "last_exit_code": self.last_exit_code,
+                "stale": self.stale_since is not None,
+                "stale_seconds": round(now - self.stale_since, 1) if self.stale_since else None,
+                **(self.roi_stats() if self.rois else {}),
+            }
+        except Exception as e:
+            logger.error(f"Could not publish ingest stats for camera {self.camera_id}: {e}")
+
+    def roi_stats(self):
+        rois = self.rois
+        return {
+            "rois": sorted(rois.boxes),
+            "roi_frames_encoded": rois.frames_encoded,
+            "avg_roi_encode_ms": round(rois.encode_seconds / rois.frames_encoded * 1000, 2) if rois.frames_encoded else None,
+        }
@@ -0,0 +1,41 @@
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from multi_cam_stream.cluster import HashRing, NodeRegistry
+from multi_cam_stream.models import Camera
+
+
+class Command(BaseCommand):
+    help = "Show live ingest nodes and camera placement; optionally simulate a node joining or leaving."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--simulate-join", action="append", default=[], metavar="NODE_ID")
+        parser.add_argument("--simulate-leave", action="append", default=[], metavar="NODE_ID")
+
+    def handle(self, *args, **options):
+        registry = NodeRegistry(settings.CLUSTER_REDIS_URL, settings.CLUSTER_NODE_TTL)
+        try:
+            nodes = registry.live_nodes()
+        except Exception as e:
+            raise CommandError(f"Cluster registry unavailable at {settings.CLUSTER_REDIS_URL}: {e}")
+
+        camera_ids = list(Camera.objects.filter(is_active=True).values_list("id", flat=True))
+        ring = HashRing(nodes)
+        placement = ring.placement(camera_ids)
+
+        self.stdout.write(f"Live nodes ({len(nodes)}):")
+        counts = Counter(placement.values())
+        for node_id, url in sorted(nodes.items()):
+            self.stdout.write(f"  {node_id:<20} {url:<40} {counts.get(node_id, 0)} cameras")
+
+        if not options["simulate_join"] and not options["simulate_leave"]:
+            return
+
+        simulated = (set(nodes) | set(options["simulate_join"])) - set(options["simulate_leave"])
+        new_placement = HashRing(simulated).placement(camera_ids)
+        moved = [camera_id for camera_id in camera_ids if placement[camera_id] != new_placement[camera_id]]
+        self.stdout.write(
+            f"Simulated nodes {sorted(simulated)}: {len(moved)} of {len(camera_ids)} cameras would move"
+        )
+        for camera_id in moved:
+            self.stdout.write(f"  camera {camera_id}: {placement[camera_id]} -> {new_placement[camera_id]}")
@@ -0,0 +1,42 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from multi_cam_stream.exporters import stream_camera_export, EXPORT_FORMATS, EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Export all cameras, joined to their section and Serac, as CSV or XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o", "--output", default="-",
+            help="Output file path, or '-' for stdout (default)",
+        )
+        parser.add_argument(
+            "--file-format", choices=EXPORT_FORMATS, default=None,
+            help="Output format. Guessed from the output extension if omitted, else csv.",
+        )
+        parser.add_argument(
+            "--include-passwords", action="store_true",
+            help="Include camera passwords so the file can be re-imported as-is",
+        )
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["file_format"] or ("xlsx" if output.lower().endswith(".xlsx") else "csv")
+        chunks = stream_camera_export(fmt, options["include_passwords"], options["chunk_size"])
+
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        try:
+            with open(output, "wb") as fileobj:
+                for chunk in chunks:
+                    fileobj.write(chunk)
+        except OSError as e:
+            raise CommandError(f"Cannot write {output}: {e}")
+
+        self.stderr.write(self.style.SUCCESS(f"Exported cameras to {output}"))
@@ -0,0 +1,42 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from HUL_CCTV_PROJ import api_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema once, for workers running with API_SCHEMA_MODE=static. "
+        "Run at build or deploy time with API_SCHEMA_MODE=live (the default)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o", "--output", default=None,
+            help="Output file path (default: API_SCHEMA_FILE)",
+        )
+        parser.add_argument(
+            "--url", default=None,
+            help="Public base URL written into the schema, e.g. https://cctv.indusvision.in. "
+                 "Omitted by default, so clients use the host they loaded the schema from.",
+        )
+
+    def handle(self, *args, **options):
+        if api_schema.STATIC:
+            raise CommandError("The schema decorators are disabled in static mode; run with API_SCHEMA_MODE=live")
+        from drf_yasg.codecs import OpenAPICodecJson
+        from drf_yasg.generators import OpenAPISchemaGenerator
+
+        output = options["output"] or settings.API_SCHEMA_FILE
+        generator = OpenAPISchemaGenerator(info=api_schema.api_info(), url=options["url"])
+        schema = generator.get_schema(request=None, public=True)
+        data = OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+        tmp_path = f"{output}.tmp"
+        try:
+            with open(tmp_path, "wb") as fileobj:
+                fileobj.write(data)
+            os.replace(tmp_path, output)  # Workers never read a half-written schema
+        except OSError as e:
+            raise CommandError(f"Cannot write {output}: {e}")
+        self.stdout.write(f"Wrote {len(schema['paths'])} paths ({len(data)} bytes) to {output}")
@@ -0,0 +1,41 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from multi_cam_stream.importers import (
+    bulk_import, detect_format, ImportFormatError, IMPORT_FORMATS, IMPORT_SPECS, IMPORT_BATCH_SIZE,
+)
+
+
+class Command(BaseCommand):
+    help = "Bulk import cameras or sections from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the CSV or JSON Lines file")
+        parser.add_argument(
+            "--resource", choices=sorted(IMPORT_SPECS), default="cameras",
+            help="What the file contains (default: cameras)",
+        )
+        parser.add_argument(
+            "--file-format", choices=IMPORT_FORMATS, default=None,
+            help="File format. Guessed from the file extension if omitted.",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["file_format"] or detect_format(path)
+
+        try:
+            with open(path, "rb") as fileobj:
+                report = bulk_import(options["resource"], fileobj, fmt, batch_size=options["batch_size"])
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {options['resource']} from {path}: {report.total} rows, "
+            f"{report.created} created, {report.updated} updated, {report.failed} failed"
+        ))
@@ -0,0 +1,33 @@
+import asyncio
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from multi_cam_stream.health import HealthMonitor
+
+
+class Command(BaseCommand):
+    help = (
+        "Continuously probe every active camera on an adaptive schedule, record debounced up/down "
+        "transitions and email batched change reports. Replaces the hourly ping report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate", type=float, default=settings.HEALTH_PROBE_RATE,
+                            help="Probes per second across all cameras")
+        parser.add_argument("--notify-interval", type=int, default=settings.HEALTH_NOTIFY_INTERVAL,
+                            help="Seconds between batched change emails")
+        parser.add_argument("--no-email", action="store_true", help="Record and log transitions without emailing")
+
+    def handle(self, *args, **options):
+        recipients = [] if options["no_email"] else settings.HEALTH_NOTIFY_EMAILS
+        monitor = HealthMonitor(
+            options["rate"], options["notify_interval"], recipients,
+            from_email=settings.EMAIL_HOST_USER,
+        )
+        self.stdout.write(
+            f"Monitoring cameras at up to {options['rate']} probes/s; "
+            f"change reports every {options['notify_interval']}s to {recipients or 'nobody'}"
+        )
+        try:
+            asyncio.run(monitor.run())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from multi_cam_stream.previews import refresh_previews, GRAB_CONCURRENCY, GRAB_TIMEOUT
+
+
+class Command(BaseCommand):
+    help = "Grab a preview thumbnail for each active camera whose preview is older than --max-age."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--camera", type=int, action="append", dest="camera_ids", metavar="CAMERA_ID")
+        parser.add_argument("--max-age", type=int, default=None, help="Seconds; 0 refreshes everything")
+        parser.add_argument("--concurrency", type=int, default=GRAB_CONCURRENCY)
+        parser.add_argument("--timeout", type=int, default=GRAB_TIMEOUT, help="Seconds per camera")
+
+    def handle(self, *args, **options):
+        max_age = options["max_age"]
+        if max_age is None:
+            max_age = settings.STREAM_PREVIEW_INTERVAL * 60
+        summary = refresh_previews(
+            max_age,
+            concurrency=options["concurrency"],
+            timeout=options["timeout"],
+            camera_ids=options["camera_ids"],
+        )
+        self.stdout.write(
+            f"Refreshed {summary['refreshed']}, failed {summary['failed']}, skipped {summary['skipped']} (still fresh)"
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from multi_cam_stream.relay import LINGER, RelayHub, RelayServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run an edge relay that pulls each watched camera from the origin once and re-serves it "
+        "to local viewers at /api/video_feed/<id>/. The relay must share DJANGO_SECRET_KEY with "
+        "the origin when signed stream URLs are used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--origin", required=True, help="Base URL of the origin, e.g. http://10.0.0.5:8000")
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument("--linger", type=float, default=LINGER,
+                            help="Seconds to keep an upstream feed after its last local viewer leaves")
+
+    def handle(self, *args, **options):
+        hub = RelayHub(options["origin"], options["linger"])
+        try:
+            server = RelayServer((options["host"], options["port"]), hub)
+        except OSError as e:
+            raise CommandError(f"Cannot listen on {options['host']}:{options['port']}: {e}")
+
+        self.stdout.write(f"Relaying {options['origin']} on http://{options['host']}:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multi_cam_stream', '0002_alter_camera_table_alter_section_table_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='camera',
+            index=models.Index(fields=['section', 'is_active'], name='cameras_section_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='camera',
+            index=models.Index(fields=['ip_address'], name='cameras_ip_address_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.13 on 2026-10-19 11:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multi_cam_stream', '0003_camera_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CameraHealthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('up', 'Up'), ('down', 'Down')], max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_events', to='multi_cam_stream.camera')),
+            ],
+            options={
+                'db_table': 'CameraHealthEvents',
+                'ordering': ['-occurred_at'],
+                'indexes': [models.Index(fields=['camera', 'occurred_at'], name='health_camera_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-19 11:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multi_cam_stream', '0004_camera_health_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MotionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('peak_intensity', models.FloatField()),
+                ('thumbnail', models.CharField(blank=True, max_length=100)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='motion_events', to='multi_cam_stream.camera')),
+            ],
+            options={
+                'db_table': 'MotionEvents',
+                'ordering': ['start_time'],
+                'indexes': [models.Index(fields=['camera', 'start_time'], name='motion_camera_start_idx'), models.Index(fields=['start_time'], name='motion_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.13 on 2026-10-19 11:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multi_cam_stream', '0005_motion_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='jpeg_quality',
+            field=models.PositiveSmallIntegerField(default=80, validators=[django.core.validators.MinValueValidator(30), django.core.validators.MaxValueValidator(95)]),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='stream_fps',
+            field=models.PositiveSmallIntegerField(default=5, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(30)]),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='stream_height',
+            field=models.PositiveSmallIntegerField(default=480, validators=[django.core.validators.MinValueValidator(120), django.core.validators.MaxValueValidator(1080)]),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='stream_priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Low'), (1, 'Normal'), (2, 'High (never degraded)')], default=1),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='stream_width',
+            field=models.PositiveSmallIntegerField(default=640, validators=[django.core.validators.MinValueValidator(160), django.core.validators.MaxValueValidator(1920)]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+def close_existing_events(apps, schema_editor):
+    # Open events live in the analytics scheduler, which a deploy restarts; rows already written are final.
+    apps.get_model('multi_cam_stream', 'MotionEvent').objects.update(closed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multi_cam_stream', '0006_camera_stream_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='motionevent',
+            name='closed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(close_existing_events, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
 class Seracs(models.Model):
@@ -22,6 +23,10 @@ class Section(models.Model):
 class Camera(models.Model):
     class Meta:
         db_table = 'Cameras'
+        indexes = [
+            models.Index(fields=['section', 'is_active'], name='cameras_section_active_idx'),
+            models.Index(fields=['ip_address'], name='cameras_ip_address_idx'),
+        ]
         
     name = models.CharField(max_length=100)
     ip_address = models.GenericIPAddressField()
@@ -31,6 +36,19 @@ class Camera(models.Model):
     is_active = models.BooleanField(default=True)
     section = models.ForeignKey(Section, related_name='cameras', on_delete=models.SET_NULL, null=True)
 
+    # Stream profile: what the ingest worker asks ffmpeg for and how it encodes. Under load the
+    # degradation controller lowers fps and quality of low-priority cameras below these values.
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_HIGH = 2
+    PRIORITY_CHOICES = [(PRIORITY_LOW, 'Low'), (PRIORITY_NORMAL, 'Normal'), (PRIORITY_HIGH, 'High (never degraded)')]
+
+    stream_fps = models.PositiveSmallIntegerField(default=5, validators=[MinValueValidator(1), MaxValueValidator(30)])
+    stream_width = models.PositiveSmallIntegerField(default=640, validators=[MinValueValidator(160), MaxValueValidator(1920)])
+    stream_height = models.PositiveSmallIntegerField(default=480, validators=[MinValueValidator(120), MaxValueValidator(1080)])
+    jpeg_quality = models.PositiveSmallIntegerField(default=80, validators=[MinValueValidator(30), MaxValueValidator(95)])
+    stream_priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_NORMAL)
+
     def get_rtsp_url(self):
         """Generates the RTSP URL for the camera"""
         if self.username and self.password:
@@ -39,3 +57,42 @@ class Camera(models.Model):
 
     def __str__(self):
         return self.name
+
+class CameraHealthEvent(models.Model):
+    """A debounced up/down transition recorded by the health monitor."""
+    class Meta:
+        db_table = 'CameraHealthEvents'
+        ordering = ['-occurred_at']
+        indexes = [
+            models.Index(fields=['camera', 'occurred_at'], name='health_camera_time_idx'),
+        ]
+
+    STATE_CHOICES = [('up', 'Up'), ('down', 'Down')]
+
+    camera = models.ForeignKey(Camera, related_name='health_events', on_delete=models.CASCADE)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES)
+    occurred_at = models.DateTimeField()
+    detail = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.camera} {self.state} at {self.occurred_at}"
+
+class MotionEvent(models.Model):
+    """A stretch of activity on one camera found by the motion analytics processor."""
+    class Meta:
+        db_table = 'MotionEvents'
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['camera', 'start_time'], name='motion_camera_start_idx'),
+            models.Index(fields=['start_time'], name='motion_start_idx'),
+        ]
+
+    camera = models.ForeignKey(Camera, related_name='motion_events', on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()  # Last active sample; advances while the event is still open
+    peak_intensity = models.FloatField()  # Highest share of changed pixels, 0..1
+    thumbnail = models.CharField(max_length=100, blank=True)  # File name under STREAM_MOTION_DIR
+    closed = models.BooleanField(default=False)  # Set when the event ends; row and thumbnail are final from then on
+
+    def __str__(self):
+        return f"{self.camera} motion at {self.start_time}"
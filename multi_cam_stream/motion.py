@@ -0,0 +1,215 @@
+"""
+Motion event timeline. MotionEventProcessor runs the analytics motion level on every
+streaming camera and, in the scheduler, coalesces consecutive active samples into
+MotionEvent rows with their peak intensity and a thumbnail of the peak frame, so
+"activity on camera 12 between 2 and 4 am" is an indexed range query.
+"""
+import os
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from .analytics import MotionLevelProcessor
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+START_LEVEL = 0.02  # Share of changed pixels that opens an event
+CONTINUE_LEVEL = 0.01  # Lower share that keeps an open event going, so it does not flicker
+QUIET_PERIOD = 5  # Seconds below CONTINUE_LEVEL that close an event
+MAX_EVENT_SECONDS = 600  # Longer activity is split, which bounds the index range a search scans
+PERSIST_INTERVAL = 30  # Seconds between saves of an open event's end time and peak
+THUMBNAIL_WIDTH = 320
+PRUNE_BATCH_SIZE = 1000  # Events deleted per query, so a large backlog does not hold one long lock
+
+
+def motion_dir():
+    directory = str(getattr(settings, "STREAM_MOTION_DIR", "") or os.path.join(settings.BASE_DIR, "motion"))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def thumbnail_path(name):
+    return os.path.join(motion_dir(), os.path.basename(name))
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def write_thumbnail(name, jpeg):
+    """Stores a THUMBNAIL_WIDTH-wide copy of a stream JPEG."""
+    import cv2
+    import numpy as np
+
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    if frame.shape[1] > THUMBNAIL_WIDTH:
+        frame = cv2.resize(frame, (THUMBNAIL_WIDTH, frame.shape[0] * THUMBNAIL_WIDTH // frame.shape[1]),
+                           interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
+    if not ok:
+        raise ValueError("could not encode thumbnail")
+    path = thumbnail_path(name)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(encoded.tobytes())
+    os.replace(f"{path}.tmp", path)
+
+
+class OpenEvent:
+    """An event still in progress on one camera."""
+
+    def __init__(self, camera_id, started_at, level, jpeg):
+        self.camera_id = camera_id
+        self.event_id = None
+        self.started_at = started_at
+        self.last_active = started_at
+        self.peak = level
+        self.peak_jpeg = jpeg
+        self.saved_at = None  # Sample time of the last save
+        self.thumbnail = ""  # Stored thumbnail file name
+        self.thumbnail_stale = True
+
+    def update(self, level, captured_at, jpeg):
+        self.last_active = captured_at
+        if level > self.peak:
+            self.peak, self.peak_jpeg, self.thumbnail_stale = level, jpeg, True
+
+    def save(self, closed=False):
+        from .models import MotionEvent
+
+        name = f"{self.camera_id}-{int(self.started_at * 1000)}.jpg"
+        if self.thumbnail_stale:
+            try:
+                write_thumbnail(name, self.peak_jpeg)
+                self.thumbnail, self.thumbnail_stale = name, False
+            except Exception as e:
+                logger.warning(f"Could not store motion thumbnail for camera {self.camera_id}: {e}")
+        fields = {
+            "end_time": _to_datetime(self.last_active),
+            "peak_intensity": round(self.peak, 4),
+            "thumbnail": self.thumbnail,
+            "closed": closed,
+        }
+        if self.event_id is None:
+            self.event_id = MotionEvent.objects.create(
+                camera_id=self.camera_id, start_time=_to_datetime(self.started_at), **fields
+            ).id
+        else:
+            MotionEvent.objects.filter(id=self.event_id).update(**fields)
+        self.saved_at = self.last_active
+
+
+class MotionEventProcessor(MotionLevelProcessor):
+    """
+    Motion level plus event extraction. An event opens at START_LEVEL, stays open while
+    samples reach CONTINUE_LEVEL and closes after QUIET_PERIOD seconds without one. Rows
+    are written when an event opens, every PERSIST_INTERVAL while it lasts and when it
+    closes, so a restart loses at most that much of an event's tail.
+    """
+
+    name = "motion_events"
+    start_level = START_LEVEL
+    continue_level = CONTINUE_LEVEL
+    quiet_period = QUIET_PERIOD
+
+    def __init__(self):
+        self.open_events = {}  # {camera_id: OpenEvent}, scheduler instance only
+
+    def on_result(self, camera_id, result, captured_at, jpeg):
+        level = result["level"]
+        event = self.open_events.get(camera_id)
+        if event is not None:
+            if captured_at - event.last_active >= self.quiet_period:
+                self.close(camera_id)
+                event = None
+            elif captured_at - event.started_at >= MAX_EVENT_SECONDS:
+                self.close(camera_id)  # Activity continues as a new event below
+                event = None
+            elif level >= self.continue_level:
+                event.update(level, captured_at, jpeg)
+                if captured_at - event.saved_at >= PERSIST_INTERVAL:
+                    event.save()
+                return
+
+        if event is None and level >= self.start_level:
+            event = self.open_events[camera_id] = OpenEvent(camera_id, captured_at, level, jpeg)
+            event.save()
+
+    def on_camera_gone(self, camera_id):
+        self.close(camera_id)
+
+    def close(self, camera_id):
+        event = self.open_events.pop(camera_id, None)
+        if event is not None:
+            event.save(closed=True)
+
+
+# -----------------------------------------
+# FUNCTION: Search
+# -----------------------------------------
+def search_motion_events(start, end, camera_ids=None, min_intensity=None, limit=500):
+    """
+    Events overlapping [start, end], oldest first, as dicts. No event is longer than
+    MAX_EVENT_SECONDS, which turns the overlap test into a bounded scan of the
+    (camera, start_time) index.
+    """
+    from .models import MotionEvent
+
+    events = MotionEvent.objects.filter(
+        start_time__gte=start - timedelta(seconds=MAX_EVENT_SECONDS), start_time__lt=end, end_time__gte=start
+    )
+    if camera_ids:
+        events = events.filter(camera_id__in=camera_ids)
+    if min_intensity is not None:
+        events = events.filter(peak_intensity__gte=min_intensity)
+    return list(
+        events.order_by("start_time", "id")
+        .values("id", "camera_id", "start_time", "end_time", "peak_intensity", "closed", "thumbnail")[:limit]
+    )
+
+
+# -----------------------------------------
+# FUNCTION: Retention
+# -----------------------------------------
+def _remove_thumbnail(name):
+    try:
+        os.remove(thumbnail_path(name))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def prune_motion_events(retention, now=None):
+    """
+    Deletes events that ended more than `retention` (a timedelta) ago together with their
+    thumbnails, then sweeps thumbnail files no row refers to any more. Returns the counts.
+    """
+    from django.utils import timezone
+    from .models import MotionEvent
+
+    now = now or timezone.now()
+    cutoff = now - retention
+    events = removed = 0
+    while True:
+        expired = MotionEvent.objects.filter(end_time__lt=cutoff).order_by("id")
+        batch = list(expired.values_list("id", "thumbnail")[:PRUNE_BATCH_SIZE])
+        if not batch:
+            break
+        MotionEvent.objects.filter(id__in=[event_id for event_id, _ in batch]).delete()
+        events += len(batch)
+        removed += sum(_remove_thumbnail(name) for _, name in batch if name)
+
+    # A thumbnail is rewritten at most MAX_EVENT_SECONDS before its event ends, so a file older than
+    # that past the cutoff belongs to a pruned event, e.g. one whose row was deleted by hand.
+    stale_before = cutoff.timestamp() - MAX_EVENT_SECONDS
+    for entry in os.scandir(motion_dir()):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < stale_before:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+
+    logger.info(f"Pruned {events} motion events and {removed} thumbnails older than {cutoff.isoformat()}")
+    return {"events": events, "thumbnails": removed}
@@ -0,0 +1,122 @@
+"""
+Low-rate preview thumbnails. A short-lived ffmpeg grabs one frame per camera;
+thumbnails and their metadata live on disk so web workers serve them without
+touching the cameras.
+"""
+import os
+import json
+import time
+import fcntl
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .streaming import ffmpeg_source_args
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+PREVIEW_WIDTH = 320
+PREVIEW_QUALITY = 5  # ffmpeg mjpeg -q:v, 2 (best) .. 31 (worst)
+GRAB_TIMEOUT = 15  # Seconds one ffmpeg may take to connect and decode a frame
+GRAB_CONCURRENCY = 4  # Cameras grabbed at once
+CLAIM_LOCK_NAME = ".claim.lock"  # Serialises picking due cameras across overlapping refresh runs
+
+
+def preview_dir():
+    directory = str(getattr(settings, "STREAM_PREVIEW_DIR", "") or os.path.join(settings.BASE_DIR, "previews"))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def preview_path(camera_id):
+    return os.path.join(preview_dir(), f"{int(camera_id)}.jpg")
+
+
+def _meta_path(camera_id):
+    return os.path.join(preview_dir(), f"{int(camera_id)}.json")
+
+
+def read_preview_meta(camera_id):
+    """Returns {"captured_at", "attempted_at", "error", "bytes"} or None if never attempted."""
+    try:
+        with open(_meta_path(camera_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, data, mode="wb"):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+
+
+def grab_preview(camera_id, camera_url, timeout=GRAB_TIMEOUT):
+    """Grabs one frame, stores it as a small JPEG and records the outcome; returns True on success."""
+    ffmpeg_cmd = [
+        "ffmpeg", *ffmpeg_source_args(camera_url),
+        "-an", "-frames:v", "1", "-vf", f"scale={PREVIEW_WIDTH}:-2",
+        "-q:v", str(PREVIEW_QUALITY), "-f", "image2", "-c:v", "mjpeg", "pipe:1",
+    ]
+    meta = read_preview_meta(camera_id) or {"captured_at": None}
+    meta["attempted_at"] = time.time()
+    try:
+        result = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout)
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(f"ffmpeg exited with code {result.returncode}")
+        _write_atomic(preview_path(camera_id), result.stdout)
+        meta.update(captured_at=time.time(), error=None, bytes=len(result.stdout))
+    except subprocess.TimeoutExpired:
+        meta["error"] = f"timed out after {timeout}s"
+    except Exception as e:
+        meta["error"] = str(e)
+    _write_atomic(_meta_path(camera_id), json.dumps(meta), mode="w")
+    if meta["error"]:
+        logger.warning(f"Preview for camera {camera_id} failed: {meta['error']}")
+    return meta["error"] is None
+
+
+def _claim_due(cameras, max_age):
+    """
+    Picks the cameras due for a preview and stamps their attempt time before any grab starts,
+    under a file lock, so a run that overlaps a slow one skips the cameras it is still grabbing.
+    """
+    due = []
+    with open(os.path.join(preview_dir(), CLAIM_LOCK_NAME), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the file is closed
+        now = time.time()
+        for camera in cameras.iterator():
+            meta = read_preview_meta(camera.id) or {"captured_at": None}
+            attempted_at = meta.get("attempted_at") or 0
+            if now - attempted_at >= max_age:
+                due.append((attempted_at, camera.id, camera.get_rtsp_url()))
+                meta["attempted_at"] = now
+                _write_atomic(_meta_path(camera.id), json.dumps(meta), mode="w")
+    due.sort()
+    return due
+
+
+def refresh_previews(max_age, concurrency=GRAB_CONCURRENCY, timeout=GRAB_TIMEOUT, camera_ids=None):
+    """
+    Grabs previews for active cameras whose last attempt is older than `max_age` seconds,
+    least recently attempted first. Returns {"refreshed", "failed", "skipped"}.
+    """
+    from .models import Camera
+
+    cameras = Camera.objects.filter(is_active=True)
+    if camera_ids:
+        cameras = cameras.filter(id__in=camera_ids)
+
+    due = _claim_due(cameras, max_age)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda item: grab_preview(item[1], item[2], timeout), due))
+
+    refreshed = sum(results)
+    summary = {"refreshed": refreshed, "failed": len(results) - refreshed, "skipped": cameras.count() - len(due)}
+    logger.info(f"Preview refresh finished: {summary}")
+    return summary
@@ -0,0 +1,267 @@
+"""
+Edge relay: re-serves an origin's MJPEG feeds to viewers on a remote site.
+
+Each camera is pulled from the origin once, however many local viewers watch it, and
+only its newest frame is kept. The upstream connection opens with the first local viewer
+and closes LINGER seconds after the last one leaves. Viewers use the origin's contract,
+`/api/video_feed/<id>/` with optional `?fps=`.
+"""
+import re
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, parse_qs
+from urllib.request import urlopen
+from django.conf import settings
+from .signing import sign_stream_url, verify_camera_signature
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+LINGER = 10  # Seconds an upstream feed stays connected after its last local viewer leaves
+RECONNECT_DELAY = 2  # Seconds between upstream connection attempts while viewers are waiting
+UPSTREAM_TIMEOUT = 30  # Seconds to connect to the origin, or to wait for its next bytes
+FIRST_FRAME_TIMEOUT = 15  # Seconds a new viewer waits for the first frame before getting a 504
+FRAME_TIMEOUT = 15  # Seconds without a new frame before a viewer is disconnected
+FEED_PATH_RE = re.compile(r"^/api/video_feed/(?P<camera_id>\d+)/?$")
+STATUS_PATH = "/api/relay/status/"
+
+
+class UpstreamFeed:
+    """One camera's connection to the origin and its newest frame."""
+
+    def __init__(self, camera_id, origin, linger=LINGER):
+        self.camera_id = camera_id
+        self.url = f"{origin.rstrip('/')}/api/video_feed/{camera_id}/"
+        self.linger = linger
+        self._cond = threading.Condition()
+        self._thread = None
+        self.frame = None
+        self.seq = 0
+        self.received_at = 0.0
+        self.viewers = 0
+        self.last_viewer_left = 0.0
+        self.connected = False
+        self.connects = 0
+        self.last_error = None
+        self.refused_status = None  # Status of the origin's last non-200 answer, passed on to new viewers
+        self.refusals = 0  # Non-200 answers so far; viewers only honour those after they joined
+
+    def acquire(self):
+        """Adds a viewer; returns the refusal count to pass to wait_frame."""
+        with self._cond:
+            self.viewers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"relay-upstream-{self.camera_id}", daemon=True)
+                self._thread.start()
+            return self.refusals
+
+    def release(self):
+        with self._cond:
+            self.viewers -= 1
+            if self.viewers == 0:
+                self.last_viewer_left = time.time()
+
+    def _wanted(self):
+        return self.viewers > 0 or time.time() - self.last_viewer_left < self.linger
+
+    def wait_frame(self, after_seq, timeout, refusals_seen=0):
+        """
+        Returns (seq, frame) newer than `after_seq`, or None on timeout or when the origin refuses
+        the feed. Only refusals after the first `refusals_seen` count: a viewer that joins while the
+        upstream is retrying after a refusal waits for the retry instead of inheriting the old answer.
+        """
+        with self._cond:
+            fresh = lambda: self.frame is not None and self.seq > after_seq
+            self._cond.wait_for(lambda: fresh() or self.refusals > refusals_seen, timeout)
+            if fresh():
+                return self.seq, self.frame
+            return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._wanted():
+                    self._thread = None
+                    self.frame = None  # A later viewer must not be shown a frame from before the gap
+                    self.refused_status = None  # Nor be turned away with an answer from before it
+                    return
+            try:
+                self._pull()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Relay upstream for camera {self.camera_id} failed: {e}")
+            self.connected = False
+            if self._wanted():
+                time.sleep(RECONNECT_DELAY)
+
+    def _pull(self):
+        # http.client rather than requests: its readline() returns as soon as a line is in,
+        # where requests' raw reads block until the whole chunk size has arrived.
+        try:
+            upstream = urlopen(sign_stream_url(self.url, self.camera_id), timeout=UPSTREAM_TIMEOUT)
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("message")
+            except ValueError:
+                message = e.reason
+            with self._cond:
+                self.frame = None
+                self.refused_status = e.code
+                self.refusals += 1
+                self._cond.notify_all()
+            raise RuntimeError(f"origin answered {e.code}: {message}")
+
+        with upstream:
+            self.connected = True
+            self.connects += 1
+            self.last_error = None
+            self.refused_status = None
+            logger.info(f"Relay connected upstream for camera {self.camera_id}")
+            while self._wanted():
+                frame = read_multipart_frame(upstream)
+                if frame is None:
+                    raise RuntimeError("origin closed the stream")
+                with self._cond:
+                    self.frame = frame
+                    self.seq += 1
+                    self.received_at = time.time()
+                    self._cond.notify_all()
+        logger.info(f"Relay disconnected upstream for camera {self.camera_id}")
+
+    def snapshot(self):
+        return {
+            "camera_id": self.camera_id,
+            "viewers": self.viewers,
+            "connected": self.connected,
+            "connects": self.connects,
+            "frames_received": self.seq,
+            "frame_age": round(time.time() - self.received_at, 2) if self.received_at else None,
+            "last_error": self.last_error,
+        }
+
+
+def read_multipart_frame(reader):
+    """Reads one part of the origin's multipart stream; returns its JPEG bytes, or None at EOF."""
+    length = None
+    while True:
+        line = reader.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue  # Blank line after a boundary or the previous part
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    frame = reader.read(length)
+    return frame if len(frame) == length else None
+
+
+class RelayHub:
+    def __init__(self, origin, linger=LINGER):
+        self.origin = origin
+        self.linger = linger
+        self._feeds = {}  # {camera_id: UpstreamFeed}
+        self._lock = threading.Lock()
+
+    def feed(self, camera_id):
+        with self._lock:
+            if camera_id not in self._feeds:
+                self._feeds[camera_id] = UpstreamFeed(camera_id, self.origin, self.linger)
+            return self._feeds[camera_id]
+
+    def snapshot(self):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        return [feed.snapshot() for feed in feeds if feed.viewers or feed.connected]
+
+
+class RelayRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HULCCTVRelay/1.0"
+    protocol_version = "HTTP/1.0"  # The feed ends when the connection closes, as with the origin
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+    def send_json(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == STATUS_PATH:
+            self.send_json(200, {"results": self.server.hub.snapshot(), "status": 200})
+            return
+        match = FEED_PATH_RE.match(parts.path)
+        if match is None:
+            self.send_json(404, {"message": "Not found", "status": 404})
+            return
+
+        camera_id = int(match["camera_id"])
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if "sig" in query:
+            if not verify_camera_signature(camera_id, query.get("exp"), query["sig"], query):
+                self.send_json(403, {"message": "Stream URL signature invalid or expired", "status": 403})
+                return
+        elif settings.STREAM_REQUIRE_SIGNED_URLS:
+            self.send_json(403, {"message": "Stream URL must be signed", "status": 403})
+            return
+
+        target_fps = getattr(settings, "STREAM_TARGET_FPS", 5)
+        try:
+            fps = min(float(query["fps"]), target_fps) if query.get("fps") else target_fps
+        except ValueError:
+            fps = target_fps
+        if fps <= 0:
+            fps = target_fps
+        self.stream(self.server.hub.feed(camera_id), fps)
+
+    def stream(self, feed, fps):
+        refusals_seen = feed.acquire()
+        try:
+            latest = feed.wait_frame(0, FIRST_FRAME_TIMEOUT, refusals_seen)
+            if latest is None:
+                code = feed.refused_status or 504
+                self.send_json(code, {"message": f"No frames from origin: {feed.last_error}", "status": code})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            interval = 1.0 / fps
+            while True:
+                seq, frame = latest
+                sent_at = time.monotonic()
+                self.wfile.write(
+                    b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                    + str(len(frame)).encode() + b"\r\n\r\n" + frame + b"\r\n"
+                )
+                self.wfile.flush()
+                time.sleep(max(interval - (time.monotonic() - sent_at), 0))
+                latest = feed.wait_frame(seq, FRAME_TIMEOUT, refusals_seen)  # Frames that arrived meanwhile are skipped
+                if latest is None:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            feed.release()
+
+
+class RelayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, hub):
+        super().__init__(address, RelayRequestHandler)
+        self.hub = hub
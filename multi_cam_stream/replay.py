@@ -0,0 +1,404 @@
+"""
+Instant replay. Every JPEG a stream worker encodes is appended to one shared-memory
+arena, preallocated at STREAM_REPLAY_BUDGET_MB: frame bytes go into a ring, and a
+fixed table of (camera, seq, capture time, offset, length) entries into a second
+segment, so history costs no Python objects and no Manager round trips. When the ring
+wraps, the oldest frames of all cameras are evicted first, so every camera keeps about
+the same number of seconds; replays and clips serve up to STREAM_REPLAY_SECONDS of it.
+
+The arena also holds each camera's newest frame, which is what live viewers and
+analytics read. A live camera's newest frame is carried over rather than evicted, so a
+stalled camera's last picture survives any amount of traffic from the others.
+"""
+import os
+import csv
+import io
+import math
+import time
+import struct
+import logging
+import zipfile
+import contextlib
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+from .utils import ChunkSink
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+MIN_ARENA_BYTES = 8 * 1024 * 1024
+SHM_SHARE = 0.5  # Largest share of free /dev/shm an arena may take; writing past a full tmpfs is a SIGBUS
+BYTES_PER_ENTRY = 4096  # One index entry per this many arena bytes; streams of smaller frames run out of entries first
+MAX_FRAME_SHARE = 8  # Frames larger than 1/8 of the arena are not stored
+CAMERA_SLOTS = 4096  # Cameras tracked at once, in an open-addressing table
+LOCK_TIMEOUT = 0.5  # Seconds to wait for the arena lock before giving up on a frame
+MAX_RESCUES = 4  # Newest frames of other live cameras carried over per append
+DEFAULT_REPLAY_SECONDS = 10
+MAX_REPLAY_SPEED = 16
+CLIP_FORMATS = ("mjpeg", "zip")
+CLIP_CONTENT_TYPES = {"mjpeg": "video/x-motion-jpeg", "zip": "application/zip"}
+
+_HEADER = struct.Struct("<QQQQ")  # next serial, oldest live serial, frames evicted, frames carried over
+_HOLDER = struct.Struct("<q")  # pid of the process that last took the lock
+_ENTRY = struct.Struct("<QQqIdQI")  # serial, camera's previous serial, camera id, seq, capture time, offset, length
+_SLOT = struct.Struct("<qQQ")  # camera id (0: empty), newest serial, live flag
+EMPTY_SLOT = 0  # Camera ids start at 1, and fresh shared memory is zero-filled
+
+
+def mjpeg_part(jpeg):
+    """One part of a multipart/x-mixed-replace MJPEG response."""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'Content-Length: ' + f"{len(jpeg)}".encode() + b'\r\n'
+            b'\r\n' + jpeg + b'\r\n')
+
+
+def arena_size(budget_bytes, shm_dir="/dev/shm"):
+    """The budget, capped to what the tmpfs behind shared memory can hold."""
+    size = max(int(budget_bytes), MIN_ARENA_BYTES)
+    try:
+        stats = os.statvfs(shm_dir)
+    except OSError:
+        return size
+    limit = int(stats.f_bavail * stats.f_frsize * SHM_SHARE)
+    if size > limit:
+        logger.warning(
+            f"Replay budget of {size // 2**20} MB exceeds {SHM_SHARE:.0%} of free {shm_dir}; "
+            f"using {max(limit, MIN_ARENA_BYTES) // 2**20} MB"
+        )
+        size = max(limit, MIN_ARENA_BYTES)
+    return size
+
+
+def process_gone(pid):
+    """True if `pid` has exited (a zombie included) or never existed."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] in ("Z", "X")
+    except FileNotFoundError:
+        return True
+    except (OSError, IndexError):
+        return False
+
+
+class ReplayArena:
+    """
+    Frame history of all cameras in two shared-memory segments, guarded by one
+    multiprocessing lock. Frames are numbered by a global serial; each entry links to
+    its camera's previous serial, so a camera's history is walked without a scan.
+    """
+
+    def __init__(self, data, index, lock, size, max_entries):
+        self._data = data
+        self._index = index
+        self.lock = lock
+        self.size = size
+        self.max_entries = max_entries
+        self._holder_at = _HEADER.size
+        self._entries_at = _HEADER.size + _HOLDER.size
+        self._slots_at = self._entries_at + max_entries * _ENTRY.size
+
+    @classmethod
+    def create(cls, budget_bytes):
+        size = arena_size(budget_bytes)
+        max_entries = size // BYTES_PER_ENTRY
+        data = shared_memory.SharedMemory(create=True, size=size)
+        index = shared_memory.SharedMemory(
+            create=True, size=_HEADER.size + _HOLDER.size + max_entries * _ENTRY.size + CAMERA_SLOTS * _SLOT.size
+        )
+        _HEADER.pack_into(index.buf, 0, 1, 1, 0, 0)  # Serials start at 1; 0 means "none"
+        return cls(data, index, mp.Lock(), size, max_entries)
+
+    def __getstate__(self):
+        # Only needed with the spawn start method; fork hands the segments down as they are.
+        return {"data": self._data.name, "index": self._index.name, "lock": self.lock,
+                "size": self.size, "max_entries": self.max_entries}
+
+    def __setstate__(self, state):
+        data = shared_memory.SharedMemory(name=state["data"])
+        index = shared_memory.SharedMemory(name=state["index"])
+        # Attaching registers the segments with this process's resource tracker, which would unlink them on exit.
+        for segment in (data, index):
+            resource_tracker.unregister(segment._name, "shared_memory")
+        self.__init__(data, index, state["lock"], state["size"], state["max_entries"])
+
+    def destroy(self):
+        for segment in (self._data, self._index):
+            try:
+                segment.close()
+                segment.unlink()
+            except (BufferError, FileNotFoundError):
+                pass
+
+    @contextlib.contextmanager
+    def _hold(self):
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT) and not self._recover_lock():
+            raise TimeoutError("replay arena lock not released")
+        _HOLDER.pack_into(self._index.buf, self._holder_at, os.getpid())
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def _recover_lock(self):
+        """Frees the lock if the process holding it was killed with it; True if this process then got it."""
+        holder = _HOLDER.unpack_from(self._index.buf, self._holder_at)[0]
+        if not process_gone(holder):
+            return False
+        logger.warning(f"Replay arena lock was held by process {holder}, which is gone; releasing it")
+        try:
+            self.lock.release()
+        except ValueError:
+            pass  # Another process released it first
+        return self.lock.acquire(timeout=LOCK_TIMEOUT)
+
+    # --- index helpers, called with the lock held ---------------------------
+    def _entry(self, serial):
+        return _ENTRY.unpack_from(self._index.buf, self._entries_at + (serial % self.max_entries) * _ENTRY.size)
+
+    def _slot_position(self, camera_id, create=False):
+        """Position of the camera's slot; with `create`, claims a free one. None if absent or full."""
+        idle = None
+        for probe in range(CAMERA_SLOTS):
+            position = self._slots_at + ((camera_id + probe) % CAMERA_SLOTS) * _SLOT.size
+            key, _, live = _SLOT.unpack_from(self._index.buf, position)
+            if key == camera_id:
+                return position
+            if key == EMPTY_SLOT:
+                if not create:
+                    return None
+                _SLOT.pack_into(self._index.buf, position, camera_id, 0, 0)
+                return position
+            if idle is None and not live:
+                idle = position
+        # Table full: a stopped camera's slot, and with it that camera's history, goes to the new one.
+        if create and idle is not None:
+            _SLOT.pack_into(self._index.buf, idle, camera_id, 0, 0)
+            return idle
+        return None
+
+    def _live(self, serial, oldest, next_serial):
+        return serial and oldest <= serial < next_serial
+
+    def _reserve(self, length, state, camera_id, carry):
+        """Offset for `length` bytes at the head of the ring, evicting the oldest frames until they fit."""
+        while True:
+            next_serial, oldest = state["next"], state["oldest"]
+            if next_serial == oldest:
+                return 0
+            if next_serial - oldest < self.max_entries:
+                tail_offset = self._entry(oldest)[5]
+                _, _, _, _, _, newest_offset, newest_length = self._entry(next_serial - 1)
+                head = newest_offset + newest_length
+                if newest_offset >= tail_offset:  # Live bytes in [tail_offset, head)
+                    if head + length <= self.size:
+                        return head
+                    if length <= tail_offset:
+                        return 0
+                elif head + length <= tail_offset:  # Wrapped: live bytes in [tail_offset, size) and [0, head)
+                    return head
+            self._evict(state, camera_id, carry)
+
+    def _evict(self, state, camera_id, carry):
+        serial, previous, owner, seq, captured_at, offset, length = self._entry(state["oldest"])
+        state["oldest"] += 1
+        state["evicted"] += 1
+        if owner == camera_id or state["rescues"] >= MAX_RESCUES:
+            return  # The appending camera's frame supersedes its own newest
+        position = self._slot_position(owner)
+        if position is not None:
+            _, newest, live = _SLOT.unpack_from(self._index.buf, position)
+            if live and newest == serial:
+                carry.append((owner, seq, captured_at, previous, bytes(self._data.buf[offset:offset + length])))
+                state["carried"] += 1
+                state["rescues"] += 1
+
+    def _store_header(self, state):
+        _HEADER.pack_into(self._index.buf, 0, state["next"], state["oldest"], state["evicted"], state["carried"])
+
+    def _write(self, state, camera_id, seq, captured_at, previous, jpeg, carry):
+        offset = self._reserve(len(jpeg), state, camera_id, carry)
+        # Evictions are recorded before their bytes are overwritten, so a writer killed mid-copy leaves no torn frame.
+        self._store_header(state)
+        serial = state["next"]
+        self._data.buf[offset:offset + len(jpeg)] = jpeg
+        _ENTRY.pack_into(
+            self._index.buf, self._entries_at + (serial % self.max_entries) * _ENTRY.size,
+            serial, previous, camera_id, seq, captured_at, offset, len(jpeg),
+        )
+        state["next"] = serial + 1
+        self._store_header(state)
+        return serial
+
+    # --- writers --------------------------------------------------------------
+    def append(self, camera_id, seq, captured_at, jpeg):
+        """Stores a camera's newest frame; returns its serial, or None if it was not stored."""
+        if len(jpeg) > self.size // MAX_FRAME_SHARE:
+            logger.warning(f"Frame of {len(jpeg)} bytes from camera {camera_id} is too large for the replay arena")
+            return None
+        with self._hold():
+            next_serial, oldest, evicted, carried = _HEADER.unpack_from(self._index.buf, 0)
+            state = {"next": next_serial, "oldest": oldest, "evicted": evicted, "carried": carried, "rescues": 0}
+            position = self._slot_position(camera_id, create=True)
+            if position is None:
+                logger.error(f"Replay arena has no free camera slot for camera {camera_id}")
+                return None
+            newest = _SLOT.unpack_from(self._index.buf, position)[1]
+            carry = []
+            serial = self._write(state, camera_id, seq, captured_at, newest, jpeg, carry)
+            _SLOT.pack_into(self._index.buf, position, camera_id, serial, 1)
+            # Newest frames of other live cameras that the ring wrapped onto go back in at the head.
+            while carry:
+                owner, owner_seq, owner_captured_at, previous, owner_jpeg = carry.pop()
+                owner_serial = self._write(state, owner, owner_seq, owner_captured_at, previous, owner_jpeg, carry)
+                _SLOT.pack_into(self._index.buf, self._slot_position(owner), owner, owner_serial, 1)
+            return serial
+
+    def release(self, camera_id):
+        """Marks a camera's stream as stopped; its history stays replayable until evicted."""
+        with self._hold():
+            position = self._slot_position(camera_id)
+            if position is not None:
+                _, newest, _ = _SLOT.unpack_from(self._index.buf, position)
+                _SLOT.pack_into(self._index.buf, position, camera_id, newest, 0)
+
+    # --- readers --------------------------------------------------------------
+    def read(self, serial):
+        """Returns (seq, captured_at, jpeg) of a frame, or None once it has been evicted."""
+        with self._hold():
+            next_serial, oldest, _, _ = _HEADER.unpack_from(self._index.buf, 0)
+            if not self._live(serial, oldest, next_serial):
+                return None
+            _, _, _, seq, captured_at, offset, length = self._entry(serial)
+            return seq, captured_at, bytes(self._data.buf[offset:offset + length])
+
+    def read_latest(self, camera_id, after=None):
+        """Returns (serial, seq, captured_at, jpeg) of a streaming camera's newest frame if its serial is not `after`."""
+        with self._hold():
+            position = self._slot_position(camera_id)
+            if position is None:
+                return None
+            _, serial, live = _SLOT.unpack_from(self._index.buf, position)
+            next_serial, oldest, _, _ = _HEADER.unpack_from(self._index.buf, 0)
+            if not live or serial == after or not self._live(serial, oldest, next_serial):
+                return None
+            _, _, _, seq, captured_at, offset, length = self._entry(serial)
+            return serial, seq, captured_at, bytes(self._data.buf[offset:offset + length])
+
+    def history(self, camera_id, seconds=None):
+        """
+        (serial, seq, captured_at, length) of a camera's stored frames, oldest first; with
+        `seconds`, only those captured that long before its newest frame or later.
+        """
+        frames = []
+        with self._hold():
+            position = self._slot_position(camera_id)
+            if position is None:
+                return frames
+            serial = _SLOT.unpack_from(self._index.buf, position)[1]
+            next_serial, oldest, _, _ = _HEADER.unpack_from(self._index.buf, 0)
+            while self._live(serial, oldest, next_serial):
+                _, previous, _, seq, captured_at, _, length = self._entry(serial)
+                if seconds is not None and frames and captured_at < frames[0][2] - seconds:
+                    break
+                frames.append((serial, seq, captured_at, length))
+                serial = previous
+        frames.reverse()
+        return frames
+
+    def snapshot(self):
+        with self._hold():
+            next_serial, oldest, evicted, carried = _HEADER.unpack_from(self._index.buf, 0)
+            used = oldest_time = None
+            if next_serial > oldest:
+                tail_offset, oldest_time = self._entry(oldest)[5], self._entry(oldest)[4]
+                _, _, _, _, _, newest_offset, newest_length = self._entry(next_serial - 1)
+                head = newest_offset + newest_length
+                used = head - tail_offset if newest_offset >= tail_offset else self.size - tail_offset + head
+            streaming = {}
+            for slot in range(CAMERA_SLOTS):
+                key, _, live = _SLOT.unpack_from(self._index.buf, self._slots_at + slot * _SLOT.size)
+                if key != EMPTY_SLOT:
+                    streaming[key] = bool(live)
+
+        cameras = {}
+        for camera_id, live in sorted(streaming.items()):
+            frames = self.history(camera_id)
+            if frames:
+                cameras[camera_id] = {
+                    "live": live,
+                    "frames": len(frames),
+                    "bytes": sum(frame[3] for frame in frames),
+                    "seconds": round(frames[-1][2] - frames[0][2], 1),
+                }
+        return {
+            "budget_mb": round(self.size / 2**20, 1),
+            "used_mb": round(used / 2**20, 1) if used is not None else 0,
+            "frames": next_serial - oldest,
+            "max_frames": self.max_entries,
+            "oldest_frame_age": round(time.time() - oldest_time, 1) if oldest_time else None,
+            "frames_evicted": evicted,
+            "frames_carried_over": carried,
+            "cameras": cameras,
+        }
+
+
+# -----------------------------------------
+# FUNCTION: Replay and Clip Generators
+# -----------------------------------------
+def generate_replay(arena, frames, speed=1.0):
+    """Yields the frames as MJPEG parts, spaced as they were captured, `speed` times faster."""
+    started = time.monotonic()
+    first_captured = frames[0][2]
+    for serial, _, captured_at, _ in frames:
+        wait = started + (captured_at - first_captured) / speed - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        frame = arena.read(serial)
+        if frame is not None:  # Evicted since the replay started otherwise
+            yield mjpeg_part(frame[2])
+
+
+def stream_clip(arena, frames, fmt, camera_id):
+    """Yields the frames as one download: concatenated JPEGs (.mjpeg) or a ZIP of JPEGs with an index.csv."""
+    if fmt == "mjpeg":
+        for serial, *_ in frames:
+            frame = arena.read(serial)
+            if frame is not None:
+                yield frame[2]
+        return
+
+    sink = ChunkSink()
+    index = io.StringIO()
+    writer = csv.writer(index)
+    writer.writerow(["file", "seq", "captured_at"])
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:  # JPEGs do not compress
+        for number, (serial, *_) in enumerate(frames, start=1):
+            frame = arena.read(serial)
+            if frame is None:
+                continue
+            seq, captured_at, jpeg = frame
+            name = f"camera{camera_id}_{number:05d}.jpg"
+            info = zipfile.ZipInfo(name, date_time=time.localtime(captured_at)[:6])
+            archive.writestr(info, jpeg)
+            writer.writerow([name, seq, f"{captured_at:.3f}"])
+            yield sink.drain()
+        archive.writestr("index.csv", index.getvalue())
+    yield sink.drain()
+
+
+def parse_replay_seconds(value, limit):
+    """Seconds of history asked for: DEFAULT_REPLAY_SECONDS if absent, at most `limit`. Raises ValueError."""
+    seconds = float(value) if value else DEFAULT_REPLAY_SECONDS
+    if not (math.isfinite(seconds) and seconds > 0):
+        raise ValueError("seconds must be a positive number")
+    return min(seconds, limit)
+
+
+def parse_replay_speed(value):
+    speed = float(value) if value else 1.0
+    if not (math.isfinite(speed) and 0 < speed <= MAX_REPLAY_SPEED):
+        raise ValueError(f"speed must be above 0 and at most {MAX_REPLAY_SPEED}")
+    return speed
@@ -0,0 +1,130 @@
+"""
+Region-of-interest sub-streams. A viewer asks for part of a camera's picture with
+`?roi=x,y,w,h` (fractions of the frame) or `?zoom=2&center=cx,cy`. The request is
+snapped to a grid of whole percents, so viewers zoomed on the same doorway share one
+sub-stream. The camera's ingest worker crops every live ROI from the frame it has
+already decoded and encodes each once; no second RTSP session or decode is opened.
+
+Demand lives in shared state as {(camera_id, roi): expires_at}. Each web process
+refreshes the ROIs its viewers watch, and the worker drops ROIs nobody refreshed.
+Each crop's seq is published apart from its bytes, so channels poll the small value
+and copy a JPEG through the Manager only when there is a new one.
+"""
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+ROI_GRID = 100  # ROI edges snap to 1% of the frame
+MIN_ROI_PERCENT = 5  # Smallest ROI edge; below that a 640x480 decode has nothing left to show
+MAX_ZOOM = ROI_GRID // MIN_ROI_PERCENT
+ROI_TTL = 10  # Seconds an ROI stays encoded after the last refresh of its demand
+ROI_REFRESH_INTERVAL = 2  # Seconds between demand refreshes by a web process
+WORKER_REFRESH_INTERVAL = 1  # Seconds between re-reads of the demand by the ingest worker
+
+
+def parse_roi(roi=None, zoom=None, center=None):
+    """
+    Returns the canonical ROI key "x,y,w,h" in whole percents, or None for the full
+    frame. Raises ValueError for malformed or empty regions.
+    """
+    if roi:
+        x, y, w, h = (float(part) for part in roi.split(","))
+    elif zoom:
+        zoom = float(zoom)
+        if not 1 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom must be between 1 and {MAX_ZOOM}")
+        cx, cy = (float(part) for part in center.split(",")) if center else (0.5, 0.5)
+        w = h = 1 / zoom
+        x, y = cx - w / 2, cy - h / 2
+    else:
+        return None
+    if not all(math.isfinite(value) for value in (x, y, w, h)):
+        raise ValueError("ROI values must be finite numbers")
+
+    w = max(round(w * ROI_GRID), MIN_ROI_PERCENT)
+    h = max(round(h * ROI_GRID), MIN_ROI_PERCENT)
+    if w > ROI_GRID or h > ROI_GRID:
+        raise ValueError("ROI is larger than the frame")
+    # A region hanging over an edge is shifted back inside, as a zoom near the border would be.
+    x = min(max(round(x * ROI_GRID), 0), ROI_GRID - w)
+    y = min(max(round(y * ROI_GRID), 0), ROI_GRID - h)
+    if (x, y, w, h) == (0, 0, ROI_GRID, ROI_GRID):
+        return None
+    return f"{x},{y},{w},{h}"
+
+
+def roi_box(roi, width, height):
+    """Pixel box (x0, y0, x1, y1) of an ROI key in a width x height frame."""
+    x, y, w, h = (int(part) for part in roi.split(","))
+    return (x * width // ROI_GRID, y * height // ROI_GRID,
+            (x + w) * width // ROI_GRID, (y + h) * height // ROI_GRID)
+
+
+def request_roi(shared, camera_id, roi, now=None):
+    """Marks an ROI as watched for the next ROI_TTL seconds."""
+    shared.roi_requests[(camera_id, roi)] = (now or time.time()) + ROI_TTL
+
+
+def drop_camera_rois(shared, camera_id):
+    """Forgets a stopped camera's ROI demand and frames."""
+    for key in [key for key in shared.roi_requests.keys() if key[0] == camera_id]:
+        shared.roi_requests.pop(key, None)
+    for key in [key for key in shared.roi_frames.keys() if key[0] == camera_id]:
+        shared.roi_seqs.pop(key, None)
+        shared.roi_frames.pop(key, None)
+
+
+class RoiEncoder:
+    """Ingest-worker side: crops and encodes the live ROIs of one camera from each decoded frame."""
+
+    def __init__(self, camera_id, shared, encode_params, width, height):
+        self.camera_id = camera_id
+        self.shared = shared
+        self.encode_params = encode_params
+        self.width = width
+        self.height = height
+        self.boxes = {}  # {roi: pixel box}, as of the last refresh
+        self._refreshed_at = 0.0
+        # Counters
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+
+    def resize(self, width, height):
+        """Follows a change of the stream's resolution."""
+        self.width, self.height = width, height
+        self.boxes = {roi: roi_box(roi, width, height) for roi in self.boxes}
+
+    def refresh(self, now):
+        if now - self._refreshed_at < WORKER_REFRESH_INTERVAL:
+            return
+        self._refreshed_at = now
+        try:
+            wanted = {
+                roi for (camera_id, roi), expires_at in self.shared.roi_requests.items()
+                if camera_id == self.camera_id and expires_at > now
+            }
+            for roi in set(self.boxes) - wanted:
+                self.shared.roi_seqs.pop((self.camera_id, roi), None)
+                self.shared.roi_frames.pop((self.camera_id, roi), None)
+                self.shared.roi_requests.pop((self.camera_id, roi), None)
+            self.boxes = {roi: self.boxes.get(roi) or roi_box(roi, self.width, self.height) for roi in wanted}
+        except Exception as e:
+            logger.error(f"Could not read ROI demand for camera {self.camera_id}: {e}")
+
+    def publish(self, frame, seq, captured_at):
+        """Encodes every live ROI of `frame` (a BGR array) and publishes it under the frame's seq."""
+        import cv2
+
+        for roi, (x0, y0, x1, y1) in self.boxes.items():
+            started = time.perf_counter()
+            _, jpeg = cv2.imencode(".jpg", frame[y0:y1, x0:x1], self.encode_params)  # A view; no copy
+            self.encode_seconds += time.perf_counter() - started
+            self.frames_encoded += 1
+            # Frame before seq: a channel that sees the new seq always finds a crop at least that new.
+            self.shared.roi_frames[(self.camera_id, roi)] = (seq, captured_at, jpeg.tobytes())
+            self.shared.roi_seqs[(self.camera_id, roi)] = seq
@@ -15,7 +15,16 @@ class SectionSerializer(serializers.ModelSerializer):
 
     
 class CameraSerializer(serializers.ModelSerializer):
+    # Profile the camera streams with right now, after any degradation; null while it is not streaming here.
+    live_profile = serializers.SerializerMethodField()
+
     class Meta:
         model = Camera
         fields = '__all__'
 
+    def get_live_profile(self, camera):
+        from .streaming import peek_runtime
+
+        runtime = peek_runtime()
+        return runtime.degradation.camera_state(camera.id) if runtime else None
+
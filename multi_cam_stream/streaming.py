@@ -0,0 +1,635 @@
+"""
+Camera stream runtime. Nothing here starts at import time: the Manager, the replay
+arena and background threads are created by get_runtime() on first stream use,
+and cv2/numpy are only imported where frames are decoded or encoded.
+"""
+import os
+import time
+import atexit
+import random
+import signal
+import logging
+import threading
+import subprocess
+import multiprocessing as mp
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .subscriptions import StreamSubscriptions, start_session_reaper
+from .tracing import Tracer, NULL_TRACE
+from .cluster import get_cluster
+from .fanout import FrameHub
+from .ingest import FrameReader, IngestStats
+from .roi import RoiEncoder, drop_camera_rois
+from .replay import ReplayArena, mjpeg_part
+from .analytics import AnalyticsScheduler, analytics_workers
+from .degradation import DegradationController, DEFAULT_PROFILE, effective_profile, start_degradation_controller
+from .hls import HlsRemuxer
+from .admission import AdmissionController, DEFAULT_PRIORITY, QUEUE_TTL, INGEST, HLS_REMUX, split_stream_key, start_admission_sampler
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+FRAME_TIMEOUT = 30  # Seconds without a frame before ffmpeg is respawned; a backstop for the ffmpeg timeouts
+RECONNECT_BASE_DELAY = 1  # Seconds before the first respawn after a drop
+RECONNECT_MAX_DELAY = 60
+MAX_CONCURRENT_STREAMS = 30
+FRAME_WIDTH = 640  # Blank frame size; streams use their camera's profile
+FRAME_HEIGHT = 480
+JPEG_QUALITY = 80
+PROFILE_CHECK_INTERVAL = 1  # Seconds between re-reads of its stream profile by the ingest worker
+
+# Proxies and the replay arena a stream worker process needs; picklable, so it also works with the spawn start method.
+SharedStreamState = namedtuple(
+    "SharedStreamState",
+    [
+        "replay", "active_streams", "first_frame_times", "frame_info", "ingest_stats", "roi_requests", "roi_frames",
+        "roi_seqs", "stream_profiles",
+    ],
+)
+
+
+class StreamRuntime:
+    """Shared stream state for this process (Manager-backed where stream workers write to it)."""
+
+    def __init__(self):
+        self.manager = mp.Manager()
+        # Every camera's recent frames, newest included, in one shared-memory arena of fixed size
+        self.replay = ReplayArena.create(getattr(settings, "STREAM_REPLAY_BUDGET_MB", 256) * 2**20)
+        atexit.register(self.replay.destroy)
+        self.active_streams = self.manager.dict()  # {camera_id: process_pid}
+        self.first_frame_times = self.manager.dict()  # {camera_id: wall time of the first encoded frame}
+        self.frame_info = self.manager.dict()  # {camera_id: (seq, wall time) of the newest frame}
+        self.ingest_stats = self.manager.dict()  # {camera_id: reader/encoder pipeline counters}
+        self.roi_requests = self.manager.dict()  # {(camera_id, roi): expiry of the viewers' demand}
+        self.roi_frames = self.manager.dict()  # {(camera_id, roi): (seq, wall time, jpeg) of the newest crop}
+        self.roi_seqs = self.manager.dict()  # {(camera_id, roi): seq of the newest crop}, polled without the bytes
+        self.stream_profiles = self.manager.dict()  # {camera_id: effective profile the worker runs with}
+        self.shared = SharedStreamState(
+            self.replay, self.active_streams, self.first_frame_times, self.frame_info, self.ingest_stats,
+            self.roi_requests, self.roi_frames, self.roi_seqs, self.stream_profiles,
+        )
+        self.hub = FrameHub(self.shared)  # Fans each camera's newest frame out to its viewers
+        self.subscriptions = StreamSubscriptions()  # Per-client camera sets for this process
+        self.section_lock = mp.Lock()
+        self.tracer = Tracer()  # Ring buffer of section-switch traces for this process
+        self.admission = AdmissionController.from_settings(MAX_CONCURRENT_STREAMS, keep_queued=self.subscriptions.is_wanted)
+        self.stream_processes = {}  # {camera_id: mp.Process}, the worker behind each stream
+        self.remuxer = HlsRemuxer(self.admission, ffmpeg_source_args, on_released=start_queued_streams)
+        self.analytics_results = self.manager.dict()  # {camera_id: {processor name: latest result}}
+        self.analytics = None  # AnalyticsScheduler, when processors are configured
+        self.degradation = DegradationController.from_settings(self.shared)
+        self._reaper_thread = None
+        self._sampler_thread = None
+        self._degradation_thread = None
+        self._reaper_lock = threading.Lock()
+
+    def ensure_session_reaper(self):
+        """Starts the background thread that expires idle stream sessions (once per process)."""
+        with self._reaper_lock:
+            if self._reaper_thread is None:
+                self._reaper_thread = start_session_reaper(self.subscriptions, stop_camera_streams)
+
+    def ensure_admission_sampler(self):
+        """Starts the background thread that measures per-stream cost (once per process)."""
+        with self._reaper_lock:
+            if self._sampler_thread is None:
+                self._sampler_thread = start_admission_sampler(self.admission, stream_pids, reconcile_streams)
+
+    def ensure_degradation_controller(self):
+        """Starts the background thread that degrades and restores stream profiles with load (once per process)."""
+        with self._reaper_lock:
+            if self._degradation_thread is None:
+                self._degradation_thread = start_degradation_controller(self.degradation)
+
+    def ensure_analytics(self):
+        """Starts the analytics scheduler and its process pool (once per process) if any processor is configured."""
+        processors = getattr(settings, "STREAM_ANALYTICS_PROCESSORS", {})
+        with self._reaper_lock:
+            if self.analytics is None and processors:
+                workers = analytics_workers(self.admission.cpu_budget)
+                self.analytics = AnalyticsScheduler(self.shared, self.analytics_results, processors, workers)
+                self.analytics.start()
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """Returns this process's stream runtime, creating it on first use."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                started = time.perf_counter()
+                _runtime = StreamRuntime()
+                logger.info(f"Stream runtime started in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return _runtime
+
+
+def peek_runtime():
+    """Returns the stream runtime if it has been started, without starting it."""
+    return _runtime
+
+# -----------------------------------------
+# FUNCTION: Start Camera Stream
+# -----------------------------------------
+def start_camera_process(camera_id, camera_url, trace=NULL_TRACE, priority=DEFAULT_PRIORITY):
+    """
+    Starts a new camera stream process if not already running and the node budget allows it.
+    Returns the AdmissionDecision; streams that are queued or rejected are not started.
+    """
+    runtime = get_runtime()
+    runtime.ensure_admission_sampler()
+    runtime.ensure_degradation_controller()
+    runtime.ensure_analytics()
+    with trace.span("admission", camera_id=camera_id):
+        decision = runtime.admission.request(camera_id, priority, camera_url)
+    if camera_id in runtime.active_streams or not decision.admitted:
+        if not decision.admitted:
+            logger.warning(f"Camera {camera_id} {decision.state} at priority {priority}: {decision.reason}")
+        return decision  # Process already running, or no room for it
+
+    # Lower-priority streams gave up their share; they wait in the admission queue until there is room again.
+    for victim in decision.preempted:
+        with trace.span("preempt", camera_id=split_stream_key(victim)[1]):
+            stop_admitted_stream(victim)
+
+    spawn_camera_process(camera_id, camera_url, trace)
+    return decision
+
+
+def start_hls_remux(camera_id, camera_url, priority=DEFAULT_PRIORITY):
+    """Starts a camera's HLS remux if the node budget allows it; returns the AdmissionDecision."""
+    runtime = get_runtime()
+    runtime.ensure_admission_sampler()
+    decision = runtime.remuxer.ensure(camera_id, camera_url, priority)
+    for victim in decision.preempted:
+        stop_admitted_stream(victim)
+    return decision
+
+
+def stop_admitted_stream(key):
+    """Stops whatever holds an admission key: a camera's ingest worker or its HLS remux."""
+    kind, camera_id = split_stream_key(key)
+    if kind == HLS_REMUX:
+        get_runtime().remuxer.stop(camera_id)
+    else:
+        cleanup_camera_stream(camera_id)
+
+
+def spawn_camera_process(camera_id, camera_url, trace=NULL_TRACE):
+    runtime = get_runtime()
+    try:
+        with trace.span("spawn", camera_id=camera_id):
+            runtime.first_frame_times.pop(camera_id, None)
+            runtime.degradation.track(camera_id)  # The worker reads its profile on startup
+            process = mp.Process(target=stream_camera_ffmpeg, args=(camera_id, camera_url, runtime.shared))
+            process.daemon = False
+            process.start()
+            runtime.active_streams[camera_id] = process.pid
+            runtime.stream_processes[camera_id] = process
+        trace.expect_first_frame(camera_id)
+        logger.info(f"Started streaming process {process.pid} for camera {camera_id}")
+    except Exception as e:
+        logger.error(f"Failed to start camera {camera_id}: {e}")
+        start_queued_streams(runtime.admission.release(camera_id))
+
+
+def start_queued_streams(ready):
+    """Starts queued streams the admission controller has just made room for."""
+    for camera_id, camera_url, priority in ready:
+        logger.info(f"Starting queued camera {camera_id} at priority {priority}")
+        spawn_camera_process(camera_id, camera_url)
+
+# -----------------------------------------
+# FUNCTION: Stream Camera using FFmpeg
+# -----------------------------------------
+def stream_camera_ffmpeg(camera_id, camera_url, shared):
+    """Handles streaming a camera using FFmpeg. Runs in its own process."""
+    logger.info(f"Starting stream for camera {camera_id} at {camera_url}")
+    ingest = CameraIngest(camera_id, camera_url, shared)
+    # Stopping the worker must take its current ffmpeg down with it, not orphan it.
+    signal.signal(signal.SIGTERM, lambda signum, frame: ingest.terminate())
+
+    try:
+        ingest.run()
+    except SystemExit:
+        pass
+    except Exception as e:
+        logger.error(f"Error in stream for camera {camera_id}: {e}")
+    finally:
+        ingest.stop_ffmpeg()
+        # The parent may already have respawned this camera; only our own entries are cleared.
+        own_pids = {os.getpid()} | ({ingest.process.pid} if ingest.process is not None else set())
+        cleanup_camera_stream(camera_id, shared, own_pids=own_pids)
+        return
+
+
+def ffmpeg_source_args(camera_url):
+    """ffmpeg input arguments for a camera; shared by ingest workers and HLS remuxes."""
+    synthetic = getattr(settings, "STREAM_SYNTHETIC_SOURCE", "")
+    if synthetic:
+        # Load tests: every camera plays an ffmpeg lavfi test pattern, in real time, instead of its RTSP URL.
+        return ["-re", "-f", "lavfi", "-i", synthetic]
+    timeout = str(int(settings.STREAM_RTSP_TIMEOUT * 1_000_000))  # Microseconds
+    return [
+        "-rtsp_transport", "tcp",
+        # Give up on a silent camera instead of blocking forever: socket timeout (-timeout in
+        # ffmpeg 5+, -stimeout before) and read/write timeout.
+        settings.STREAM_RTSP_TIMEOUT_OPTION, timeout, "-rw_timeout", timeout,
+        "-i", camera_url,
+    ]
+
+
+def ffmpeg_ingest_command(camera_url, profile):
+    return [
+        "ffmpeg", *ffmpeg_source_args(camera_url),
+        "-an", "-vf", f"fps={profile['capture_fps']},scale={profile['width']}:{profile['height']}", "-f", "image2pipe",
+        "-pix_fmt", "bgr24", "-vcodec", "rawvideo", "-"
+    ]
+
+
+def reconnect_delay(attempt):
+    """Exponential backoff with jitter: half the step is fixed, half random, so cameras that dropped together spread out."""
+    step = min(RECONNECT_BASE_DELAY * 2 ** (attempt - 1), RECONNECT_MAX_DELAY)
+    return step / 2 + random.uniform(0, step / 2)
+
+
+class CameraIngest:
+    """
+    One camera's ingest inside its worker process. ffmpeg is respawned whenever it exits,
+    closes its output or stops producing frames; meanwhile viewers keep the last good
+    frame, re-published with a RECONNECTING banner and its original capture time.
+    It also restarts ffmpeg when its profile's capture fps or resolution changes.
+    """
+
+    def __init__(self, camera_id, camera_url, shared):
+        import cv2
+
+        self.camera_id = camera_id
+        self.camera_url = camera_url
+        self.shared = shared
+        self.stats = IngestStats(camera_id, shared.ingest_stats)
+        self.profile = self.stats.profile = self.read_profile()
+        # One list, shared with the ROI encoder, so a quality change applies to both.
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.profile["quality"]]
+        self.rois = self.stats.rois = RoiEncoder(
+            camera_id, shared, self.encode_params, self.profile["width"], self.profile["height"]
+        )
+        self.next_frame_at = 0.0  # Earliest capture time of the next frame to encode when degraded below capture fps
+        self._profile_checked_at = 0.0
+        self.respawn = False  # Set when ffmpeg must restart with new capture settings
+        self.process = None
+        self.seq = 0
+        self.last_jpeg = None  # Newest good frame, kept for the stale banner
+        self.last_frame_time = None
+        self.stopping = False
+
+    def run(self):
+        attempt = 0
+        while not self.stopping:
+            delivered = self.run_ffmpeg()
+            if self.stopping or self.shared.active_streams.get(self.camera_id) != self.process.pid:
+                return  # Stopped on purpose (the parent removed our ffmpeg), not dropped
+            if self.respawn:
+                self.respawn = False
+                logger.info(f"Restarting ffmpeg for camera {self.camera_id} with profile {self.profile}")
+                continue
+            attempt = 1 if delivered else attempt + 1
+            self.stats.reconnects += 1
+            self.stats.last_exit_code = self.process.returncode
+            if self.stats.stale_since is None:
+                self.stats.stale_since = time.time()
+            delay = reconnect_delay(attempt)
+            logger.warning(
+                f"FFmpeg for camera {self.camera_id} stopped (exit {self.process.returncode}); "
+                f"reconnect {self.stats.reconnects} in {delay:.1f}s"
+            )
+            self.publish_stale(attempt)
+            self.stats.maybe_publish(time.time(), force=True)
+            deadline = time.time() + delay
+            while not self.stopping and time.time() < deadline:
+                self.stats.maybe_publish(time.time())
+                time.sleep(min(1.0, max(deadline - time.time(), 0)))
+
+    def run_ffmpeg(self):
+        """Runs one ffmpeg until it exits, closes its output or stalls; returns the number of frames it delivered."""
+        import cv2
+        import numpy as np
+
+        # Unbuffered pipe: the reader thread reads straight into its preallocated frame buffers.
+        width, height = self.profile["width"], self.profile["height"]
+        self.process = subprocess.Popen(
+            ffmpeg_ingest_command(self.camera_url, self.profile), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+        self.shared.active_streams[self.camera_id] = self.process.pid
+        self.rois.resize(width, height)
+        reader = FrameReader(self.process.stdout, width * height * 3).start()
+        stats = self.stats
+        stats.attach(reader)
+        started = time.time()
+        delivered = 0
+
+        try:
+            # Encoder stage: always the newest raw frame; frames read while encoding replace each other.
+            while not self.stopping:
+                raw_frame = reader.take(timeout=1)
+                now = time.time()
+                stats.maybe_publish(now)
+                if self.refresh_profile(now):
+                    self.respawn = True
+                    if raw_frame is not None:
+                        reader.release(raw_frame)
+                    break
+                if raw_frame is None:
+                    if reader.eof:
+                        logger.warning(f"FFmpeg for camera {self.camera_id} closed its output.")
+                        break
+                    if now - (self.last_frame_time if delivered else started) > FRAME_TIMEOUT:
+                        logger.warning(f"Camera {self.camera_id} unresponsive for {FRAME_TIMEOUT}s.")
+                        break
+                    continue
+                if self.skip_frame(now):
+                    reader.release(raw_frame)
+                    stats.frames_skipped += 1
+                    continue
+
+                encode_started = time.perf_counter()
+                frame = np.frombuffer(raw_frame, dtype=np.uint8).reshape((height, width, 3))
+                _, jpeg = cv2.imencode(".jpg", frame, self.encode_params)  # Releases the GIL; the reader keeps draining ffmpeg
+                encode_finished = time.perf_counter()
+                stats.encode_seconds += encode_finished - encode_started
+                stats.frames_encoded += 1
+
+                self.last_jpeg = jpeg.tobytes()
+                self.last_frame_time = time.time()
+                self.publish(self.last_jpeg, self.last_frame_time)
+                if self.camera_id not in self.shared.first_frame_times:
+                    self.shared.first_frame_times[self.camera_id] = self.last_frame_time
+                delivered += 1
+                stats.stale_since = None
+                stats.publish_seconds += time.perf_counter() - encode_finished
+
+                # ROI sub-streams are cut from the same decoded frame, before its buffer goes back to the reader.
+                self.rois.refresh(now)
+                self.rois.publish(frame, self.seq, self.last_frame_time)
+                reader.release(raw_frame)
+        finally:
+            self.stop_ffmpeg()
+        return delivered
+
+    def read_profile(self):
+        try:
+            profile = self.shared.stream_profiles.get(self.camera_id)
+        except Exception as e:
+            logger.error(f"Could not read stream profile for camera {self.camera_id}: {e}")
+            profile = None
+        return profile or effective_profile(DEFAULT_PROFILE, 0)
+
+    def refresh_profile(self, now):
+        """Picks up profile changes; returns True if ffmpeg must restart for them."""
+        if now - self._profile_checked_at < PROFILE_CHECK_INTERVAL:
+            return False
+        self._profile_checked_at = now
+        running, profile = self.profile, self.read_profile()
+        if profile == running:
+            return False
+        self.profile = self.stats.profile = profile
+        self.encode_params[1] = profile["quality"]
+        return any(profile[key] != running[key] for key in ("capture_fps", "width", "height"))
+
+    def skip_frame(self, now):
+        """Thins the capture rate down to a degraded profile's fps."""
+        fps, capture_fps = self.profile["fps"], self.profile["capture_fps"]
+        if fps >= capture_fps:
+            return False
+        if now < self.next_frame_at - 0.25 / capture_fps:  # Tolerates a quarter frame of arrival jitter
+            return True
+        self.next_frame_at = max(self.next_frame_at + 1 / fps, now - 0.5 / fps)
+        return False
+
+    def publish(self, jpeg, captured_at):
+        self.seq += 1
+        try:
+            self.shared.replay.append(self.camera_id, self.seq, captured_at, jpeg)
+        except TimeoutError as e:
+            logger.error(f"Dropped frame {self.seq} of camera {self.camera_id}: {e}")
+        self.shared.frame_info[self.camera_id] = (self.seq, captured_at)
+
+    def publish_stale(self, attempt):
+        """Re-publishes the last good frame, dimmed and bannered, keeping its capture time so clients can tell its age."""
+        if self.last_jpeg is None:
+            return
+        import cv2
+        import numpy as np
+
+        try:
+            frame = cv2.imdecode(np.frombuffer(self.last_jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            frame = cv2.convertScaleAbs(frame, alpha=0.5)
+            banner = f"RECONNECTING ({attempt}) - last frame {time.strftime('%H:%M:%S', time.localtime(self.last_frame_time))}"
+            cv2.putText(frame, banner, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            _, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+            self.publish(jpeg.tobytes(), self.last_frame_time)
+            self.rois.publish(frame, self.seq, self.last_frame_time)
+        except Exception as e:
+            logger.error(f"Could not publish stale frame for camera {self.camera_id}: {e}")
+
+    def stop_ffmpeg(self):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logger.error(f"FFmpeg {process.pid} for camera {self.camera_id} did not exit after SIGKILL")
+
+    def terminate(self):
+        self.stopping = True
+        self.stop_ffmpeg()
+        raise SystemExit(0)
+
+# -----------------------------------------
+# FUNCTION: Cleanup Camera Process
+# -----------------------------------------
+def cleanup_camera_stream(camera_id, shared=None, own_pids=None):
+    """
+    Stops the camera process and removes buffers safely. A worker cleaning up after itself
+    passes its shared state and `own_pids` (its pid and its ffmpeg's): it has already stopped
+    its ffmpeg, and leaves everything alone once the camera's entry is no longer one of them,
+    because the parent has then cleaned up or started a new worker for the camera.
+    """
+    # Workers pass their own shared state; only the process that owns the runtime tracks admission.
+    runtime = get_runtime() if shared is None else None
+    shared = shared or runtime.shared
+    if own_pids is not None:
+        if shared.active_streams.get(camera_id) not in own_pids:
+            logger.info(f"Camera {camera_id} was already cleaned up or respawned; leaving its state alone.")
+            return
+        shared.active_streams.pop(camera_id, None)
+    elif camera_id in shared.active_streams:
+        pid = shared.active_streams.pop(camera_id, None)  # Retrieve PID instead of Process object
+
+        if pid:
+            try:
+                os.kill(pid, signal.SIGTERM)  # Attempt graceful termination
+                logger.info(f"Sent SIGTERM to process {pid} for camera {camera_id}")
+
+                # Optional: Check if process is still running before force killing
+                os.waitpid(pid, os.WNOHANG)  # Non-blocking wait
+                logger.info(f"Process {pid} for camera {camera_id} terminated successfully.")
+
+            except OSError as e:
+                if "No such process" in str(e):
+                    logger.warning(f"Process {pid} for camera {camera_id} already stopped.")
+                else:
+                    logger.error(f"Error while terminating process {pid} for camera {camera_id}: {e}")
+
+    shared.replay.release(camera_id)  # History stays replayable until evicted
+    shared.first_frame_times.pop(camera_id, None)
+    shared.frame_info.pop(camera_id, None)
+    shared.ingest_stats.pop(camera_id, None)
+    shared.stream_profiles.pop(camera_id, None)
+    drop_camera_rois(shared, camera_id)
+    logger.info(f"Camera {camera_id} process cleaned up.")
+
+    if runtime is not None:
+        runtime.degradation.forget(camera_id)
+        # Killing ffmpeg alone would make the worker respawn it; stop the worker too.
+        process = runtime.stream_processes.pop(camera_id, None)
+        if process is not None and process.is_alive():
+            process.terminate()
+        start_queued_streams(runtime.admission.release(camera_id))
+
+# -----------------------------------------
+# FUNCTION: Generate Video Feed Frames
+# -----------------------------------------
+def generate_frames(camera_id, fps=None, client="", roi=None):
+    """
+    Yields latest frames for HTTP streaming, paced to the camera's fps (or `fps`, if lower).
+    Frames that arrive while the client is still receiving an earlier one are skipped.
+    With `roi`, yields that region's shared sub-stream instead of the full frame.
+    """
+    runtime = get_runtime()
+    fps = viewer_fps(camera_id, fps)
+    runtime.subscriptions.viewer_opened(camera_id)
+    slot = runtime.hub.open(camera_id, fps, client, roi)
+
+    def release(slot):
+        # Runs once: on exit, or earlier from the channel thread while a stalled write still blocks this one.
+        if not runtime.hub.close(slot):
+            return
+        # Viewer went away; stop the stream if no session or other viewer still needs it.
+        if runtime.subscriptions.viewer_closed(camera_id):
+            stop_camera_streams({camera_id})
+
+    slot.on_stall = release
+    first_frame_sent = False
+    try:
+        for _, _, frame in runtime.hub.stream(slot):
+            if not first_frame_sent:
+                first_frame_sent = True
+                runtime.tracer.resolve_first_frames(runtime.first_frame_times)
+            yield mjpeg_part(frame)
+    finally:
+        release(slot)
+
+def viewer_fps(camera_id, requested=None):
+    """A viewer's frame rate: its camera's capture fps (STREAM_TARGET_FPS until the profile is known), or less if asked."""
+    profile = get_runtime().stream_profiles.get(camera_id)
+    target_fps = profile["capture_fps"] if profile else getattr(settings, "STREAM_TARGET_FPS", 5)
+    return min(requested, target_fps) if requested else target_fps
+
+# -----------------------------------------
+# FUNCTION: Blank Frame
+# -----------------------------------------
+def get_blank_frame():
+    import cv2
+    import numpy as np
+
+    blank_image = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    _, jpeg = cv2.imencode(".jpg", blank_image, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    return jpeg.tobytes()
+
+# -----------------------------------------
+# FUNCTION: Stop Streams No Longer Watched
+# -----------------------------------------
+def stop_camera_streams(camera_ids, trace=NULL_TRACE):
+    """Stops the given camera streams in parallel."""
+    if not camera_ids:
+        return
+    runtime = get_runtime()
+    with trace.span("lock_wait", lock="section_lock", phase="stop"):
+        runtime.section_lock.acquire()
+    try:
+        # Re-check under the lock: another session may have subscribed to a camera since it was released.
+        camera_ids = [
+            camera_id for camera_id in camera_ids
+            if camera_id in runtime.active_streams and not runtime.subscriptions.is_wanted(camera_id)
+        ]
+        if not camera_ids:
+            return
+        logger.info(f"Stopping streams no longer watched by any session: {sorted(camera_ids)}")
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            executor.map(lambda camera_id: traced_cleanup(camera_id, trace), camera_ids)
+    finally:
+        runtime.section_lock.release()
+
+
+def traced_cleanup(camera_id, trace):
+    with trace.span("teardown", camera_id=camera_id):
+        cleanup_camera_stream(camera_id)
+
+# -----------------------------------------
+# FUNCTION: Admission Bookkeeping
+# -----------------------------------------
+def stream_pids(key):
+    """Pids of a stream's worker and its ffmpeg child (or of an HLS remux), for cost sampling; empty once gone."""
+    runtime = get_runtime()
+    kind, camera_id = split_stream_key(key)
+    if kind == HLS_REMUX:
+        return runtime.remuxer.pids(camera_id)
+    process = runtime.stream_processes.get(camera_id)
+    if process is None or not process.is_alive():
+        return []
+    ffmpeg_pid = runtime.active_streams.get(camera_id)
+    return [process.pid] + ([ffmpeg_pid] if ffmpeg_pid and ffmpeg_pid != process.pid else [])
+
+
+def reconcile_streams(gone):
+    """Frees the budget of streams whose worker exited on its own and stops admitted streams nobody watches."""
+    runtime = get_runtime()
+    for key in gone:
+        logger.info(f"Stream {key} exited; releasing its admission share.")
+        stop_admitted_stream(key)
+    # Streams started from the queue after their requester gave up would otherwise run unwatched.
+    # HLS remuxes are never queued; the remuxer stops them once players stop fetching the playlist.
+    unwatched = {
+        key for key in runtime.admission.running_longer_than(QUEUE_TTL)
+        if split_stream_key(key)[0] == INGEST and not runtime.subscriptions.is_wanted(key)
+    }
+    stop_camera_streams(unwatched)
+
+# -----------------------------------------
+# FUNCTION: Cluster Placement
+# -----------------------------------------
+def get_stream_cluster():
+    """Returns the cluster placement for this node, or None when running single-node."""
+    return get_cluster(on_cameras_moved=release_moved_streams, local_cameras=local_camera_ids)
+
+
+def local_camera_ids():
+    runtime = peek_runtime()
+    return list(runtime.active_streams.keys()) if runtime else []
+
+
+def release_moved_streams(camera_ids):
+    """Stops local streams for cameras that the hash ring now assigns to another node."""
+    runtime = get_runtime()
+    with runtime.section_lock:
+        for camera_id in camera_ids:
+            cleanup_camera_stream(camera_id)
@@ -0,0 +1,139 @@
+import time
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+SESSION_HEARTBEAT_TIMEOUT = 60  # Seconds without a heartbeat before a session expires
+SESSION_HEADER = "HTTP_X_STREAM_SESSION"  # X-Stream-Session request header
+SESSION_QUERY_PARAM = "session_id"
+
+
+def get_stream_session_id(request):
+    """Returns the client's stream session id, or a new one if the client did not send any."""
+    session_id = request.META.get(SESSION_HEADER) or request.GET.get(SESSION_QUERY_PARAM)
+    if session_id:
+        return str(session_id)[:64]
+    return uuid.uuid4().hex
+
+
+class StreamSubscriptions:
+    """
+    Tracks which cameras each client session is watching in this process.
+
+    The set of streams that must stay running is the union of all live
+    sessions plus any camera that still has an open video_feed viewer.
+    Every mutating call returns the cameras that nobody needs any more,
+    so the caller can stop them outside the lock.
+    """
+
+    def __init__(self, timeout=SESSION_HEARTBEAT_TIMEOUT):
+        self.timeout = timeout
+        self._sessions = {}  # {session_id: {"cameras": set, "last_seen": float}}
+        self._viewers = {}  # {camera_id: open video_feed responses}
+        self._lock = threading.Lock()
+
+    def _wanted(self):
+        wanted = set(self._viewers)
+        for session in self._sessions.values():
+            wanted |= session["cameras"]
+        return wanted
+
+    def _expire(self, now):
+        expired = [sid for sid, session in self._sessions.items() if now - session["last_seen"] > self.timeout]
+        released = set()
+        for sid in expired:
+            released |= self._sessions.pop(sid)["cameras"]
+            logger.info(f"Stream session {sid} expired after {self.timeout}s without heartbeat")
+        return released
+
+    def subscribe(self, session_id, camera_ids):
+        """Replaces a session's camera set; returns cameras no longer wanted by anyone."""
+        now = time.time()
+        camera_ids = set(camera_ids)
+        with self._lock:
+            released = self._expire(now)
+            previous = self._sessions.get(session_id)
+            if previous:
+                released |= previous["cameras"] - camera_ids
+            self._sessions[session_id] = {"cameras": camera_ids, "last_seen": now}
+            return released - self._wanted()
+
+    def heartbeat(self, session_id):
+        """Refreshes a session; returns False if it is unknown or already expired."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or now - session["last_seen"] > self.timeout:
+                return False
+            session["last_seen"] = now
+            return True
+
+    def unsubscribe(self, session_id):
+        """Drops a session; returns cameras no longer wanted by anyone."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return set()
+            return session["cameras"] - self._wanted()
+
+    def sweep(self):
+        """Expires stale sessions; returns cameras no longer wanted by anyone."""
+        with self._lock:
+            return self._expire(time.time()) - self._wanted()
+
+    def viewer_opened(self, camera_id):
+        with self._lock:
+            self._viewers[camera_id] = self._viewers.get(camera_id, 0) + 1
+
+    def viewer_closed(self, camera_id):
+        """Returns True if that was the last reason to keep the camera running."""
+        with self._lock:
+            count = self._viewers.get(camera_id, 0) - 1
+            if count > 0:
+                self._viewers[camera_id] = count
+                return False
+            self._viewers.pop(camera_id, None)
+            return camera_id not in self._wanted()
+
+    def is_wanted(self, camera_id):
+        with self._lock:
+            return camera_id in self._wanted()
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "sessions": {
+                    sid: {
+                        "cameras": sorted(session["cameras"]),
+                        "idle_seconds": round(now - session["last_seen"], 1),
+                    }
+                    for sid, session in self._sessions.items()
+                },
+                "viewers": dict(self._viewers),
+                "wanted": sorted(self._wanted()),
+            }
+
+
+def start_session_reaper(subscriptions, on_released, interval=None):
+    """Starts a daemon thread that expires stale sessions and hands released cameras to `on_released`."""
+    interval = interval or max(subscriptions.timeout / 2, 1)
+
+    def reap():
+        while True:
+            time.sleep(interval)
+            try:
+                released = subscriptions.sweep()
+                if released:
+                    on_released(released)
+            except Exception as e:
+                logger.error(f"Stream session reaper failed: {e}")
+
+    thread = threading.Thread(target=reap, name="stream-session-reaper", daemon=True)
+    thread.start()
+    return thread
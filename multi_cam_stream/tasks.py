@@ -1,48 +1,23 @@
-import os
-import subprocess
-from django.core.mail import send_mail
+from datetime import timedelta
 from celery import shared_task
-from .models import Camera  # Import the Camera model
 
-# Load environment variables from .env file
-EMAIL_HOST_USER = os.getenv('EMAIL_USER')
-TO_EMAIL = os.getenv('TO_EMAIL')
 
 @shared_task
-def ping_cameras_and_send_report():
-    active_cameras = []
-    inactive_cameras = []
+def refresh_camera_previews():
+    """Grabs a fresh thumbnail for every active camera whose preview is older than the refresh interval."""
+    from django.conf import settings
+    from .previews import refresh_previews
 
-    # Fetch the camera IPs from the database (Camera model)
-    camera_ips = Camera.objects.filter(is_active=True).values_list('ip_address', flat=True)
+    # A little under the interval, so a camera grabbed late in the previous run is not skipped this time.
+    return refresh_previews(max_age=settings.STREAM_PREVIEW_INTERVAL * 60 - 30)
 
-    # Ping each camera IP
-    for ip in camera_ips:
-        try:
-            # Pinging the camera with 1 packet only (-c 1 for Linux)
-            result = subprocess.run(["ping", "-c", "1", str(ip)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode == 0:
-                active_cameras.append(ip)
-            else:
-                inactive_cameras.append(ip)
-        except Exception as e:
-            inactive_cameras.append(ip)  # Assume inactive if any error occurs
 
-    # Compose the email content
-    subject = "Camera Status Report"
-    message = (
-        f"🟢 Active Cameras ({len(active_cameras)}):\n" +
-        "\n".join(active_cameras) +
-        "\n\n" +
-        f"🔴 Inactive Cameras ({len(inactive_cameras)}):\n" +
-        "\n".join(inactive_cameras)
-    )
+@shared_task
+def prune_motion_events():
+    """Deletes motion events and thumbnails older than STREAM_MOTION_RETENTION_DAYS."""
+    from django.conf import settings
+    from .motion import prune_motion_events as prune
 
-    # Send email using Django's email system
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=EMAIL_HOST_USER,
-        recipient_list=[TO_EMAIL],
-        fail_silently=False,
-    )
+    if settings.STREAM_MOTION_RETENTION_DAYS <= 0:
+        return None
+    return prune(timedelta(days=settings.STREAM_MOTION_RETENTION_DAYS))
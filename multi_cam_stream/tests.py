@@ -1,3 +1,1822 @@
-from django.test import TestCase
+import io
+import csv
+import json
+import asyncio
+import os
+import time
+import zipfile
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+from xml.etree import ElementTree
+from urllib.error import HTTPError
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+from django.conf import settings
+from django.http import QueryDict
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from rest_framework.parsers import MultiPartParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .importers import bulk_import, ImportFormatError
+from .exporters import stream_camera_export, stream_xlsx
+from . import admission
+from .admission import AdmissionController, parse_priority, PRIORITIES, ADMITTED, QUEUED, REJECTED
+from .cluster import HashRing, ClusterPlacement
+from . import subscriptions
+from .subscriptions import StreamSubscriptions, start_session_reaper
+from .hls import HlsRemuxer, remux_key, camera_dir, serve_hls_file, PLAYLIST_NAME
+from . import streaming
+from .streaming import SharedStreamState, CameraIngest, cleanup_camera_stream, ffmpeg_source_args, reconnect_delay
+from .ingest import FrameReader
+from . import replay
+from .replay import ReplayArena, MAX_FRAME_SHARE, MAX_RESCUES
+from . import previews
+from .analytics import AnalyticsScheduler
+from . import tracing
+from .tracing import Tracer, percentile
+from .degradation import DegradationController, effective_profile, MAX_LEVEL, STEP_INTERVAL, RESTORE_AFTER
+from .signing import sign_stream_url, verify_camera_signature
+from .relay import UpstreamFeed
+from . import health
+from .health import CameraHealth, HealthMonitor, UP, DOWN, UNKNOWN
+from . import websocket
+from . import motion
+from .roi import parse_roi, roi_box, RoiEncoder, MAX_ZOOM
+from . import fanout
+from .fanout import RoiChannel, CameraChannel, FrameHub, ViewerSlot, STALL_TIMEOUT
+from .motion import MotionEventProcessor, prune_motion_events, MAX_EVENT_SECONDS, PERSIST_INTERVAL
+from .models import Seracs, Section, Camera, MotionEvent
 
-# Create your tests here.
+
+def csv_file(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+# -----------------------------------------
+# Bulk Import
+# -----------------------------------------
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.serac = Seracs.objects.create(name="Serac A")
+        self.section = Section.objects.create(name="Line 1", serac=self.serac)
+
+    def test_counts_created_updated_and_failed_rows(self):
+        Camera.objects.create(name="Old", ip_address="10.0.0.1", port=554, section=self.section)
+        report = bulk_import("cameras", csv_file(
+            "name,ip_address,port,section\n"
+            "Dock,10.0.0.1,554,{s}\n"
+            "Gate,10.0.0.2,554,{s}\n"
+            "Broken,not-an-ip,554,{s}\n".format(s=self.section.pk)
+        ), "csv")
+
+        self.assertEqual((report.total, report.created, report.updated, report.failed), (3, 1, 1, 1))
+        self.assertEqual(report.errors[0]["row"], 3)
+        self.assertIn("ip_address", report.errors[0]["errors"])
+        self.assertEqual(Camera.objects.get(ip_address="10.0.0.1").name, "Dock")
+        self.assertEqual(Camera.objects.count(), 2)
+
+    def test_matches_on_natural_key_including_port(self):
+        existing = Camera.objects.create(name="Old", ip_address="10.0.0.1", port=554)
+        report = bulk_import("cameras", csv_file(
+            "name,ip_address,port\n"
+            "Same camera,10.0.0.1,554\n"
+            "Other port,10.0.0.1,8554\n"
+        ), "csv")
+
+        self.assertEqual((report.created, report.updated), (1, 1))
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, "Same camera")
+        self.assertTrue(Camera.objects.filter(ip_address="10.0.0.1", port=8554).exists())
+
+    def test_matches_on_id_before_natural_key(self):
+        existing = Camera.objects.create(name="Old", ip_address="10.0.0.1")
+        report = bulk_import("cameras", csv_file(
+            f"id,name,ip_address\n{existing.pk},Moved,10.0.0.9\n"
+        ), "csv")
+
+        self.assertEqual((report.created, report.updated), (0, 1))
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.ip_address), ("Moved", "10.0.0.9"))
+
+    def test_partial_rows_keep_columns_they_leave_out(self):
+        existing = Camera.objects.create(
+            name="Old", ip_address="10.0.0.1", is_active=False, username="admin", section=self.section,
+        )
+        report = bulk_import("cameras", csv_file("name,ip_address\nRenamed,10.0.0.1\n"), "csv")
+
+        self.assertEqual(report.updated, 1)
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, "Renamed")
+        self.assertFalse(existing.is_active)
+        self.assertEqual(existing.username, "admin")
+        self.assertEqual(existing.section, self.section)
+
+    def test_partial_rows_keep_stream_profiles(self):
+        existing = Camera.objects.create(
+            name="Old", ip_address="10.0.0.1", stream_fps=12, stream_width=1280, stream_height=720,
+            jpeg_quality=60, stream_priority=Camera.PRIORITY_HIGH,
+        )
+        bulk_import("cameras", csv_file("name,ip_address\nRenamed,10.0.0.1\n"), "csv")
+        bulk_import("cameras", csv_file("ip_address,name,stream_fps\n10.0.0.1,Renamed,8\n"), "csv")
+
+        existing.refresh_from_db()
+        self.assertEqual(
+            (existing.stream_fps, existing.stream_width, existing.stream_height, existing.jpeg_quality,
+             existing.stream_priority),
+            (8, 1280, 720, 60, Camera.PRIORITY_HIGH),
+        )
+
+    def test_new_rows_get_model_defaults_for_missing_columns(self):
+        bulk_import("cameras", csv_file("name,ip_address\nNew,10.0.0.5\n"), "csv")
+
+        camera = Camera.objects.get(ip_address="10.0.0.5")
+        self.assertEqual((camera.port, camera.is_active), (554, True))
+
+    def test_repeated_natural_key_counts_later_rows_as_updates(self):
+        report = bulk_import("cameras", csv_file(
+            "name,ip_address,is_active\n"
+            "First,10.0.0.1,false\n"
+            "Second,10.0.0.1,\n"
+            "Other,10.0.0.2,\n"
+            "Bad,x,\n"
+        ), "csv")
+
+        self.assertEqual((report.total, report.created, report.updated, report.failed), (4, 2, 1, 1))
+        camera = Camera.objects.get(ip_address="10.0.0.1")
+        self.assertEqual(camera.name, "Second")
+        self.assertFalse(camera.is_active)  # Kept from the earlier row, which set it
+
+    def test_rows_are_matched_across_batches(self):
+        report = bulk_import("cameras", csv_file(
+            "name,ip_address\n" + "".join(f"Cam {i},10.0.1.{i}\n" for i in range(5)) + "Again,10.0.1.0\n"
+        ), "csv", batch_size=2)
+
+        self.assertEqual((report.created, report.updated), (5, 1))
+        self.assertEqual(Camera.objects.get(ip_address="10.0.1.0").name, "Again")
+
+    def test_jsonl_reports_malformed_lines(self):
+        report = bulk_import("cameras", io.BytesIO(
+            b'{"name": "Json", "ip_address": "10.0.0.7"}\n'
+            b'not json\n'
+            b'[1, 2]\n'
+        ), "jsonl")
+
+        self.assertEqual((report.created, report.failed), (1, 2))
+        self.assertEqual([error["row"] for error in report.errors], [2, 3])
+
+    def test_undecodable_or_malformed_files_are_format_errors(self):
+        Camera.objects.create(name="Old", ip_address="10.0.0.1")
+        uploads = {
+            "utf-16": "name,ip_address\nNew,10.0.0.5\n".encode("utf-16"),  # Starts with \xff\xfe
+            "latin-1": "name,ip_address\nDock,10.0.0.1\nCafé,10.0.0.2\n".encode("latin-1"),
+            "oversized field": b"name,ip_address\n" + b"x" * (csv.field_size_limit() + 1) + b",10.0.0.5\n",
+        }
+        for label, content in uploads.items():
+            with self.subTest(label), self.assertRaises(ImportFormatError):
+                bulk_import("cameras", io.BytesIO(content), "csv")
+
+        self.assertEqual(list(Camera.objects.values_list("name", flat=True)), ["Old"])  # Nothing half-imported
+
+    def test_view_answers_undecodable_files_with_400(self):
+        from .views import handle_bulk_import
+
+        upload = SimpleUploadedFile("cameras.csv", b"\xff\xfename,ip_address\n")
+        request = APIRequestFactory().post("/api/cameras/bulk_import/", {"file": upload}, format="multipart")
+        response = handle_bulk_import(Request(request, parsers=[MultiPartParser()]), "cameras")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.data["message"])
+
+    def test_sections_match_on_name_and_serac(self):
+        report = bulk_import("sections", csv_file(
+            f"name,serac\nLine 1,{self.serac.pk}\nLine 2,{self.serac.pk}\n"
+        ), "csv")
+
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual(Section.objects.count(), 2)
+
+    def test_upsert_omits_conflict_target_where_unsupported(self):
+        # MySQL's ON DUPLICATE KEY UPDATE rejects unique_fields.
+        with mock.patch("django.db.backends.sqlite3.features.DatabaseFeatures.supports_update_conflicts_with_target",
+                        False), \
+                mock.patch.object(Camera.objects, "bulk_create") as bulk_create:
+            bulk_import("cameras", csv_file("name,ip_address\nNew,10.0.0.5\n"), "csv")
+
+        kwargs = bulk_create.call_args.kwargs
+        self.assertTrue(kwargs["update_conflicts"])
+        self.assertNotIn("unique_fields", kwargs)
+
+
+# -----------------------------------------
+# Export
+# -----------------------------------------
+XLSX_NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_xlsx(data):
+    """Rows of the first sheet as lists of cell values (strings, floats, bools; None where no cell was written)."""
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        assert workbook.testzip() is None
+        sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+    rows = []
+    for row in sheet.iterfind("x:sheetData/x:row", XLSX_NS):
+        values = {}
+        for cell in row:
+            column = 0
+            for letter in cell.get("r").rstrip("0123456789"):
+                column = column * 26 + ord(letter) - 64
+            if cell.get("t") == "inlineStr":
+                values[column - 1] = cell.find("x:is/x:t", XLSX_NS).text
+            elif cell.get("t") == "b":
+                values[column - 1] = cell.find("x:v", XLSX_NS).text == "1"
+            else:
+                values[column - 1] = float(cell.find("x:v", XLSX_NS).text)
+        rows.append([values.get(i) for i in range(max(values) + 1)])
+    return rows
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        serac = Seracs.objects.create(name="Serac A")
+        section = Section.objects.create(name="Line <1> & co", serac=serac)
+        Camera.objects.create(name="Dock", ip_address="10.0.0.1", password="secret", section=section)
+        Camera.objects.create(name="Loose", ip_address="10.0.0.2", is_active=False)
+
+    def test_csv_export_joins_section_and_serac(self):
+        data = b"".join(stream_camera_export("csv"))
+        rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+
+        self.assertEqual([row["name"] for row in rows], ["Dock", "Loose"])
+        self.assertEqual((rows[0]["section_name"], rows[0]["serac_name"]), ("Line <1> & co", "Serac A"))
+        self.assertEqual(rows[1]["section"], "")
+        self.assertNotIn("password", rows[0])
+
+    def test_csv_export_can_include_passwords(self):
+        data = b"".join(stream_camera_export("csv", include_passwords=True))
+        rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+
+        self.assertEqual(rows[0]["password"], "secret")
+
+    def test_csv_export_imports_back_unchanged(self):
+        data = b"".join(stream_camera_export("csv", include_passwords=True))
+        report = bulk_import("cameras", io.BytesIO(data), "csv")
+
+        self.assertEqual((report.created, report.updated, report.failed), (0, 2, 0))
+        self.assertFalse(Camera.objects.get(name="Loose").is_active)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        rows = read_xlsx(b"".join(stream_camera_export("xlsx")))
+
+        header = rows[0]
+        self.assertEqual(header[:3], ["id", "name", "ip_address"])
+        dock = dict(zip(header, rows[1]))
+        self.assertEqual(dock["name"], "Dock")
+        self.assertEqual(dock["port"], 554.0)
+        self.assertIs(dock["is_active"], True)
+        self.assertEqual(dock["section_name"], "Line <1> & co")  # Escaped in the XML
+        loose = dict(zip(header, rows[2]))
+        self.assertIs(loose["is_active"], False)
+        self.assertIsNone(loose.get("section"))  # Empty cells are left out
+
+    def test_xlsx_writer_streams_in_chunks(self):
+        columns = [("n", "n"), ("label", "label")]
+        chunks = list(stream_xlsx(columns, ((i, f"row {i}") for i in range(2000)), flush_every=100))
+
+        self.assertGreater(len(chunks), 3)
+        rows = read_xlsx(b"".join(chunks))
+        self.assertEqual(len(rows), 2001)
+        self.assertEqual(rows[-1], [1999.0, "row 1999"])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            stream_camera_export("pdf")
+
+
+# -----------------------------------------
+# Stream Sessions
+# -----------------------------------------
+class FakeClock:
+    """Stands in for the time module: time() is set by the test and sleep() advances it."""
+
+    def __init__(self, now=1000.0, sleeps=None):
+        self.now = now
+        self.sleeps = sleeps  # Sleeps allowed before sleep() ends the calling thread; None for no limit
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if self.sleeps is not None:
+            if self.sleeps == 0:
+                raise SystemExit  # Ends a reaper thread
+            self.sleeps -= 1
+        self.now += seconds
+
+
+class StreamSubscriptionsTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(subscriptions, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.subscriptions = StreamSubscriptions(timeout=60)
+
+    def test_switching_sections_releases_only_the_cameras_left_behind(self):
+        self.subscriptions.subscribe("a", {1, 2, 3})
+
+        self.assertEqual(self.subscriptions.subscribe("a", {3, 4}), {1, 2})
+        self.assertEqual(self.subscriptions.subscribe("a", {3, 4}), set())
+
+    def test_one_session_switching_never_stops_another_sessions_cameras(self):
+        self.subscriptions.subscribe("a", {1, 2})
+        self.subscriptions.subscribe("b", {2, 3})
+
+        self.assertEqual(self.subscriptions.subscribe("a", {5}), {1})  # Camera 2 is still watched by b
+        self.assertTrue(self.subscriptions.is_wanted(2))
+        self.assertEqual(self.subscriptions.unsubscribe("b"), {2, 3})
+        self.assertEqual(self.subscriptions.snapshot()["wanted"], [5])
+
+    def test_open_viewer_keeps_its_camera_after_the_session_leaves(self):
+        self.subscriptions.subscribe("a", {1})
+        self.subscriptions.viewer_opened(1)
+        self.subscriptions.viewer_opened(1)
+
+        self.assertEqual(self.subscriptions.subscribe("a", set()), set())
+        self.assertFalse(self.subscriptions.viewer_closed(1))
+        self.assertTrue(self.subscriptions.viewer_closed(1))  # The last viewer of an unwanted camera
+
+    def test_viewer_closing_keeps_a_camera_a_session_wants(self):
+        self.subscriptions.subscribe("a", {1})
+        self.subscriptions.viewer_opened(1)
+
+        self.assertFalse(self.subscriptions.viewer_closed(1))
+        self.assertEqual(self.subscriptions.snapshot()["viewers"], {})
+
+    def test_heartbeat_keeps_a_session_alive(self):
+        self.subscriptions.subscribe("a", {1})
+        self.clock.now += 50
+        self.assertTrue(self.subscriptions.heartbeat("a"))
+        self.clock.now += 50
+
+        self.assertEqual(self.subscriptions.sweep(), set())
+        self.assertTrue(self.subscriptions.is_wanted(1))
+
+    def test_silent_session_expires(self):
+        self.subscriptions.subscribe("a", {1, 2})
+        self.subscriptions.subscribe("b", {2})
+        self.clock.now += 61
+        self.assertFalse(self.subscriptions.heartbeat("a"))  # Too late to revive it
+
+        self.assertEqual(self.subscriptions.sweep(), {1, 2})
+        self.assertFalse(self.subscriptions.heartbeat("zzz"))
+
+    def test_expiry_during_another_subscribe_releases_the_stale_cameras(self):
+        self.subscriptions.subscribe("a", {1, 2})
+        self.clock.now += 61
+
+        self.assertEqual(self.subscriptions.subscribe("b", {2}), {1})
+
+    def test_reaper_hands_expired_cameras_over(self):
+        self.subscriptions.subscribe("a", {1})
+        self.subscriptions.subscribe("b", {2})
+        self.subscriptions.heartbeat("b")
+        self.clock.sleeps = 2
+        released = []
+
+        thread = start_session_reaper(self.subscriptions, released.append, interval=40)
+        thread.join(5)
+
+        # After 40s nothing is stale; after 80s both sessions are, without a heartbeat since t=0.
+        self.assertEqual(released, [{1, 2}])
+
+    def test_reaper_survives_a_failing_callback(self):
+        self.subscriptions.subscribe("a", {1})
+        self.clock.now += 61
+        self.clock.sleeps = 1
+        on_released = mock.Mock(side_effect=RuntimeError("boom"))
+
+        with self.assertLogs("multi_cam_stream.subscriptions", "ERROR"):
+            start_session_reaper(self.subscriptions, on_released, interval=1).join(5)
+        on_released.assert_called_once_with({1})
+
+
+# -----------------------------------------
+# Cluster Placement
+# -----------------------------------------
+class FakeRegistry:
+    def __init__(self, nodes):
+        self.nodes = dict(nodes)
+        self.down = False
+
+    def heartbeat(self, node_id, url):
+        if self.down:
+            raise ConnectionError("registry down")
+
+    def live_nodes(self):
+        if self.down:
+            raise ConnectionError("registry down")
+        return dict(self.nodes)
+
+
+class HashRingTests(SimpleTestCase):
+    camera_ids = range(1, 3001)
+
+    def test_empty_ring_has_no_owner(self):
+        self.assertIsNone(HashRing().owner(1))
+
+    def test_placement_is_deterministic_and_independent_of_node_order(self):
+        first = HashRing(["a", "b", "c"]).placement(self.camera_ids)
+        second = HashRing(["c", "a", "b"]).placement(self.camera_ids)
+
+        self.assertEqual(first, second)
+
+    def test_cameras_spread_over_all_nodes(self):
+        placement = HashRing(["a", "b", "c"]).placement(self.camera_ids)
+        counts = {node: list(placement.values()).count(node) for node in "abc"}
+
+        for count in counts.values():
+            self.assertGreater(count, len(self.camera_ids) / 3 * 0.7)
+
+    def test_adding_a_node_only_moves_cameras_to_it(self):
+        before = HashRing(["a", "b", "c"]).placement(self.camera_ids)
+        after = HashRing(["a", "b", "c", "d"]).placement(self.camera_ids)
+        moved = [camera_id for camera_id in self.camera_ids if before[camera_id] != after[camera_id]]
+
+        self.assertTrue(all(after[camera_id] == "d" for camera_id in moved))
+        self.assertLess(len(moved), len(self.camera_ids) / 4 * 1.3)
+
+    def test_removing_a_node_only_moves_its_cameras(self):
+        before = HashRing(["a", "b", "c"]).placement(self.camera_ids)
+        after = HashRing(["a", "b"]).placement(self.camera_ids)
+
+        for camera_id in self.camera_ids:
+            if before[camera_id] != "c":
+                self.assertEqual(after[camera_id], before[camera_id])
+
+
+class ClusterPlacementTests(SimpleTestCase):
+    def test_releases_cameras_another_node_now_owns(self):
+        registry = FakeRegistry({"a": "http://a"})
+        moved = []
+        cluster = ClusterPlacement("a", "http://a/", registry, interval=60, on_cameras_moved=moved.append)
+        cluster.local_cameras = lambda: set(range(1, 101))
+        cluster.refresh()
+        self.assertTrue(all(cluster.is_local(camera_id) for camera_id in range(1, 101)))
+
+        registry.nodes["b"] = "http://b"
+        cluster.refresh()
+
+        self.assertEqual(len(moved), 1)
+        self.assertEqual(moved[0], {camera_id for camera_id in range(1, 101) if not cluster.is_local(camera_id)})
+        camera_id = next(iter(moved[0]))
+        self.assertEqual(cluster.stream_url(camera_id, "/api/video_feed/1/"), "http://b/api/video_feed/1/")
+
+    def test_keeps_last_ring_while_registry_is_down(self):
+        registry = FakeRegistry({"a": "http://a", "b": "http://b"})
+        cluster = ClusterPlacement("a", "http://a", registry, interval=60)
+        cluster.refresh()
+        owners = {camera_id: cluster.owner(camera_id) for camera_id in range(50)}
+
+        registry.down = True
+        cluster.refresh()
+
+        self.assertEqual({camera_id: cluster.owner(camera_id) for camera_id in range(50)}, owners)
+
+
+# -----------------------------------------
+# Admission Control
+# -----------------------------------------
+GRID, FULL = PRIORITIES["grid"], PRIORITIES["full"]
+
+
+class ParsePriorityTests(SimpleTestCase):
+    def test_names_and_defaults(self):
+        self.assertEqual(parse_priority("full"), FULL)
+        self.assertEqual(parse_priority("GRID"), GRID)
+        self.assertEqual(parse_priority(None), GRID)
+        self.assertEqual(parse_priority("bogus"), GRID)
+
+    def test_numbers_are_clamped_to_the_named_range(self):
+        self.assertEqual(parse_priority("1000000"), FULL)
+        self.assertEqual(parse_priority(10 ** 30), FULL)
+        self.assertEqual(parse_priority("-5"), GRID)
+        self.assertEqual(parse_priority(float("inf")), GRID)
+        self.assertEqual(parse_priority("15"), 15)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def controller(self, max_streams=2, **kwargs):
+        # Two default-cost streams fit the CPU budget; memory is not enforced.
+        return AdmissionController(max_streams, cpu_budget=admission.DEFAULT_STREAM_CPU * 2, memory_budget_mb=0, **kwargs)
+
+    def test_admits_until_full_then_queues_then_rejects(self):
+        controller = self.controller()
+        self.assertEqual(controller.request(1, GRID, "rtsp://1").state, ADMITTED)
+        self.assertEqual(controller.request(2, GRID, "rtsp://2").state, ADMITTED)
+        self.assertEqual(controller.request(3, GRID, "rtsp://3").state, QUEUED)
+        self.assertEqual(controller.request(4, GRID, "rtsp://4", allow_queue=False).state, REJECTED)
+        self.assertEqual(controller.rejections, 1)
+
+    def test_running_stream_takes_the_highest_priority_asked_for(self):
+        controller = self.controller()
+        controller.request(1, GRID, "rtsp://1")
+        decision = controller.request(1, FULL)
+
+        self.assertEqual((decision.state, decision.priority), (ADMITTED, FULL))
+
+    def test_higher_priority_preempts_lowest_priority_stream(self):
+        controller = self.controller()
+        controller.request(1, GRID, "rtsp://1")
+        controller.request(2, 15, "rtsp://2")
+
+        decision = controller.request(3, FULL, "rtsp://3")
+
+        self.assertEqual((decision.state, decision.preempted), (ADMITTED, [1]))
+        self.assertTrue(controller.is_admitted(2))
+        self.assertFalse(controller.is_admitted(1))
+        self.assertEqual([queued["camera_id"] for queued in controller.snapshot()["queue"]], [1])
+
+    def test_equal_priority_does_not_preempt(self):
+        controller = self.controller()
+        controller.request(1, FULL, "rtsp://1")
+        controller.request(2, FULL, "rtsp://2")
+
+        self.assertEqual(controller.request(3, FULL, "rtsp://3").state, QUEUED)
+        self.assertEqual(controller.preemptions, 0)
+
+    def test_release_starts_queued_streams_by_priority(self):
+        controller = self.controller()
+        controller.request(1, FULL, "rtsp://1")
+        controller.request(2, FULL, "rtsp://2")
+        controller.request(3, GRID, "rtsp://3")
+        controller.request(4, 15, "rtsp://4")
+
+        self.assertEqual(controller.release(1), [(4, "rtsp://4", 15)])
+        self.assertEqual(controller.release(2), [(3, "rtsp://3", GRID)])
+
+    def test_queued_requests_expire_unless_still_wanted(self):
+        controller = self.controller(max_streams=1, keep_queued=lambda camera_id: camera_id == 3)
+        controller.request(1, GRID, "rtsp://1")
+        controller.request(2, GRID, "rtsp://2")
+        controller.request(3, GRID, "rtsp://3")
+
+        with mock.patch("multi_cam_stream.admission.time.time", return_value=admission.time.time() + admission.QUEUE_TTL + 1):
+            ready = controller.release(1)
+
+        self.assertEqual(ready, [(3, "rtsp://3", GRID)])
+        self.assertEqual(controller.snapshot()["queue"], [])
+
+    def test_measured_cost_replaces_the_default_estimate(self):
+        controller = self.controller(max_streams=10)
+        controller.request(1, GRID, "rtsp://1")
+        usage = iter([(100.0, 50.0), (100.1, 50.0)])  # 0.1 cpu-seconds over the sample interval
+        now = admission.time.time()
+        with mock.patch("multi_cam_stream.admission.read_process_usage", side_effect=lambda pid: next(usage)), \
+                mock.patch("multi_cam_stream.admission.time.time", side_effect=[now, now + 1]):
+            controller.sample(lambda camera_id: [123])
+            controller.sample(lambda camera_id: [123])
+
+        stream = controller.snapshot()["streams"][0]
+        self.assertTrue(stream["measured"])
+        self.assertLess(stream["cpu_cores"], admission.DEFAULT_STREAM_CPU)
+        self.assertEqual(stream["memory_mb"], 50.0)
+
+    def test_snapshot_lists_ingest_and_remux_keys_of_one_camera(self):
+        controller = self.controller()
+        controller.request(remux_key(1), GRID)
+        controller.request(1, GRID, "rtsp://1")
+
+        streams = [(stream["camera_id"], stream["kind"]) for stream in controller.snapshot()["streams"]]
+        self.assertEqual(streams, [(1, admission.HLS_REMUX), (1, admission.INGEST)])
+
+
+# -----------------------------------------
+# HLS Remux
+# -----------------------------------------
+@override_settings(STREAM_SYNTHETIC_SOURCE="", STREAM_RTSP_TIMEOUT=5, STREAM_RTSP_TIMEOUT_OPTION="-timeout")
+class HlsRemuxerTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_patch = override_settings(STREAM_HLS_ROOT=root.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        popen = mock.patch("multi_cam_stream.hls.subprocess.Popen")
+        self.popen = popen.start()
+        self.addCleanup(popen.stop)
+        self.popen.return_value.poll.return_value = None
+        self.popen.return_value.pid = 4242
+        self.controller = AdmissionController(2, cpu_budget=admission.DEFAULT_STREAM_CPU * 2, memory_budget_mb=0)
+        self.released = []
+        self.remuxer = HlsRemuxer(self.controller, ffmpeg_source_args, on_released=self.released.extend)
+        self.remuxer._pruner = mock.Mock()  # No background pruning in tests
+
+    def test_remux_reads_the_camera_with_the_ingest_timeouts(self):
+        self.assertTrue(self.remuxer.ensure(1, "rtsp://cam/1").admitted)
+
+        command = self.popen.call_args.args[0]
+        self.assertIn("rtsp://cam/1", command)
+        self.assertEqual(command[command.index("-rw_timeout") + 1], "5000000")
+        self.assertEqual(command[command.index("-c:v") + 1], "copy")
+
+    @override_settings(STREAM_SYNTHETIC_SOURCE="testsrc2=size=320x240:rate=5")
+    def test_synthetic_source_is_encoded_instead_of_copied(self):
+        self.remuxer.ensure(1, "rtsp://cam/1")
+
+        command = self.popen.call_args.args[0]
+        self.assertNotIn("rtsp://cam/1", command)
+        self.assertEqual(command[command.index("-f") + 1], "lavfi")
+        self.assertEqual(command[command.index("-c:v") + 1], "libx264")
+
+    def test_remux_is_rejected_when_the_node_is_full(self):
+        self.controller.request(1, FULL, "rtsp://1")
+        self.controller.request(2, FULL, "rtsp://2")
+
+        decision = self.remuxer.ensure(3, "rtsp://cam/3")
+
+        self.assertEqual(decision.state, REJECTED)
+        self.popen.assert_not_called()
+        self.assertEqual(self.controller.snapshot()["queue"], [])
+
+    def test_full_view_remux_preempts_grid_streams(self):
+        self.controller.request(1, GRID, "rtsp://1")
+        self.controller.request(2, FULL, "rtsp://2")
+
+        decision = self.remuxer.ensure(3, "rtsp://cam/3", priority=FULL)
+
+        self.assertEqual((decision.state, decision.preempted), (ADMITTED, [1]))
+        self.assertTrue(self.controller.is_admitted(remux_key(3)))
+
+    def test_stopping_a_remux_frees_its_share_for_queued_streams(self):
+        self.controller.request(1, FULL, "rtsp://1")
+        self.remuxer.ensure(2, "rtsp://cam/2")
+        self.controller.request(3, GRID, "rtsp://3")
+
+        self.remuxer.stop(2)
+
+        self.assertFalse(self.controller.is_admitted(remux_key(2)))
+        self.assertEqual(self.released, [(3, "rtsp://3", GRID)])
+        self.assertEqual(self.remuxer.pids(2), [])
+
+
+# -----------------------------------------
+# Ingest Reader
+# -----------------------------------------
+class ChunkedPipe:
+    """A pipe that hands out at most `chunk` bytes per readinto, like ffmpeg's stdout."""
+
+    def __init__(self, data, chunk):
+        self.stream = io.BytesIO(data)
+        self.chunk = chunk
+
+    def readinto(self, view):
+        data = self.stream.read(min(len(view), self.chunk))
+        view[:len(data)] = data
+        return len(data)
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.005)
+
+
+class FrameReaderTests(SimpleTestCase):
+    FRAME_SIZE = 64
+
+    def frames(self, *values):
+        return b"".join(bytes([value]) * self.FRAME_SIZE for value in values)
+
+    def test_frames_are_assembled_from_partial_reads(self):
+        reader = FrameReader(ChunkedPipe(self.frames(7), chunk=10), self.FRAME_SIZE).start()
+
+        buffer = reader.take(timeout=2)
+
+        self.assertEqual(bytes(buffer), self.frames(7))
+        self.assertEqual(reader.frames_read, 1)
+        self.assertGreaterEqual(reader.read_calls, 7)  # 64 bytes in chunks of 10, plus the EOF read
+
+    def test_only_the_newest_frame_is_kept_for_a_slow_encoder(self):
+        reader = FrameReader(ChunkedPipe(self.frames(1, 2, 3, 4, 5), chunk=self.FRAME_SIZE), self.FRAME_SIZE).start()
+        wait_until(lambda: reader.eof)
+
+        self.assertEqual(bytes(reader.take(timeout=1)), self.frames(5))
+        self.assertEqual((reader.frames_read, reader.frames_dropped), (5, 4))
+        self.assertIsNone(reader.take(timeout=1))
+
+    def test_partial_frame_at_eof_is_not_delivered(self):
+        reader = FrameReader(ChunkedPipe(self.frames(1) + b"\x02" * 10, chunk=16), self.FRAME_SIZE).start()
+        wait_until(lambda: reader.eof)
+
+        self.assertEqual(bytes(reader.take(timeout=1)), self.frames(1))
+        self.assertEqual(reader.frames_read, 1)
+
+    def test_take_times_out_while_ffmpeg_is_silent(self):
+        read_fd, write_fd = os.pipe()
+        pipe = os.fdopen(read_fd, "rb", buffering=0)
+        self.addCleanup(pipe.close)
+        reader = FrameReader(pipe, self.FRAME_SIZE).start()
+
+        self.assertIsNone(reader.take(timeout=0.05))
+        self.assertFalse(reader.eof)
+        os.close(write_fd)
+        wait_until(lambda: reader.eof)
+
+    def test_occupancy_tracks_buffers_held_by_the_encoder(self):
+        read_fd, write_fd = os.pipe()
+        pipe = os.fdopen(read_fd, "rb", buffering=0)
+        self.addCleanup(pipe.close)
+        reader = FrameReader(pipe, self.FRAME_SIZE, pool_size=2).start()
+        os.write(write_fd, self.frames(1))
+
+        buffer = reader.take(timeout=2)
+        wait_until(lambda: reader.occupancy()["reading"] == 1)
+        self.assertEqual(reader.occupancy(), {"free": 0, "reading": 1, "ready": 0, "encoding": 1})
+
+        reader.release(buffer)
+        self.assertEqual(reader.occupancy()["free"], 1)
+        os.close(write_fd)
+        wait_until(lambda: reader.eof)
+
+
+# -----------------------------------------
+# Replay Arena
+# -----------------------------------------
+class ReplayArenaTests(SimpleTestCase):
+    def setUp(self):
+        self.arena = ReplayArena.create(0)  # The smallest arena
+        self.addCleanup(self.arena.destroy)
+        self.frame_size = self.arena.size // MAX_FRAME_SHARE  # Largest frame stored; the ring holds MAX_FRAME_SHARE
+
+    def frame(self, camera_id, seq, size=None):
+        return bytes([camera_id, seq % 256]) * ((size or self.frame_size) // 2)
+
+    def append(self, camera_id, seq, size=None):
+        return self.arena.append(camera_id, seq, 1000.0 + seq, self.frame(camera_id, seq, size))
+
+    def test_read_latest_returns_each_new_frame_once(self):
+        serial = self.append(1, 1, size=100)
+
+        self.assertEqual(self.arena.read_latest(1), (serial, 1, 1001.0, self.frame(1, 1, size=100)))
+        self.assertIsNone(self.arena.read_latest(1, after=serial))
+        self.assertIsNone(self.arena.read_latest(2))
+
+    def test_ring_wraps_and_evicts_the_oldest_frames(self):
+        serials = [self.append(1, seq) for seq in range(1, 21)]
+
+        frames = self.arena.history(1)
+        self.assertEqual([frame[0] for frame in frames], serials[-MAX_FRAME_SHARE:])
+        for serial, seq, _, _ in frames:
+            self.assertEqual(self.arena.read(serial)[2], self.frame(1, seq))  # No frame torn by the wrap
+        self.assertIsNone(self.arena.read(serials[0]))
+        snapshot = self.arena.snapshot()
+        self.assertEqual(snapshot["frames_evicted"], 20 - MAX_FRAME_SHARE)
+        self.assertLessEqual(snapshot["used_mb"], snapshot["budget_mb"])
+
+    def test_oversized_frames_are_not_stored(self):
+        with self.assertLogs("multi_cam_stream.replay", "WARNING"):
+            self.assertIsNone(self.append(1, 1, size=self.frame_size + 2))
+        self.assertEqual(self.arena.history(1), [])
+
+    def test_history_is_limited_to_the_seconds_before_the_newest_frame(self):
+        for seq in range(1, 11):
+            self.append(1, seq, size=100)
+
+        self.assertEqual([frame[1] for frame in self.arena.history(1, seconds=3)], [7, 8, 9, 10])
+
+    def test_live_camera_keeps_its_newest_frame_through_other_traffic(self):
+        self.append(2, 1, size=100)
+        for seq in range(1, 31):
+            self.append(1, seq)
+
+        self.assertEqual(self.arena.read_latest(2)[1:], (1, 1001.0, self.frame(2, 1, size=100)))
+        self.assertGreater(self.arena.snapshot()["frames_carried_over"], 0)
+
+    def test_released_camera_is_not_carried_over(self):
+        self.append(2, 1, size=100)
+        self.arena.release(2)
+        self.assertIsNone(self.arena.read_latest(2))
+        self.assertEqual(len(self.arena.history(2)), 1)  # Still replayable until evicted
+        self.assertFalse(self.arena.snapshot()["cameras"][2]["live"])
+
+        for seq in range(1, 31):
+            self.append(1, seq)
+
+        self.assertEqual(self.arena.history(2), [])
+        self.assertEqual(self.arena.snapshot()["frames_carried_over"], 0)
+
+    def test_carry_over_is_capped_per_append(self):
+        for camera_id in range(1, MAX_FRAME_SHARE + 1):  # Fills the ring exactly
+            self.append(camera_id, 1)
+        self.append(1, 2)  # Evicts only camera 1's own frame
+
+        self.append(MAX_FRAME_SHARE + 1, 1)
+
+        self.assertEqual(self.arena.snapshot()["frames_carried_over"], MAX_RESCUES)
+        for camera_id in range(2, 2 + MAX_RESCUES):
+            self.assertEqual(self.arena.read_latest(camera_id)[1:3], (1, 1001.0))
+        self.assertIsNone(self.arena.read_latest(2 + MAX_RESCUES))  # Past the cap
+        self.assertIsNotNone(self.arena.read_latest(MAX_FRAME_SHARE + 1))
+
+    def test_lock_held_by_a_dead_process_is_recovered(self):
+        self.arena.lock.acquire()
+        with mock.patch.object(replay, "process_gone", return_value=True), \
+                mock.patch.object(replay, "LOCK_TIMEOUT", 0.01), \
+                self.assertLogs("multi_cam_stream.replay", "WARNING"):
+            self.assertIsNotNone(self.append(1, 1, size=100))
+
+
+# -----------------------------------------
+# Ingest Worker
+# -----------------------------------------
+def fake_shared(**entries):
+    return SharedStreamState(
+        replay=mock.Mock(), active_streams=dict(entries.get("active_streams", {})), first_frame_times={},
+        frame_info=dict(entries.get("frame_info", {})), ingest_stats={}, roi_requests={}, roi_frames={},
+        roi_seqs={}, stream_profiles={},
+    )
+
+
+class ReconnectDelayTests(SimpleTestCase):
+    def test_delay_doubles_per_attempt_with_half_of_it_random(self):
+        with mock.patch("multi_cam_stream.streaming.random.uniform", side_effect=lambda low, high: high):
+            longest = [reconnect_delay(attempt) for attempt in range(1, 5)]
+        with mock.patch("multi_cam_stream.streaming.random.uniform", side_effect=lambda low, high: low):
+            shortest = [reconnect_delay(attempt) for attempt in range(1, 5)]
+
+        base = streaming.RECONNECT_BASE_DELAY
+        self.assertEqual(longest, [base, base * 2, base * 4, base * 8])
+        self.assertEqual(shortest, [step / 2 for step in longest])
+
+    def test_delay_is_capped(self):
+        for attempt in (10, 100, 10_000):
+            self.assertLessEqual(reconnect_delay(attempt), streaming.RECONNECT_MAX_DELAY)
+            self.assertGreaterEqual(reconnect_delay(attempt), streaming.RECONNECT_MAX_DELAY / 2)
+
+
+class CameraIngestRespawnTests(SimpleTestCase):
+    def run_ingest(self, delivered_per_run, removed_after=None):
+        """Runs the respawn loop over fake ffmpeg runs; returns the ingest and the reconnect attempts seen."""
+        shared = fake_shared()
+        ingest = CameraIngest(1, "rtsp://cam/1", shared)
+        runs = iter(delivered_per_run)
+
+        def run_ffmpeg():
+            ingest.process = mock.Mock(pid=5000 + ingest.stats.reconnects, returncode=1)
+            shared.active_streams[1] = ingest.process.pid
+            ingest.stats.attach(FrameReader(io.BytesIO(), 1))
+            delivered = next(runs, None)
+            if delivered is None:
+                ingest.stopping = True
+                return 0
+            if removed_after is not None and ingest.stats.reconnects == removed_after:
+                shared.active_streams.pop(1)  # The parent stopped the stream
+            return delivered
+
+        attempts = []
+        ingest.run_ffmpeg = run_ffmpeg
+        with mock.patch("multi_cam_stream.streaming.reconnect_delay", side_effect=lambda attempt: attempts.append(attempt) or 0):
+            ingest.run()
+        return ingest, attempts
+
+    def test_ffmpeg_is_respawned_with_backoff_that_resets_after_frames(self):
+        ingest, attempts = self.run_ingest([0, 0, 5, 0])
+
+        self.assertEqual(attempts, [1, 2, 1, 2])
+        self.assertEqual(ingest.stats.reconnects, 4)
+        self.assertIsNotNone(ingest.stats.stale_since)
+
+    def test_no_respawn_once_the_parent_removed_the_stream(self):
+        ingest, attempts = self.run_ingest([0, 0, 0], removed_after=1)
+
+        self.assertEqual(attempts, [1])
+
+
+class WorkerCleanupTests(SimpleTestCase):
+    def test_dying_worker_leaves_a_respawned_stream_alone(self):
+        shared = fake_shared(active_streams={1: 9999}, frame_info={1: (3, 1.0)})
+
+        with mock.patch("multi_cam_stream.streaming.os.kill") as kill:
+            cleanup_camera_stream(1, shared, own_pids={100, 101})
+
+        kill.assert_not_called()
+        self.assertEqual(shared.active_streams, {1: 9999})
+        self.assertIn(1, shared.frame_info)
+        shared.replay.release.assert_not_called()
+
+    def test_worker_clears_its_own_entries_without_signalling_anyone(self):
+        shared = fake_shared(active_streams={1: 101}, frame_info={1: (3, 1.0)})
+
+        with mock.patch("multi_cam_stream.streaming.os.kill") as kill:
+            cleanup_camera_stream(1, shared, own_pids={100, 101})
+
+        kill.assert_not_called()
+        self.assertEqual(shared.active_streams, {})
+        self.assertNotIn(1, shared.frame_info)
+        shared.replay.release.assert_called_once_with(1)
+
+
+# -----------------------------------------
+# Degradation Under Load
+# -----------------------------------------
+class DegradationControllerTests(TestCase):
+    def setUp(self):
+        self.shared = fake_shared()
+        with mock.patch("multi_cam_stream.degradation.read_cpu_times", return_value=None):
+            self.controller = DegradationController(self.shared, cpu_high=0.85, cpu_low=0.6, encode_ms_high=50)
+        self.controller.measure = mock.Mock()  # Load is set by each test
+        patcher = mock.patch("multi_cam_stream.degradation.logger")
+        self.logger = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cameras = {
+            priority: Camera.objects.create(name=f"Cam {priority}", ip_address=f"10.0.0.{priority + 1}",
+                                            stream_fps=10, jpeg_quality=80, stream_priority=priority).id
+            for priority in (Camera.PRIORITY_LOW, Camera.PRIORITY_NORMAL, Camera.PRIORITY_HIGH)
+        }
+        for camera_id in self.cameras.values():
+            self.controller.track(camera_id)
+        self.now = time.time()
+
+    def run_for(self, seconds, cpu):
+        self.controller.cpu = cpu
+        for _ in range(0, seconds, 5):
+            self.now += 5
+            self.controller.sample(self.now)
+
+    def levels(self):
+        profiles = self.shared.stream_profiles
+        return {priority: profiles[camera_id]["level"] for priority, camera_id in self.cameras.items()}
+
+    def test_effective_profile_lowers_fps_and_quality_with_floors(self):
+        base = {"capture_fps": 10, "width": 640, "height": 480, "quality": 80}
+
+        self.assertEqual(effective_profile(base, 0), {**base, "fps": 10, "level": 0})
+        self.assertEqual(effective_profile(base, MAX_LEVEL)["fps"], 2)
+        self.assertEqual(effective_profile({**base, "capture_fps": 2, "quality": 40}, MAX_LEVEL),
+                         {**base, "capture_fps": 2, "quality": 30, "fps": 1, "level": MAX_LEVEL})
+
+    def test_overload_degrades_one_level_per_step_lowest_priority_first(self):
+        self.run_for(STEP_INTERVAL, cpu=0.95)
+        self.assertEqual(self.levels(), {Camera.PRIORITY_LOW: 1, Camera.PRIORITY_NORMAL: 0, Camera.PRIORITY_HIGH: 0})
+
+        self.run_for(STEP_INTERVAL * MAX_LEVEL, cpu=0.95)
+        self.assertEqual(self.levels(),
+                         {Camera.PRIORITY_LOW: MAX_LEVEL, Camera.PRIORITY_NORMAL: 1, Camera.PRIORITY_HIGH: 0})
+        self.assertEqual([event["action"] for event in self.controller.events], ["degrade"] * (MAX_LEVEL + 1))
+
+    def test_high_priority_cameras_are_never_degraded(self):
+        self.run_for(STEP_INTERVAL * MAX_LEVEL * 3, cpu=0.95)
+
+        self.assertEqual(self.levels()[Camera.PRIORITY_HIGH], 0)
+        self.assertEqual(len(self.controller.events), MAX_LEVEL * 2)
+        exhausted = [call for call in self.logger.warning.call_args_list if "no camera left" in call.args[0]]
+        self.assertEqual(len(exhausted), 1)
+
+    def test_sustained_low_load_restores_highest_priority_first(self):
+        self.run_for(STEP_INTERVAL * (MAX_LEVEL + 1), cpu=0.95)
+
+        self.run_for(RESTORE_AFTER, cpu=0.3)  # Calm counts from the first low sample
+        self.assertEqual(self.levels()[Camera.PRIORITY_NORMAL], 1)
+
+        self.run_for(5, cpu=0.3)
+        self.assertEqual(self.levels(),
+                         {Camera.PRIORITY_LOW: MAX_LEVEL, Camera.PRIORITY_NORMAL: 0, Camera.PRIORITY_HIGH: 0})
+        self.run_for(RESTORE_AFTER, cpu=0.3)
+        self.assertEqual(self.levels()[Camera.PRIORITY_LOW], MAX_LEVEL - 1)
+
+    def test_load_between_thresholds_holds_the_levels(self):
+        self.run_for(STEP_INTERVAL, cpu=0.95)
+        self.run_for(RESTORE_AFTER * 3, cpu=0.7)
+
+        self.assertEqual(self.levels()[Camera.PRIORITY_LOW], 1)
+
+    def test_disabled_controller_only_measures(self):
+        self.controller.enabled = False
+        self.run_for(STEP_INTERVAL * 3, cpu=0.95)
+
+        self.assertEqual(set(self.levels().values()), {0})
+        self.assertTrue(self.controller.measure.called)
+
+
+# -----------------------------------------
+# Frame Analytics
+# -----------------------------------------
+class FakePool:
+    """Stands in for the process pool; futures are resolved by the test."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.futures = []
+        self.shutdown_called = False
+
+    def submit(self, *args):
+        if self.broken:
+            raise BrokenProcessPool("A child process terminated abruptly")
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True):
+        self.shutdown_called = True
+
+
+class AnalyticsSchedulerTests(SimpleTestCase):
+    PROCESSOR = "multi_cam_stream.analytics.FrameProcessor"
+
+    def setUp(self):
+        self.shared = fake_shared()
+        self.shared.replay.read_latest.side_effect = lambda camera_id: (1, 1, 1000.0, b"jpeg")
+        with mock.patch.object(AnalyticsScheduler, "_new_pool", side_effect=FakePool):
+            self.scheduler = AnalyticsScheduler(self.shared, {}, {self.PROCESSOR: []}, workers=2)
+        self.scheduler._new_pool = FakePool
+        self.schedule = self.scheduler.schedules[0]
+
+    def test_slot_is_freed_when_the_batch_finishes(self):
+        self.scheduler.submit(self.schedule, [1], now=0)
+        self.assertEqual(self.schedule.in_flight, 1)
+
+        self.scheduler.pool.futures[0].set_result(([{"ok": True}], 0.01))
+
+        self.assertEqual(self.schedule.in_flight, 0)
+        self.assertEqual(self.schedule.batches, 1)
+
+    def test_broken_pool_on_submit_takes_no_slot_and_is_replaced(self):
+        broken = self.scheduler.pool = FakePool(broken=True)
+
+        self.scheduler.submit(self.schedule, [1], now=0)
+
+        self.assertEqual(self.schedule.in_flight, 0)
+        self.assertEqual(self.schedule.errors, 1)
+        self.assertIsNot(self.scheduler.pool, broken)
+        self.assertTrue(broken.shutdown_called)
+        self.assertEqual(self.scheduler.pool_restarts, 1)
+
+    def test_worker_dying_mid_batch_replaces_the_pool_once(self):
+        self.scheduler.submit(self.schedule, [1], now=0)
+        self.scheduler.submit(self.schedule, [2], now=0)
+        broken = self.scheduler.pool
+
+        for future in broken.futures:
+            future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+
+        self.assertEqual(self.schedule.in_flight, 0)
+        self.assertEqual(self.schedule.errors, 2)
+        self.assertEqual(self.scheduler.pool_restarts, 1)
+        self.scheduler.submit(self.schedule, [3], now=0)
+        self.assertEqual(len(self.scheduler.pool.futures), 1)
+
+
+# -----------------------------------------
+# Region of Interest
+# -----------------------------------------
+class ParseRoiTests(SimpleTestCase):
+    def test_roi_snaps_to_whole_percents(self):
+        self.assertEqual(parse_roi(roi="0.251,0.4,0.299,0.3"), "25,40,30,30")
+
+    def test_zoom_centres_the_region(self):
+        self.assertEqual(parse_roi(zoom="4", center="0.5,0.5"), "38,38,25,25")
+        self.assertEqual(parse_roi(zoom="2"), "25,25,50,50")
+
+    def test_region_over_an_edge_is_shifted_inside(self):
+        self.assertEqual(parse_roi(zoom="2", center="0.95,0.05"), "50,0,50,50")
+        self.assertEqual(parse_roi(roi="-0.1,0.9,0.2,0.2"), "0,80,20,20")
+
+    def test_tiny_regions_grow_to_the_minimum(self):
+        self.assertEqual(parse_roi(roi="0.5,0.5,0.001,0.001"), "50,50,5,5")
+
+    def test_full_frame_is_no_roi(self):
+        self.assertIsNone(parse_roi())
+        self.assertIsNone(parse_roi(roi="0,0,1,1"))
+        self.assertIsNone(parse_roi(zoom="1"))
+
+    def test_malformed_regions_are_rejected(self):
+        for kwargs in ({"roi": "1,2,3"}, {"roi": "a,b,c,d"}, {"roi": "0,0,nan,0.5"}, {"roi": "0,0,1.5,0.5"},
+                       {"zoom": "0.5"}, {"zoom": str(MAX_ZOOM + 1)}, {"zoom": "2", "center": "0.5"}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                parse_roi(**kwargs)
+
+    def test_roi_box_scales_to_the_frame(self):
+        self.assertEqual(roi_box("25,40,30,30", 640, 480), (160, 192, 352, 336))
+
+
+class CountingDict(dict):
+    """A shared-state dict that counts reads, standing in for a Manager proxy."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = 0
+
+    def get(self, key, default=None):
+        self.reads += 1
+        return super().get(key, default)
+
+
+class RoiChannelTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = fake_shared()._replace(roi_frames=CountingDict(), roi_seqs=CountingDict())
+        self.channel = RoiChannel(mock.Mock(shared=self.shared), 1, "25,40,30,30")
+        self.encoder = RoiEncoder(1, self.shared, [], 640, 480)
+        self.encoder.boxes = {"25,40,30,30": roi_box("25,40,30,30", 640, 480)}
+
+    def publish(self, seq):
+        with mock.patch("cv2.imencode", return_value=(True, mock.Mock(tobytes=lambda: f"jpeg-{seq}".encode()))):
+            self.encoder.publish(mock.MagicMock(), seq, 1000.0 + seq)
+
+    def test_crop_bytes_are_fetched_only_when_the_seq_moves(self):
+        self.assertIsNone(self.channel.poll())
+        self.publish(1)
+
+        self.assertEqual(self.channel.poll(), (1, 1001.0, b"jpeg-1"))
+        for _ in range(20):
+            self.assertIsNone(self.channel.poll())
+        self.assertEqual(self.shared.roi_frames.reads, 1)
+
+        self.publish(2)
+        self.assertEqual(self.channel.poll()[0], 2)
+        self.assertEqual(self.shared.roi_frames.reads, 2)
+
+    def test_poll_keeps_the_demand_alive(self):
+        self.channel.poll()
+
+        self.assertIn((1, "25,40,30,30"), self.shared.roi_requests)
+
+    def test_expired_roi_clears_its_seq_and_crop(self):
+        self.publish(1)
+        self.channel.poll()
+        self.shared.roi_requests.clear()  # Its viewers went away
+        self.encoder.refresh(time.time())
+
+        self.assertEqual((self.shared.roi_seqs, self.shared.roi_frames), ({}, {}))
+
+
+# -----------------------------------------
+# Section Switch Tracing
+# -----------------------------------------
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        one_to_ten, one_to_twenty = list(range(1, 11)), list(range(1, 21))
+
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile(one_to_ten, 50), 5)
+        self.assertEqual(percentile(one_to_ten, 95), 10)
+        self.assertEqual(percentile(one_to_twenty, 95), 19)
+        self.assertEqual(percentile(one_to_twenty, 96), 20)
+
+    def test_edges(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([1, 2, 3], 0), 1)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+
+
+class TracerTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tracing, "logger")  # finish() logs every trace
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tracer = Tracer(size=5)
+
+    def finish(self, name, **steps):
+        trace = self.tracer.start(name)
+        for step, duration_ms in steps.items():
+            trace.add(step, duration_ms)
+        return self.tracer.finish(trace)
+
+    def test_summary_per_step(self):
+        for duration_ms in (10, 20, 30, 40):
+            self.finish("switch", stop=duration_ms, start=1)
+
+        summary = self.tracer.summary()
+
+        self.assertEqual(summary["stop"], {"count": 4, "p50_ms": 20, "p95_ms": 40, "max_ms": 40})
+        self.assertEqual(summary["start"]["count"], 4)
+        self.assertEqual(summary["total"]["count"], 4)
+
+    def test_recent_is_newest_first_and_bounded(self):
+        traces = [self.finish(f"switch {number}") for number in range(7)]
+
+        self.assertEqual([trace["name"] for trace in self.tracer.recent(2)], ["switch 6", "switch 5"])
+        self.assertEqual(len(self.tracer.recent(50)), 5)  # The buffer keeps the newest five
+        self.assertEqual(self.tracer.recent(0), [])
+        self.assertEqual(self.tracer.recent(-1), [])
+        self.assertEqual(self.tracer.recent(1)[0]["trace_id"], traces[-1].trace_id)
+
+
+# -----------------------------------------
+# Preview Thumbnails
+# -----------------------------------------
+class RefreshPreviewsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_patch = override_settings(STREAM_PREVIEW_DIR=directory.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        section = Section.objects.create(name="Line 1", serac=Seracs.objects.create(name="Serac A"))
+        self.camera = Camera.objects.create(name="Dock", ip_address="10.0.0.1", port=554, section=section)
+        self.attempts_seen = []
+
+    def fake_grab(self, camera_id, camera_url, timeout):
+        self.attempts_seen.append(previews.read_preview_meta(camera_id)["attempted_at"])
+        return True
+
+    def test_cameras_are_marked_attempted_before_the_grab(self):
+        started = time.time()
+        with mock.patch.object(previews, "grab_preview", side_effect=self.fake_grab):
+            summary = previews.refresh_previews(max_age=60)
+
+        self.assertEqual(summary, {"refreshed": 1, "failed": 0, "skipped": 0})
+        self.assertGreaterEqual(self.attempts_seen[0], started)
+
+    def test_overlapping_run_skips_cameras_already_being_grabbed(self):
+        with mock.patch.object(previews, "grab_preview", side_effect=self.fake_grab) as grab:
+            previews.refresh_previews(max_age=60)
+            # The first run's grab has not written its outcome yet; the claim alone keeps the camera.
+            summary = previews.refresh_previews(max_age=60)
+
+        self.assertEqual(grab.call_count, 1)
+        self.assertEqual(summary["skipped"], 1)
+
+    def test_grab_uses_the_stream_source_arguments(self):
+        grabbed = mock.Mock(returncode=0, stdout=b"jpeg")
+        with mock.patch.object(previews.subprocess, "run", return_value=grabbed) as run, \
+                override_settings(STREAM_SYNTHETIC_SOURCE="testsrc2=size=640x480:rate=5"):
+            self.assertTrue(previews.grab_preview(self.camera.id, "rtsp://10.0.0.1/"))
+        self.assertEqual(run.call_args.args[0][1:6], ["-re", "-f", "lavfi", "-i", "testsrc2=size=640x480:rate=5"])
+
+        with mock.patch.object(previews.subprocess, "run", return_value=grabbed) as run:
+            previews.grab_preview(self.camera.id, "rtsp://10.0.0.1/")
+        self.assertIn("-rw_timeout", run.call_args.args[0])
+
+    @override_settings(STREAM_ACCEL_REDIRECT_PREFIX="/_protected/")
+    def test_camera_without_a_grabbed_preview_gets_the_json_404(self):
+        with mock.patch.object(previews, "grab_preview", side_effect=self.fake_grab):
+            previews.refresh_previews(max_age=60)  # Records the attempt only
+
+        response = self.client.get(f"/api/previews/{self.camera.id}.jpg")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(response.json()["message"], "No preview yet")
+
+    @override_settings(STREAM_ACCEL_REDIRECT_PREFIX="/_protected/")
+    def test_grabbed_preview_is_handed_to_the_proxy(self):
+        with mock.patch.object(previews.subprocess, "run", return_value=mock.Mock(returncode=0, stdout=b"jpeg")):
+            previews.grab_preview(self.camera.id, "rtsp://10.0.0.1/")
+
+        response = self.client.get(f"/api/previews/{self.camera.id}.jpg")
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/_protected/previews/{self.camera.id}.jpg")
+
+    def test_preview_beat_schedule_is_an_interval(self):
+        schedule = settings.CELERY_BEAT_SCHEDULE["refresh-camera-previews"]["schedule"]
+        self.assertEqual(schedule, timedelta(minutes=settings.STREAM_PREVIEW_INTERVAL))
+
+
+# -----------------------------------------
+# Motion Events
+# -----------------------------------------
+class MotionEventTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_patch = override_settings(STREAM_MOTION_DIR=directory.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        section = Section.objects.create(name="Line 1", serac=Seracs.objects.create(name="Serac A"))
+        self.camera = Camera.objects.create(name="Dock", ip_address="10.0.0.1", port=554, section=section)
+        patcher = mock.patch.object(motion, "write_thumbnail")
+        self.write_thumbnail = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.processor = MotionEventProcessor()
+        self.start = 1760000000.0
+
+    def sample(self, offset, level, jpeg=b"frame"):
+        self.processor.on_result(self.camera.id, {"level": level}, self.start + offset, jpeg)
+
+    def events(self):
+        return list(MotionEvent.objects.order_by("start_time"))
+
+    def test_quiet_samples_do_not_open_an_event(self):
+        self.sample(0, 0.015)  # Above CONTINUE_LEVEL, below START_LEVEL
+
+        self.assertEqual(self.events(), [])
+
+    def test_active_samples_coalesce_into_one_event_with_its_peak(self):
+        self.sample(0, 0.05)
+        self.sample(1, 0.2, b"peak")
+        self.sample(2, 0.012)  # Below START_LEVEL, still keeps the event open
+        self.processor.close(self.camera.id)
+
+        [event] = self.events()
+        self.assertTrue(event.closed)
+        self.assertEqual(event.start_time.timestamp(), self.start)
+        self.assertEqual(event.end_time.timestamp(), self.start + 2)
+        self.assertEqual(event.peak_intensity, 0.2)
+        self.assertEqual(self.write_thumbnail.call_args.args, (event.thumbnail, b"peak"))
+
+    def test_quiet_period_closes_the_event(self):
+        self.sample(0, 0.05)
+        self.sample(1, 0.05)
+        self.sample(1 + motion.QUIET_PERIOD, 0.05)
+
+        first, second = self.events()
+        self.assertEqual(first.end_time.timestamp(), self.start + 1)
+        self.assertEqual(second.start_time.timestamp(), self.start + 1 + motion.QUIET_PERIOD)
+
+    def test_long_activity_is_split(self):
+        for offset in range(0, MAX_EVENT_SECONDS + 2, 2):
+            self.sample(offset, 0.05)
+
+        first, second = self.events()
+        self.assertLessEqual((first.end_time - first.start_time).total_seconds(), MAX_EVENT_SECONDS)
+        self.assertEqual(second.start_time.timestamp(), self.start + MAX_EVENT_SECONDS)
+
+    def test_open_event_is_persisted_every_interval(self):
+        for offset in range(PERSIST_INTERVAL):
+            self.sample(offset, 0.05)
+        self.assertEqual(self.events()[0].end_time.timestamp(), self.start)
+
+        self.sample(PERSIST_INTERVAL, 0.05)
+        self.assertEqual(self.events()[0].end_time.timestamp(), self.start + PERSIST_INTERVAL)
+
+    def test_camera_gone_closes_its_event(self):
+        self.sample(0, 0.05)
+        self.sample(3, 0.05)
+
+        self.processor.on_camera_gone(self.camera.id)
+
+        self.assertEqual(self.processor.open_events, {})
+        self.assertEqual(self.events()[0].end_time.timestamp(), self.start + 3)
+
+    def test_prune_deletes_expired_events_and_their_thumbnails(self):
+        now = motion._to_datetime(self.start)
+        old = MotionEvent.objects.create(camera=self.camera, start_time=now - timedelta(days=40),
+                                         end_time=now - timedelta(days=40), peak_intensity=0.1, thumbnail="old.jpg")
+        recent = MotionEvent.objects.create(camera=self.camera, start_time=now - timedelta(days=1),
+                                            end_time=now - timedelta(days=1), peak_intensity=0.1, thumbnail="new.jpg")
+        for name in ("old.jpg", "new.jpg", "orphan.jpg"):
+            open(motion.thumbnail_path(name), "wb").close()
+        os.utime(motion.thumbnail_path("orphan.jpg"), (self.start - 40 * 86400,) * 2)
+
+        summary = prune_motion_events(timedelta(days=30), now=now)
+
+        self.assertEqual(summary, {"events": 1, "thumbnails": 2})
+        self.assertEqual(list(MotionEvent.objects.values_list("id", flat=True)), [recent.id])
+        self.assertFalse(MotionEvent.objects.filter(id=old.id).exists())
+        self.assertEqual(os.listdir(motion.motion_dir()), ["new.jpg"])
+
+    def test_thumbnail_is_cacheable_only_once_the_event_has_closed(self):
+        self.sample(0, 0.05)
+        [event] = self.events()
+        with open(motion.thumbnail_path(event.thumbnail), "wb") as f:
+            f.write(b"jpeg")
+        url = f"/api/motion_events/{event.id}/thumbnail/"
+
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response["Cache-Control"]), (200, "private, no-cache"))
+
+        self.processor.close(self.camera.id)
+        self.assertEqual(self.client.get(url)["Cache-Control"], "private, max-age=86400")
+
+    def test_non_numeric_event_id_is_not_found(self):
+        self.assertEqual(self.client.get("/api/motion_events/abc/thumbnail/").status_code, 404)
+        self.assertEqual(self.client.get("/api/motion_events/999/thumbnail/").status_code, 404)
+
+    def test_prune_beat_schedule_is_registered(self):
+        schedule = settings.CELERY_BEAT_SCHEDULE["prune-motion-events"]
+        self.assertEqual(schedule["task"], "multi_cam_stream.tasks.prune_motion_events")
+
+
+# -----------------------------------------
+# Signed Stream URLs
+# -----------------------------------------
+@override_settings(STREAM_URL_TTL=60, STREAM_REQUIRE_SIGNED_URLS=False)
+class SignedUrlTests(SimpleTestCase):
+    def verify(self, url, camera_id=1):
+        query = QueryDict(urlsplit(url).query)
+        return verify_camera_signature(camera_id, query.get("exp"), query.get("sig"), query)
+
+    def test_signature_is_bound_to_the_camera_and_expiry(self):
+        url = sign_stream_url("/api/video_feed/1/", 1)
+
+        self.assertTrue(self.verify(url))
+        self.assertFalse(self.verify(url, camera_id=2))
+        self.assertFalse(self.verify(url.replace("exp=", "exp=1")))
+        self.assertFalse(self.verify(sign_stream_url("/api/video_feed/1/", 1, ttl=-1)))
+
+    def test_appending_a_behaviour_changing_parameter_invalidates_the_signature(self):
+        url = sign_stream_url("/api/video_feed/1/", 1)
+
+        for extra in ("priority=full", "fps=30", "roi=0,0,0.5,0.5", "zoom=4&center=0.5,0.5"):
+            with self.subTest(extra=extra):
+                self.assertFalse(self.verify(f"{url}&{extra}"))
+        self.assertTrue(self.verify(f"{url}&_=1760000000"))  # Cache busters are harmless
+
+    def test_parameters_in_the_url_are_signed_with_it(self):
+        url = sign_stream_url("/api/hls/1/index.m3u8?priority=20", 1)
+
+        self.assertTrue(self.verify(url))
+        self.assertFalse(self.verify(url.replace("priority=20", "priority=full")))
+        self.assertFalse(self.verify(url.replace("priority=20&", "")))
+
+    def test_relay_style_query_dict_verifies_like_a_request(self):
+        url = sign_stream_url("/api/video_feed/1/?fps=2", 1)
+        query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+
+        self.assertTrue(verify_camera_signature(1, query["exp"], query["sig"], query))
+
+    def test_middleware_rejects_a_signed_url_with_an_unsigned_priority(self):
+        url = sign_stream_url("/api/video_feed/1/", 1)
+
+        with mock.patch("multi_cam_stream.views.start_camera_process") as start:
+            response = self.client.get(f"{url}&priority=full")
+
+        self.assertEqual(response.status_code, 403)
+        start.assert_not_called()
+
+    def test_signed_playlist_carries_the_signed_priority_to_its_segments(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        url = sign_stream_url(f"/api/hls/1/{PLAYLIST_NAME}?priority=20", 1)
+        with override_settings(STREAM_HLS_ROOT=root.name):
+            os.makedirs(camera_dir(1))
+            with open(os.path.join(camera_dir(1), PLAYLIST_NAME), "w") as f:
+                f.write("#EXTM3U\n#EXTINF:2.0,\nseg_00001.ts\n")
+            request = RequestFactory().get(url)
+            request.stream_signed = True
+            response = serve_hls_file(request, 1, PLAYLIST_NAME)
+
+        segment = response.content.decode().splitlines()[-1]
+        self.assertTrue(segment.startswith("seg_00001.ts?"))
+        self.assertTrue(self.verify(segment))
+
+
+# -----------------------------------------
+# Edge Relay
+# -----------------------------------------
+class UpstreamFeedTests(SimpleTestCase):
+    def setUp(self):
+        self.feed = UpstreamFeed(1, "http://origin", linger=0)
+        self.feed._thread = mock.Mock()  # Pretend the upstream thread runs; tests drive it by hand
+
+    def refuse(self, code=503):
+        error = HTTPError(self.feed.url, code, "Service Unavailable", {}, io.BytesIO(b'{"message": "queued"}'))
+        with mock.patch("multi_cam_stream.relay.urlopen", side_effect=error), self.assertRaises(RuntimeError):
+            self.feed._pull()
+
+    def publish(self, frame):
+        with self.feed._cond:
+            self.feed.frame = frame
+            self.feed.seq += 1
+            self.feed._cond.notify_all()
+
+    def test_refusal_after_joining_ends_the_wait(self):
+        seen = self.feed.acquire()
+        self.refuse()
+
+        started = time.monotonic()
+        self.assertIsNone(self.feed.wait_frame(0, 5, seen))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.feed.refused_status, 503)
+
+    def test_viewer_joining_after_a_refusal_waits_for_the_retry(self):
+        self.refuse()
+        seen = self.feed.acquire()
+        threading.Timer(0.05, self.publish, args=[b"jpeg"]).start()
+
+        self.assertEqual(self.feed.wait_frame(0, 2, seen), (1, b"jpeg"))
+
+    def test_upstream_thread_exit_clears_the_refusal(self):
+        self.refuse()
+
+        self.feed._run()  # No viewers and no linger: the thread exits at once
+
+        self.assertIsNone(self.feed.refused_status)
+        self.assertIsNone(self.feed._thread)
+
+
+# -----------------------------------------
+# Camera Health
+# -----------------------------------------
+@mock.patch("multi_cam_stream.health.random.uniform", new=lambda low, high: 1.0)  # No jitter
+class CameraHealthTests(SimpleTestCase):
+    def probe(self, camera, results, start=1000.0, step=15):
+        """Records a sequence of probe results; returns the transitions as (previous, state)."""
+        transitions = []
+        for index, ok in enumerate(results):
+            now = start + index * step
+            previous = camera.record(ok, now, "")
+            camera.reschedule(now, changed=previous is not None)
+            if previous is not None:
+                transitions.append((previous, camera.state))
+        return transitions
+
+    def camera(self, state=UNKNOWN):
+        camera = CameraHealth(1, "Dock", "10.0.0.1", 554)
+        camera.state = state
+        return camera
+
+    def test_down_only_after_consecutive_failures(self):
+        camera = self.camera(UP)
+
+        self.assertEqual(self.probe(camera, [False] * (health.DOWN_AFTER - 1)), [])
+        self.assertEqual(self.probe(camera, [False]), [(UP, DOWN)])
+
+    def test_a_good_probe_resets_the_failure_streak(self):
+        camera = self.camera(UP)
+
+        self.assertEqual(self.probe(camera, [False, False, True, False, False]), [])
+        self.assertEqual(camera.state, UP)
+
+    def test_up_again_after_consecutive_good_probes(self):
+        camera = self.camera(DOWN)
+
+        self.assertEqual(self.probe(camera, [True] * health.UP_AFTER), [(DOWN, UP)])
+
+    def test_stable_camera_backs_off_to_the_cap(self):
+        camera = self.camera(UP)
+        camera.interval = health.BASE_INTERVAL
+        intervals = []
+        for index in range(8):
+            camera.reschedule(1000.0 + index, changed=False)
+            intervals.append(camera.interval)
+
+        self.assertEqual(intervals[:3], [120, 240, 480])
+        self.assertEqual(intervals[-1], health.MAX_INTERVAL)
+
+    def test_down_camera_backs_off_only_to_the_base_interval(self):
+        camera = self.camera(UP)
+        self.probe(camera, [False] * health.DOWN_AFTER)
+        self.assertEqual(camera.interval, health.MIN_INTERVAL)
+
+        for index in range(5):
+            camera.reschedule(2000.0 + index, changed=False)
+        self.assertEqual(camera.interval, health.BASE_INTERVAL)
+
+    def test_suspect_and_flapping_cameras_are_probed_at_the_minimum_interval(self):
+        camera = self.camera(UP)
+        camera.interval = health.MAX_INTERVAL
+        self.probe(camera, [False])
+        self.assertEqual(camera.interval, health.MIN_INTERVAL)  # Suspect: confirm quickly
+
+        camera = self.camera(UP)
+        self.probe(camera, [True, False, True, False, True], step=60)
+        self.assertTrue(camera.flapping())
+        self.assertEqual(camera.interval, health.MIN_INTERVAL)
+
+    def test_flips_older_than_the_window_are_forgotten(self):
+        camera = self.camera(UP)
+        self.probe(camera, [True, False, True, False, True], step=60)
+
+        self.probe(camera, [True], start=1000.0 + health.FLAP_WINDOW + 600)
+
+        self.assertFalse(camera.flapping())
+
+    def test_monitor_reports_down_but_not_the_first_up(self):
+        monitor = HealthMonitor(probe_rate=10, notify_interval=60, recipients=[])
+        camera = monitor.cameras[1] = self.camera()
+
+        async def run(results):
+            for ok in results:
+                with mock.patch.object(health, "probe_camera", return_value=(ok, "")):
+                    await monitor.probe(camera)
+
+        with mock.patch.object(monitor, "emit") as emit:
+            asyncio.run(run([True] * health.UP_AFTER))
+            emit.assert_not_called()
+            asyncio.run(run([False] * health.DOWN_AFTER))
+
+        self.assertEqual(emit.call_count, 1)
+        self.assertEqual(emit.call_args.args[1], UP)
+        self.assertEqual(camera.state, DOWN)
+
+
+class ProbeCameraTests(SimpleTestCase):
+    def test_open_port_answers_and_the_connection_is_closed(self):
+        async def scenario():
+            server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await health.probe_camera("127.0.0.1", port)
+
+        ok, detail = asyncio.run(scenario())
+
+        self.assertTrue(ok, detail)
+
+    def test_probe_waits_for_the_transport_to_close(self):
+        writer = mock.Mock(wait_closed=mock.AsyncMock(side_effect=ConnectionResetError()))
+        with mock.patch.object(health.asyncio, "open_connection", mock.AsyncMock(return_value=(None, writer))):
+            ok, _ = asyncio.run(health.probe_camera("10.0.0.1", 554))
+
+        self.assertTrue(ok)
+        writer.close.assert_called_once_with()
+        writer.wait_closed.assert_awaited_once()
+
+    def test_closed_port_is_down(self):
+        refused = mock.AsyncMock(side_effect=ConnectionRefusedError(111, "Connection refused"))
+        with mock.patch.object(health.asyncio, "open_connection", refused):
+            self.assertEqual(asyncio.run(health.probe_camera("10.0.0.1", 554)), (False, "Connection refused"))
+
+
+# -----------------------------------------
+# Frame Fan-out
+# -----------------------------------------
+class FrameHubTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(CameraChannel, "start")  # Tests drive the channel themselves
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hub = FrameHub(fake_shared())
+
+    def channel(self, camera_id=1):
+        return self.hub.channels[(camera_id, None)]
+
+    def test_slow_viewer_skips_frames_it_did_not_pick_up(self):
+        slot = ViewerSlot(1, fps=5)
+        for seq in range(1, 4):
+            slot.publish(seq, 1000.0 + seq, b"jpeg")
+
+        self.assertEqual(slot.take(0)[0], 3)
+        self.assertEqual(slot.dropped, 2)
+        self.assertIsNone(slot.take(0))  # Nothing newer than the frame taken
+
+    def test_stream_is_paced_to_the_viewer_fps(self):
+        slot = self.hub.open(1, fps=10)
+        frames = self.hub.stream(slot, timeout=0.01)
+        slot.publish(1, 1001.0, b"jpeg")
+        next(frames)
+        slot.publish(2, 1002.0, b"jpeg")
+
+        with mock.patch.object(fanout.time, "sleep") as sleep:
+            self.assertEqual(next(frames)[0], 2)
+
+        self.assertTrue(0.05 < sleep.call_args.args[0] <= 0.1)
+        self.assertEqual(slot.delivered, 1)
+
+    def test_channel_releases_a_viewer_blocked_in_a_write(self):
+        slot = self.hub.open(1, fps=10)
+        slot.on_stall = mock.Mock()
+        frames = self.hub.stream(slot, timeout=0.01)
+        slot.publish(1, 1001.0, b"jpeg")
+        next(frames)  # The server is now writing this frame out
+
+        self.channel().check_stalls([slot], time.monotonic() + STALL_TIMEOUT / 2)
+        self.assertFalse(slot.stalled)
+        with self.assertLogs("multi_cam_stream.fanout", "WARNING"):
+            self.channel().check_stalls([slot], time.monotonic() + STALL_TIMEOUT + 1)
+
+        self.assertTrue(slot.stalled)
+        slot.on_stall.assert_called_once_with(slot)
+        with self.assertRaises(StopIteration):
+            next(frames)  # The write finally returned
+        self.assertEqual(slot.delivered, 0)
+
+    def test_viewer_waiting_for_a_frame_is_not_stalled(self):
+        slot = self.hub.open(1, fps=10)
+
+        self.channel().check_stalls([slot], time.monotonic() + STALL_TIMEOUT + 1)
+
+        self.assertFalse(slot.stalled)
+        self.assertIn(slot.viewer_id, self.channel().viewers)
+
+    def test_stream_ends_when_no_frame_arrives(self):
+        slot = self.hub.open(1, fps=10)
+
+        with mock.patch.object(fanout, "NO_FRAME_TIMEOUT", 0.02):
+            self.assertEqual(list(self.hub.stream(slot, timeout=0.01)), [])
+
+    def test_stalled_viewer_releases_its_stream_once(self):
+        runtime = mock.Mock(hub=self.hub, stream_profiles={})
+        runtime.subscriptions.viewer_closed.return_value = True
+        open_slot = self.hub.open
+
+        def open_with_frame(*args):
+            slot = open_slot(*args)
+            slot.publish(1, 1001.0, b"jpeg")
+            return slot
+
+        with mock.patch.object(streaming, "get_runtime", return_value=runtime), \
+                mock.patch.object(streaming, "stop_camera_streams") as stop_camera_streams, \
+                mock.patch.object(self.hub, "open", side_effect=open_with_frame):
+            parts = streaming.generate_frames(1, fps=5)
+            next(parts)  # Being written out to a client that stopped reading
+            [slot] = self.channel().viewers.values()
+
+            with self.assertLogs("multi_cam_stream.fanout", "WARNING"):
+                self.channel().check_stalls([slot], time.monotonic() + STALL_TIMEOUT + 1)
+            # Released while the write still blocks, not when TCP eventually gives up.
+            stop_camera_streams.assert_called_once_with({1})
+            self.assertEqual(self.channel().viewers, {})
+
+            parts.close()
+
+        self.assertEqual(runtime.subscriptions.viewer_closed.call_count, 1)
+
+
+# -----------------------------------------
+# WebSocket Transport
+# -----------------------------------------
+class StreamSocketTests(SimpleTestCase):
+    def run_socket(self, states):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def start_streams(camera_ids, priority):
+            return {camera_id: states[camera_id] for camera_id in camera_ids}
+
+        async def scenario():
+            socket = websocket.StreamSocket(send, "127.0.0.1")
+            await socket.handle(json.dumps({"action": "subscribe", "cameras": list(states), "priority": "grid"}))
+            return socket
+
+        hub = mock.Mock()
+        with mock.patch("multi_cam_stream.streaming.get_runtime", return_value=mock.Mock(hub=hub)) as get_runtime, \
+                mock.patch.object(websocket, "start_streams", start_streams):
+            socket = asyncio.run(scenario())
+        return socket, hub, get_runtime, [json.loads(message["text"]) for message in sent]
+
+    def test_opens_slots_only_for_admitted_cameras(self):
+        socket, hub, _, events = self.run_socket(
+            {1: "admitted", 2: "queued", 3: "rejected", 4: "not_found", 5: "remote:http://b/ws/streams/"}
+        )
+
+        self.assertEqual([call.args[0] for call in hub.open.call_args_list], [1])
+        self.assertEqual(list(socket.slots), [1])
+        self.assertEqual(events[-1]["event"], "subscribed")
+        self.assertEqual(events[-1]["cameras"]["2"], "queued")
+        self.assertEqual(events[-1]["retry_after"], admission.RETRY_AFTER)
+
+    def test_no_retry_hint_when_everything_was_admitted(self):
+        _, _, _, events = self.run_socket({1: "admitted"})
+
+        self.assertIsNone(events[-1]["retry_after"])
+
+    def test_socket_does_not_start_the_runtime_on_the_event_loop(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def scenario():
+            websocket.StreamSocket(send, "127.0.0.1")
+
+        with mock.patch("multi_cam_stream.streaming.get_runtime") as get_runtime:
+            asyncio.run(scenario())
+        get_runtime.assert_not_called()
+
+    def test_cameras_must_be_a_list(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def scenario():
+            socket = websocket.StreamSocket(send, "127.0.0.1")
+            with mock.patch.object(socket, "subscribe") as subscribe:
+                await socket.handle(json.dumps({"action": "subscribe", "cameras": "12"}))
+            subscribe.assert_not_called()
+
+        asyncio.run(scenario())
+        self.assertEqual(json.loads(sent[0]["text"])["event"], "error")
+
+    def run_quiet_client(self, pump):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            if not sent:
+                return {"type": "websocket.connect"}
+            await asyncio.Event().wait()  # The client never says anything else
+
+        with mock.patch.object(websocket, "authenticate_socket", mock.AsyncMock(return_value=mock.Mock())), \
+                mock.patch.object(websocket.StreamSocket, "pump", pump):
+            asyncio.run(asyncio.wait_for(websocket.stream_socket({"client": ("127.0.0.1", 0)}, receive, send), 2))
+        return sent
+
+    def test_failed_sender_closes_the_socket_of_a_quiet_client(self):
+        async def pump(socket):
+            raise RuntimeError("boom")
+
+        with self.assertLogs("multi_cam_stream.websocket", "ERROR"):
+            sent = self.run_quiet_client(pump)
+
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1011})
+
+    def test_sender_closed_for_stalling_ends_the_connection(self):
+        async def pump(socket):
+            await socket.send({"type": "websocket.close", "code": 1008})
+
+        sent = self.run_quiet_client(pump)
+
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": 1008})
@@ -0,0 +1,162 @@
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+TRACE_BUFFER_SIZE = 200  # Finished traces kept in memory per process
+FIRST_FRAME_TIMEOUT = 60  # Seconds to wait for a first frame before giving up on it
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list: the smallest value with `pct`% of values at or below it."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Trace:
+    """One traced operation, made of named, timed spans."""
+
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.pending_first_frames = {}  # {camera_id: wall time the process was spawned}
+        self._lock = threading.Lock()
+
+    def add(self, step, duration_ms, offset_ms=None, **attrs):
+        span = {
+            "step": step,
+            "offset_ms": round(offset_ms, 2) if offset_ms is not None else None,
+            "duration_ms": round(duration_ms, 2),
+        }
+        if attrs:
+            span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, step, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(step, (end - start) * 1000, offset_ms=(start - self._t0) * 1000, **attrs)
+
+    def expect_first_frame(self, camera_id):
+        self.pending_first_frames[camera_id] = time.time()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "started_at": self.started_at,
+                "duration_ms": self.duration_ms,
+                "attrs": self.attrs,
+                "spans": list(self.spans),
+                "pending_first_frames": sorted(self.pending_first_frames),
+            }
+
+
+class _NullTrace:
+    """Stand-in used when a code path runs outside a traced request."""
+
+    def add(self, *args, **kwargs):
+        pass
+
+    def span(self, *args, **kwargs):
+        return nullcontext()
+
+    def expect_first_frame(self, camera_id):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    """Keeps finished traces in a ring buffer, logs them and summarizes step timings."""
+
+    def __init__(self, size=TRACE_BUFFER_SIZE):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def start(self, name, **attrs):
+        return Trace(name, **attrs)
+
+    def finish(self, trace):
+        trace.duration_ms = round((time.perf_counter() - trace._t0) * 1000, 2)
+        with self._lock:
+            self._traces.append(trace)
+        logger.info(json.dumps({"event": "trace", **trace.as_dict()}, default=str))
+        return trace
+
+    def resolve_first_frames(self, first_frame_times):
+        """
+        Turns pending first-frame waits into `first_frame` spans.
+        `first_frame_times` maps camera ids to the wall time their first frame was encoded.
+        """
+        now = time.time()
+        with self._lock:
+            traces = [trace for trace in self._traces if trace.pending_first_frames]
+        for trace in traces:
+            for camera_id, spawned_at in list(trace.pending_first_frames.items()):
+                first_frame_at = first_frame_times.get(camera_id)
+                if first_frame_at is not None and first_frame_at >= spawned_at:
+                    duration_ms = (first_frame_at - spawned_at) * 1000
+                    trace.add("first_frame", duration_ms, offset_ms=(spawned_at - trace.started_at) * 1000, camera_id=camera_id)
+                    logger.info(json.dumps({
+                        "event": "trace.first_frame", "trace_id": trace.trace_id,
+                        "camera_id": camera_id, "duration_ms": round(duration_ms, 2),
+                    }))
+                elif now - spawned_at > FIRST_FRAME_TIMEOUT:
+                    trace.add("first_frame_timeout", (now - spawned_at) * 1000, camera_id=camera_id)
+                else:
+                    continue
+                trace.pending_first_frames.pop(camera_id, None)
+
+    def recent(self, limit=50):
+        """The newest `limit` traces, newest first."""
+        if limit <= 0:
+            return []
+        with self._lock:
+            traces = list(self._traces)[-limit:]
+        return [trace.as_dict() for trace in reversed(traces)]
+
+    def summary(self):
+        """p50/p95/max per step (and for the whole trace) over the buffered traces."""
+        durations = {}
+        with self._lock:
+            traces = list(self._traces)
+        for trace in traces:
+            if trace.duration_ms is not None:
+                durations.setdefault("total", []).append(trace.duration_ms)
+            for span in list(trace.spans):
+                durations.setdefault(span["step"], []).append(span["duration_ms"])
+
+        summary = {}
+        for step, values in durations.items():
+            values.sort()
+            summary[step] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "max_ms": values[-1],
+            }
+        return summary
@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import SeracsViewSet, SectionViewSet, CameraViewSet, MultiCameraStreamViewSet
+from .views import SeracsViewSet, SectionViewSet, CameraViewSet, MultiCameraStreamViewSet, MotionEventViewSet
 from . import views
 
 router = DefaultRouter()
@@ -8,8 +8,13 @@ router.register(r'seracs', SeracsViewSet, basename='serac')
 router.register(r'sections', SectionViewSet, basename='section')
 router.register(r'cameras', CameraViewSet, basename='camera')
 router.register(r'multi_stream', MultiCameraStreamViewSet, basename='multi-stream')
+router.register(r'motion_events', MotionEventViewSet, basename='motion-event')
 
 
 urlpatterns = router.urls + [
     path('video_feed/<int:camera_id>/', views.video_feed, name='video_feed'),
+    path('hls/<int:camera_id>/<str:filename>', views.hls_file, name='hls_file'),
+    path('previews/<int:camera_id>.jpg', views.camera_preview, name='camera_preview'),
+    path('replay/<int:camera_id>/', views.replay_feed, name='replay_feed'),
+    path('replay/<int:camera_id>/clip/', views.replay_clip, name='replay_clip'),
 ]
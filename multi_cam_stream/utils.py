@@ -5,3 +5,22 @@
 # def store_frame(camera_id, frame_data):
 #     """Stores the latest frame for a given camera in Redis."""
 #     redis_client.set(f"camera_frame:{camera_id}", frame_data)
+
+
+class ChunkSink:
+    """Unseekable file-like object; zipfile writes into it and streaming responses drain it between entries."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
@@ -1,40 +1,99 @@
-import os
-import cv2
+import requests
 import time
-import signal
 import logging
 import asyncio
-import numpy as np
-import subprocess
-import multiprocessing as mp
-from django.http import StreamingHttpResponse, JsonResponse
+from django.conf import settings
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponseRedirect, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from .models import Seracs, Section, Camera
+from HUL_CCTV_PROJ.api_schema import swagger_auto_schema, openapi
+from .models import Seracs, Section, Camera, MotionEvent
 from .serializers import SeracSerializer, SectionSerializer, CameraSerializer
-from concurrent.futures import ThreadPoolExecutor
-from multiprocessing import Lock
+from .importers import bulk_import, detect_format, ImportFormatError, IMPORT_FORMATS
+from .exporters import stream_camera_export, EXPORT_FORMATS, EXPORT_CONTENT_TYPES
+from .subscriptions import get_stream_session_id
+from .cluster import FORWARDED_HEADER, FORWARDED_PARAM
+from .admission import PRIORITIES, RETRY_AFTER, parse_priority
+from .hls import serve_hls_file, PLAYLIST_NAME
+from .previews import preview_path, read_preview_meta
+from .roi import parse_roi
+from .replay import CLIP_FORMATS, CLIP_CONTENT_TYPES, generate_replay, stream_clip, parse_replay_seconds, parse_replay_speed
+from .motion import search_motion_events, thumbnail_path as motion_thumbnail_path
+from .signing import sign_stream_url
+from .tracing import TRACE_BUFFER_SIZE
+from .streaming import get_runtime, peek_runtime, get_stream_cluster, start_camera_process, start_hls_remux, generate_frames, stop_camera_streams
 
 logger = logging.getLogger(__name__)
 
 # -----------------------------------------
 # Constants
 # -----------------------------------------
-FRAME_TIMEOUT = 60  # Camera timeout in seconds
 PING_TIMEOUT = 1  # 1-second timeout for ping
-MAX_CONCURRENT_STREAMS = 30
+PROXY_CONNECT_TIMEOUT = 3  # Seconds to reach the owner node when proxying a feed
+PROXY_READ_TIMEOUT = 30  # Seconds without data from the owner node before giving up
+MOTION_SEARCH_LIMIT = 500  # Events per motion search unless ?limit= asks for another number
+MOTION_SEARCH_MAX_LIMIT = 5000
 
 # -----------------------------------------
-# Global Shared State (Using Manager)
+# Bulk Import Helpers
 # -----------------------------------------
-manager = mp.Manager()
-frame_buffers = manager.dict()  # {camera_id: Manager().list()}
-active_streams = manager.dict()  # {camera_id: process_pid}
-current_section = manager.Value("i", -1)  # Track active section ID
-section_lock = Lock()
+bulk_import_parameters = [
+    openapi.Parameter(
+        name="file",
+        in_=openapi.IN_FORM,
+        type=openapi.TYPE_FILE,
+        description="CSV (with header row) or JSON Lines file, one object per row",
+        required=True
+    ),
+    openapi.Parameter(
+        name="file_format",
+        in_=openapi.IN_FORM,
+        type=openapi.TYPE_STRING,
+        enum=list(IMPORT_FORMATS),
+        description="File format. Guessed from the file name if omitted.",
+        required=False
+    ),
+]
+
+export_format_parameter = openapi.Parameter(
+    name="file_format",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(EXPORT_FORMATS),
+    description="Export format (default: csv)",
+    required=False
+)
+
+
+def handle_bulk_import(request, resource):
+    """Runs a bulk import for an uploaded file and returns the per-row report."""
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response(
+            {"message": "file is required", "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    fmt = request.data.get("file_format") or detect_format(upload.name)
+    try:
+        report = bulk_import(resource, upload.file, fmt)
+    except ImportFormatError as e:
+        return Response(
+            {"message": str(e), "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    finally:
+        upload.close()
+
+    return Response({"message": "Import finished", "results": report.as_dict(), "status": status.HTTP_200_OK})
+
 
 class SeracsViewSet(viewsets.ViewSet):
     """
@@ -307,6 +366,41 @@ class SectionViewSet(viewsets.ViewSet):
             return Response({"message": "Section created", "status": status.HTTP_201_CREATED})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        operation_summary="Bulk import sections from CSV or JSON Lines",
+        operation_description=(
+            "Streams the uploaded file, validates each row with the SectionSerializer and upserts valid rows "
+            "in batches. Rows with an `id` update that section; other rows are matched on (name, serac). "
+            "Invalid rows are skipped and reported with their row number."
+        ),
+        manual_parameters=bulk_import_parameters,
+        responses={
+            200: openapi.Response(
+                description="Per-row import report",
+                examples={
+                    "application/json": {
+                        "message": "Import finished",
+                        "results": {
+                            "total": 3,
+                            "created": 1,
+                            "updated": 1,
+                            "failed": 1,
+                            "errors": [
+                                {"row": 3, "errors": {"name": ["This field is required."]}}
+                            ],
+                            "errors_truncated": False
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            ),
+            400: openapi.Response(description="Missing file or unsupported format")
+        }
+    )
+    @action(detail=False, methods=["post"], url_path="bulk_import", parser_classes=[MultiPartParser, FormParser])
+    def bulk_import(self, request):
+        return handle_bulk_import(request, "sections")
+
 
 class CameraViewSet(viewsets.ViewSet):
     """
@@ -447,6 +541,180 @@ class CameraViewSet(viewsets.ViewSet):
             return Response({"message": "Camera created", "status": status.HTTP_201_CREATED})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        operation_summary="Bulk import cameras from CSV or JSON Lines",
+        operation_description=(
+            "Streams the uploaded file, validates each row with the CameraSerializer and upserts valid rows "
+            "in batches. Rows with an `id` update that camera; other rows are matched on (ip_address, port). "
+            "Invalid rows are skipped and reported with their row number."
+        ),
+        manual_parameters=bulk_import_parameters,
+        responses={
+            200: openapi.Response(
+                description="Per-row import report",
+                examples={
+                    "application/json": {
+                        "message": "Import finished",
+                        "results": {
+                            "total": 3,
+                            "created": 1,
+                            "updated": 1,
+                            "failed": 1,
+                            "errors": [
+                                {"row": 3, "errors": {"name": ["This field is required."]}}
+                            ],
+                            "errors_truncated": False
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            ),
+            400: openapi.Response(description="Missing file or unsupported format")
+        }
+    )
+    @action(detail=False, methods=["post"], url_path="bulk_import", parser_classes=[MultiPartParser, FormParser])
+    def bulk_import(self, request):
+        return handle_bulk_import(request, "cameras")
+
+    @swagger_auto_schema(
+        operation_summary="Export all cameras as CSV or XLSX",
+        operation_description=(
+            "Streams every camera joined to its section and Serac. Rows are read from the database in chunks "
+            "and written incrementally, so memory use does not grow with the number of cameras. "
+            "Passwords are never included."
+        ),
+        manual_parameters=[export_format_parameter],
+        responses={
+            200: openapi.Response(description="CSV or XLSX file download"),
+            400: openapi.Response(
+                description="Unsupported export format",
+                examples={
+                    "application/json": {
+                        "message": "file_format must be one of: csv, xlsx"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        fmt = request.query_params.get("file_format", "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {"message": f"file_format must be one of: {', '.join(EXPORT_FORMATS)}", "status": status.HTTP_400_BAD_REQUEST},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(stream_camera_export(fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+        response["Content-Disposition"] = f'attachment; filename="cameras.{fmt}"'
+        return response
+
+    @swagger_auto_schema(
+        operation_summary="List preview thumbnails",
+        operation_description=(
+            "Returns the thumbnail URL and capture time for each camera (optionally only one section's). "
+            "Thumbnails are grabbed in the background every few minutes for every active camera, so an "
+            "overview page can show the whole site without opening any stream."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                name="section_id",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Only cameras of this section",
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Preview metadata per camera",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "1": {"url": "/api/previews/1.jpg", "captured_at": 1760000000.0,
+                                  "attempted_at": 1760000000.0, "error": None},
+                            "2": {"url": None, "captured_at": None, "attempted_at": 1760000010.0,
+                                  "error": "timed out after 15s"}
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="previews")
+    def previews(self, request):
+        cameras = Camera.objects.all()
+        section_id = request.query_params.get("section_id")
+        if section_id:
+            cameras = cameras.filter(section_id=section_id)
+
+        results = {}
+        for camera_id in cameras.values_list("id", flat=True):
+            meta = read_preview_meta(camera_id) or {}
+            results[camera_id] = {
+                "url": sign_stream_url(f"/api/previews/{camera_id}.jpg", camera_id) if meta.get("captured_at") else None,
+                "captured_at": meta.get("captured_at"),
+                "attempted_at": meta.get("attempted_at"),
+                "error": meta.get("error"),
+            }
+        return Response({"results": results, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Get the HLS playlist URL for a camera",
+        operation_description=(
+            "Starts (or keeps alive) an HLS remux of the camera's H.264 stream and returns its playlist URL. "
+            "The video is copied without decoding or re-encoding, so it plays at full resolution for a "
+            "fraction of the CPU and bandwidth of the MJPEG feed. The remux stops once no player has "
+            "fetched the playlist for a minute. `ready` is false until the first segments are written. "
+            "Remuxes are admitted against the node's stream budget like MJPEG streams; `?priority=full` "
+            "lets a full-view player preempt grid streams."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Playlist URL",
+                examples={
+                    "application/json": {
+                        "results": {"camera_id": 1, "playlist": "/api/hls/1/index.m3u8?exp=1760003600&sig=9f2c...",
+                                    "ready": False},
+                        "status": "200 OK"
+                    }
+                }
+            ),
+            404: openapi.Response(description="Camera not found"),
+            503: openapi.Response(description="Node at capacity; retry after Retry-After seconds"),
+        }
+    )
+    @action(detail=True, methods=["get"], url_path="hls")
+    def hls(self, request, pk=None):
+        camera = get_object_or_404(Camera, pk=pk)
+        priority = parse_priority(request.GET.get("priority"))
+        # The priority is signed into the playlist URL, so the player cannot raise it.
+        playlist = f"/api/hls/{camera.id}/{PLAYLIST_NAME}"
+        if request.GET.get("priority"):
+            playlist = f"{playlist}?priority={priority}"
+        playlist = sign_stream_url(playlist, camera.id)
+        cluster = get_stream_cluster()
+        if cluster and not cluster.is_local(camera.id):
+            # The owner node starts the remux when the player first fetches the playlist.
+            return Response({
+                "results": {"camera_id": camera.id, "playlist": cluster.stream_url(camera.id, playlist), "ready": False},
+                "status": status.HTTP_200_OK,
+            })
+
+        decision = start_hls_remux(camera.id, camera.get_rtsp_url(), priority=priority)
+        if not decision.admitted:
+            return Response(
+                {"message": f"HLS stream {decision.state}: {decision.reason}", "admission": decision.as_dict(),
+                 "status": status.HTTP_503_SERVICE_UNAVAILABLE},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+        return Response({
+            "results": {"camera_id": camera.id, "playlist": playlist, "ready": get_runtime().remuxer.is_ready(camera.id)},
+            "status": status.HTTP_200_OK,
+        })
+
 
 # ==============================
 #  Camera Health Check Functions
@@ -483,130 +751,212 @@ async def check_section_cameras(section_id):
     return active_cameras, inactive_cameras
 
 # -----------------------------------------
-# FUNCTION: Start Camera Stream
+# DJANGO VIEW: Serve Video Feed
 # -----------------------------------------
-def start_camera_process(camera_id, camera_url):
-    """Starts a new camera stream process if not already running."""
-    if camera_id in active_streams:
-        return  # Process already running
-    
+def video_feed(request, camera_id):
+    """
+    Django view for optimized video streaming. `?roi=x,y,w,h` (fractions of the frame) or
+    `?zoom=<factor>&center=cx,cy` streams a region, cut from the running stream's frames.
+    On a signed URL these, `fps` and `priority` only count if they were signed with it;
+    clients that choose them freely authenticate with a bearer token instead.
+    """
+    cluster = get_stream_cluster()
+    forwarded = request.META.get(FORWARDED_HEADER) or request.GET.get(FORWARDED_PARAM)
+    if cluster and not forwarded and not cluster.is_local(camera_id):
+        return forward_video_feed(request, cluster, camera_id)
     try:
-        process = mp.Process(target=stream_camera_ffmpeg, args=(camera_id, camera_url, frame_buffers))
-        process.daemon = False
-        process.start()
-        active_streams[camera_id] = process.pid
-        logger.info(f"Started streaming process {process.pid} for camera {camera_id}")
-    except Exception as e:
-        logger.error(f"Failed to start camera {camera_id}: {e}")
+        roi = parse_roi(request.GET.get("roi"), request.GET.get("zoom"), request.GET.get("center"))
+    except ValueError as e:
+        return JsonResponse(
+            {"message": f"Invalid roi/zoom: {e}", "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # A running stream needs no camera lookup; the URL is only needed to start one.
+    camera_url = None
+    if camera_id not in get_runtime().active_streams:
+        camera_url = get_object_or_404(Camera, id=camera_id).get_rtsp_url()
+    # `?priority=full` for a single camera opened in full view; grid thumbnails use the default.
+    decision = start_camera_process(camera_id, camera_url, priority=parse_priority(request.GET.get("priority")))
+    if not decision.admitted:
+        response = JsonResponse(
+            {"message": f"Stream {decision.state}: {decision.reason}", "admission": decision.as_dict(),
+             "status": status.HTTP_503_SERVICE_UNAVAILABLE},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response["Retry-After"] = str(RETRY_AFTER)
+        return response
+    try:
+        fps = float(request.GET["fps"]) if request.GET.get("fps") else None
+    except ValueError:
+        fps = None
+    if fps is not None and fps <= 0:
+        fps = None
+    return StreamingHttpResponse(
+        generate_frames(camera_id, fps=fps, client=request.META.get("REMOTE_ADDR", ""), roi=roi),
+        content_type='multipart/x-mixed-replace; boundary=frame'
+    )
+
+# -----------------------------------------
+# DJANGO VIEW: Serve HLS Playlist and Segments
+# -----------------------------------------
+def hls_file(request, camera_id, filename):
+    """Serves a camera's HLS playlist or segments; fetching the playlist starts or keeps the remux alive."""
+    cluster = get_stream_cluster()
+    forwarded = request.META.get(FORWARDED_HEADER) or request.GET.get(FORWARDED_PARAM)
+    if cluster and not forwarded and not cluster.is_local(camera_id):
+        return forward_video_feed(request, cluster, camera_id)
+
+    if filename == PLAYLIST_NAME and not get_runtime().remuxer.keep_alive(camera_id):
+        camera = get_object_or_404(Camera, id=camera_id)
+        decision = start_hls_remux(camera.id, camera.get_rtsp_url(), priority=parse_priority(request.GET.get("priority")))
+        if not decision.admitted:
+            response = JsonResponse(
+                {"message": f"HLS stream {decision.state}: {decision.reason}", "admission": decision.as_dict(),
+                 "status": status.HTTP_503_SERVICE_UNAVAILABLE},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response["Retry-After"] = str(RETRY_AFTER)
+            return response
+    return serve_hls_file(request, camera_id, filename)
 
 # -----------------------------------------
-# FUNCTION: Stream Camera using FFmpeg
+# DJANGO VIEW: Serve Preview Thumbnail
 # -----------------------------------------
-def stream_camera_ffmpeg(camera_id, camera_url, frame_buffers):
-    """Handles streaming a camera using FFmpeg."""
-    logger.info(f"Starting stream for camera {camera_id} at {camera_url}")
+def preview_etag(request, camera_id):
+    meta = read_preview_meta(camera_id)
+    return f"{camera_id}-{meta['captured_at']}" if meta and meta.get("captured_at") else None
 
-    if camera_id not in frame_buffers:
-        frame_buffers[camera_id] = manager.list()
-    
+
+@condition(etag_func=preview_etag)
+def camera_preview(request, camera_id):
+    """Serves the latest background thumbnail; unchanged thumbnails are answered with 304."""
+    meta = read_preview_meta(camera_id)
+    # Meta that only records failed attempts has no file behind it; answer that with the JSON 404 below.
+    if settings.STREAM_ACCEL_REDIRECT_PREFIX and meta and meta.get("captured_at"):
+        response = HttpResponse(content_type="image/jpeg")
+        response["X-Accel-Redirect"] = f"{settings.STREAM_ACCEL_REDIRECT_PREFIX}previews/{camera_id}.jpg"
+        response["Cache-Control"] = "public, max-age=60"
+        return response
     try:
-        ffmpeg_cmd = [
-            "ffmpeg", "-rtsp_transport", "tcp", "-i", camera_url,
-            "-an", "-vf", "fps=5,scale=640:480", "-f", "image2pipe",
-            "-pix_fmt", "bgr24", "-vcodec", "rawvideo", "-"
-        ]
-        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10**8)
-        active_streams[camera_id] = process.pid
-        frame_size = 640 * 480 * 3
-        last_frame_time = time.time()
-
-        while True:
-            raw_frame = process.stdout.read(frame_size)
-            if len(raw_frame) != frame_size:
-                if time.time() - last_frame_time > FRAME_TIMEOUT:
-                    logger.warning(f"Camera {camera_id} unresponsive. Stopping...")
-                    cleanup_camera_stream(camera_id)
-                    break  # Ensure the loop exits
-                continue
-
-            frame = np.frombuffer(raw_frame, dtype=np.uint8).reshape((480, 640, 3))
-            _, jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-
-            if len(frame_buffers[camera_id]) >= 60:
-                frame_buffers[camera_id].pop(0)
-            
-            frame_buffers[camera_id].append(jpeg.tobytes())
-            last_frame_time = time.time()
-
-    except Exception as e:
-        logger.error(f"Error in stream for camera {camera_id}: {e}")
-    finally:
-        cleanup_camera_stream(camera_id)
-        return 
+        with open(preview_path(camera_id), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return JsonResponse(
+            {"message": "No preview yet", "status": status.HTTP_404_NOT_FOUND},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    response = HttpResponse(data, content_type="image/jpeg")
+    response["Cache-Control"] = "public, max-age=60"
+    return response
 
 # -----------------------------------------
-# FUNCTION: Cleanup Camera Process
+# DJANGO VIEW: Instant Replay and Clips
 # -----------------------------------------
-def cleanup_camera_stream(camera_id):
-    """Stops the camera process and removes buffers safely."""
-    if camera_id in active_streams:
-        pid = active_streams.pop(camera_id, None)  # Retrieve PID instead of Process object
+def replay_history(request, camera_id):
+    """The camera's last `?seconds=` of frames, up to its newest, or a JsonResponse explaining why there are none."""
+    try:
+        seconds = parse_replay_seconds(request.GET.get("seconds"), settings.STREAM_REPLAY_SECONDS)
+    except ValueError as e:
+        return JsonResponse(
+            {"message": f"Invalid seconds: {e}", "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    runtime = peek_runtime()
+    frames = runtime.replay.history(camera_id, seconds) if runtime else []
+    if not frames:
+        return JsonResponse(
+            {"message": "No stored frames for this camera", "status": status.HTTP_404_NOT_FOUND},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return frames
 
-        if pid:
-            try:
-                os.kill(pid, signal.SIGTERM)  # Attempt graceful termination
-                logger.info(f"Sent SIGTERM to process {pid} for camera {camera_id}")
 
-                # Optional: Check if process is still running before force killing
-                os.waitpid(pid, os.WNOHANG)  # Non-blocking wait
-                logger.info(f"Process {pid} for camera {camera_id} terminated successfully.")
+def replay_feed(request, camera_id):
+    """
+    Replays the last `?seconds=` of a camera (default 10, at most STREAM_REPLAY_SECONDS) as
+    MJPEG, paced as captured or `?speed=` times faster, and ends after the newest frame.
+    """
+    cluster = get_stream_cluster()
+    forwarded = request.META.get(FORWARDED_HEADER) or request.GET.get(FORWARDED_PARAM)
+    if cluster and not forwarded and not cluster.is_local(camera_id):
+        return forward_video_feed(request, cluster, camera_id)
+    try:
+        speed = parse_replay_speed(request.GET.get("speed"))
+    except ValueError as e:
+        return JsonResponse(
+            {"message": f"Invalid speed: {e}", "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    frames = replay_history(request, camera_id)
+    if isinstance(frames, JsonResponse):
+        return frames
+    return StreamingHttpResponse(
+        generate_replay(peek_runtime().replay, frames, speed),
+        content_type='multipart/x-mixed-replace; boundary=frame'
+    )
 
-            except OSError as e:
-                if "No such process" in str(e):
-                    logger.warning(f"Process {pid} for camera {camera_id} already stopped.")
-                else:
-                    logger.error(f"Error while terminating process {pid} for camera {camera_id}: {e}")
 
-    frame_buffers.pop(camera_id, None)
-    logger.info(f"Camera {camera_id} process cleaned up.")
+def replay_clip(request, camera_id):
+    """Downloads the last `?seconds=` of a camera as one file: `?file_format=mjpeg` (default) or `zip` of JPEGs."""
+    cluster = get_stream_cluster()
+    forwarded = request.META.get(FORWARDED_HEADER) or request.GET.get(FORWARDED_PARAM)
+    if cluster and not forwarded and not cluster.is_local(camera_id):
+        return forward_video_feed(request, cluster, camera_id)
+    fmt = request.GET.get("file_format", "mjpeg").lower()
+    if fmt not in CLIP_FORMATS:
+        return JsonResponse(
+            {"message": f"file_format must be one of: {', '.join(CLIP_FORMATS)}", "status": status.HTTP_400_BAD_REQUEST},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    frames = replay_history(request, camera_id)
+    if isinstance(frames, JsonResponse):
+        return frames
+    response = StreamingHttpResponse(
+        stream_clip(peek_runtime().replay, frames, fmt, camera_id), content_type=CLIP_CONTENT_TYPES[fmt]
+    )
+    started = time.strftime("%Y%m%d-%H%M%S", time.localtime(frames[0][2]))
+    response["Content-Disposition"] = f'attachment; filename="camera{camera_id}-{started}.{fmt}"'
+    return response
 
 # -----------------------------------------
-# DJANGO VIEW: Serve Video Feed
+# FUNCTION: Forward Feed to Owner Node
 # -----------------------------------------
-def video_feed(request, camera_id):
-    """Django view for optimized video streaming."""
-    camera = get_object_or_404(Camera, id=camera_id)
-    if camera_id not in active_streams:
-        start_camera_process(camera.id, camera.get_rtsp_url())
-    return StreamingHttpResponse(generate_frames(camera_id), content_type='multipart/x-mixed-replace; boundary=frame')
+def forward_video_feed(request, cluster, camera_id):
+    """Sends a viewer to the node that owns the camera, by redirect or by proxying the stream."""
+    owner_url = cluster.stream_url(camera_id, request.path)
+    if settings.CLUSTER_FEED_MODE != "proxy":
+        query = request.GET.copy()
+        query[FORWARDED_PARAM] = "1"
+        return HttpResponseRedirect(f"{owner_url}?{query.urlencode()}")
 
-# -----------------------------------------
-# FUNCTION: Generate Video Feed Frames
-# -----------------------------------------
-def generate_frames(camera_id):
-    """Yields latest frames for HTTP streaming."""
-    while True:
-        if camera_id in frame_buffers and frame_buffers[camera_id]:
-            try:
-                frame = frame_buffers[camera_id][-1]
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n'
-                       b'Content-Length: ' + f"{len(frame)}".encode() + b'\r\n'
-                       b'\r\n' + frame + b'\r\n')
-            except IndexError:
-                yield get_blank_frame()
-            except KeyError:
-                logger.error(f"Frame buffer missing for camera {camera_id}. Retrying...")
-        else:
-            time.sleep(0.5)
+    try:
+        upstream = requests.get(
+            owner_url,
+            params=request.GET,
+            headers={"X-Cluster-Forwarded": "1"},
+            stream=True,
+            timeout=(PROXY_CONNECT_TIMEOUT, PROXY_READ_TIMEOUT),
+        )
+    except requests.RequestException as e:
+        logger.error(f"Cannot reach owner node for camera {camera_id} at {owner_url}: {e}")
+        return JsonResponse(
+            {"message": "Owner node unavailable", "status": status.HTTP_502_BAD_GATEWAY},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
 
-# -----------------------------------------
-# FUNCTION: Blank Frame
-# -----------------------------------------
-def get_blank_frame():
-    blank_image = np.zeros((480, 640, 3), dtype=np.uint8)
-    _, jpeg = cv2.imencode(".jpg", blank_image, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-    return jpeg.tobytes()
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=64 * 1024):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return StreamingHttpResponse(
+        relay(),
+        status=upstream.status_code,
+        content_type=upstream.headers.get("Content-Type", "multipart/x-mixed-replace; boundary=frame"),
+    )
 
 # -----------------------------------------
 # API VIEW: Multi-Camera Streaming
@@ -617,15 +967,35 @@ class MultiCameraStreamViewSet(viewsets.ViewSet):
     """
     @swagger_auto_schema(
         operation_summary="Retrieve Active Camera Streams for a Section",
-        operation_description="Fetches and returns active camera streams for the specified section.",
+        operation_description=(
+            "Subscribes the calling client session to the section's cameras and returns their stream URLs, "
+            "signed so they can be opened without a session for STREAM_URL_TTL seconds. "
+            "Send the returned `session_id` back in the `X-Stream-Session` header (or `session_id` query "
+            "parameter) on later calls, so switching sections only stops cameras this client dropped "
+            "that no other client is watching."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                name="X-Stream-Session",
+                in_=openapi.IN_HEADER,
+                type=openapi.TYPE_STRING,
+                description="Stream session id from a previous call. A new session is created if omitted.",
+                required=False
+            )
+        ],
         responses={
             200: openapi.Response(
                 description="Returns a list of active camera streams.",
                 examples={
                     "application/json": {
+                        "session_id": "4f1c2b9e0d7a4c6f8e3b5a1d2c3e4f50",
                         "streams": {
-                            "1": "/api/video_feed/1/",
-                            "2": "/api/video_feed/2/"
+                            "1": "/api/video_feed/1/?exp=1760003600&sig=4be1...",
+                            "2": "/api/video_feed/2/?exp=1760003600&sig=a07d..."
+                        },
+                        "admission": {
+                            "1": "admitted",
+                            "2": "queued"
                         }
                     }
                 }
@@ -637,40 +1007,572 @@ class MultiCameraStreamViewSet(viewsets.ViewSet):
     )
 
     def retrieve(self, request, pk=None):
-        """Switches the active section and manages camera streams accordingly."""
-        section = get_object_or_404(Section, id=pk)
-        cameras = Camera.objects.filter(section=section, is_active=True)
-        active_stream_urls = {}
-
-        with section_lock:
-            if current_section.value != pk:
-                logger.info(f"Switching from section {current_section.value} to section {pk}. Stopping outdated cameras.")
-
-                # Get all cameras in the new section
-                new_section_cameras = set(cameras.values_list("id", flat=True))
-                current_active_cameras = set(active_streams.keys())
+        """Subscribes the calling session to a section and starts/stops streams by diff."""
+        session_id = get_stream_session_id(request)
+        runtime = get_runtime()
+        trace = runtime.tracer.start("section_switch", section_id=pk, session_id=session_id)
+        cameras_to_stop = set()
+        admission = {}
+        try:
+            with trace.span("db_query"):
+                section = get_object_or_404(Section, id=pk)
+                cameras = list(Camera.objects.filter(section=section, is_active=True))
+            active_stream_urls = {}
 
-                # Determine which cameras should be stopped (those not in the new section)
-                cameras_to_stop = current_active_cameras - new_section_cameras
+            # In a cluster, other nodes ingest their own cameras; this node only hands out their URLs.
+            cluster = get_stream_cluster()
+            if cluster:
+                for camera in cameras:
+                    if not cluster.is_local(camera.id):
+                        active_stream_urls[camera.id] = sign_stream_url(
+                            cluster.stream_url(camera.id, f"/api/video_feed/{camera.id}/"), camera.id
+                        )
+                cameras = [camera for camera in cameras if camera.id not in active_stream_urls]
 
-                # Stop only the cameras that are no longer needed
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    executor.map(cleanup_camera_stream, cameras_to_stop)
+            runtime.ensure_session_reaper()
 
-                # Update current active section
-                current_section.value = pk
+            # Only cameras that this session dropped and no other session or viewer still needs are stopped.
+            with trace.span("subscribe"):
+                cameras_to_stop = runtime.subscriptions.subscribe(session_id, {camera.id for camera in cameras})
+            stop_camera_streams(cameras_to_stop, trace)
 
-        # Start new section cameras
-        for camera in cameras:
-            if camera.id not in active_streams:
-                start_camera_process(camera.id, camera.get_rtsp_url())
+            # Start new section cameras
+            with trace.span("lock_wait", lock="section_lock", phase="start"):
+                runtime.section_lock.acquire()
+            try:
+                for camera in cameras:
+                    decision = start_camera_process(camera.id, camera.get_rtsp_url(), trace)
+                    admission[camera.id] = decision.state
 
-            active_stream_urls[camera.id] = f"/api/video_feed/{camera.id}/"
+                    active_stream_urls[camera.id] = sign_stream_url(f"/api/video_feed/{camera.id}/", camera.id)
+            finally:
+                runtime.section_lock.release()
+        finally:
+            trace.attrs["stopped"] = len(cameras_to_stop)
+            runtime.tracer.finish(trace)
 
         return JsonResponse(
-            {"message": "Camera feeds updated", "streams": active_stream_urls},
+            {"message": "Camera feeds updated", "session_id": session_id, "streams": active_stream_urls, "admission": admission},
             status=status.HTTP_200_OK,
         )
 
+    @swagger_auto_schema(
+        operation_summary="Keep a stream session alive",
+        operation_description=(
+            "Refreshes the session sent in the `X-Stream-Session` header or `session_id` query parameter. "
+            "Sessions that miss heartbeats for longer than the timeout expire, and their cameras are stopped "
+            "unless another session or viewer still needs them."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Session refreshed",
+                examples={"application/json": {"message": "Session alive", "session_id": "4f1c...", "status": 200}}
+            ),
+            404: openapi.Response(description="Session unknown or expired; call multi_stream/<section> again."),
+        }
+    )
+    @action(detail=False, methods=["post"], url_path="heartbeat")
+    def heartbeat(self, request):
+        session_id = get_stream_session_id(request)
+        runtime = peek_runtime()
+        if runtime is None or not runtime.subscriptions.heartbeat(session_id):
+            return Response(
+                {"message": "Session expired", "session_id": session_id, "status": status.HTTP_404_NOT_FOUND},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({"message": "Session alive", "session_id": session_id, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="End a stream session",
+        operation_description="Drops the session's subscriptions and stops cameras nobody else is watching.",
+        responses={200: openapi.Response(description="Session ended")}
+    )
+    @action(detail=False, methods=["post"], url_path="leave")
+    def leave(self, request):
+        session_id = get_stream_session_id(request)
+        runtime = peek_runtime()
+        if runtime is not None:
+            stop_camera_streams(runtime.subscriptions.unsubscribe(session_id))
+        return Response({"message": "Session ended", "session_id": session_id, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="List stream sessions",
+        operation_description="Shows live sessions, their cameras, open viewers and the resulting set of wanted streams.",
+        responses={200: openapi.Response(description="Current subscription state")}
+    )
+    @action(detail=False, methods=["get"], url_path="sessions")
+    def sessions(self, request):
+        runtime = peek_runtime()
+        snapshot = runtime.subscriptions.snapshot() if runtime else {"sessions": {}, "viewers": {}, "wanted": []}
+        return Response({"results": snapshot, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Cluster placement",
+        operation_description=(
+            "Shows this node's id, the live ingest nodes and which node owns each active camera. "
+            "Returns `enabled: false` when the server runs as a single node."
+        ),
+        responses={200: openapi.Response(description="Cluster membership and camera placement")}
+    )
+    @action(detail=False, methods=["get"], url_path="cluster")
+    def cluster(self, request):
+        cluster = get_stream_cluster()
+        if cluster is None:
+            return Response({"results": {"enabled": False}, "status": status.HTTP_200_OK})
+        camera_ids = Camera.objects.filter(is_active=True).values_list("id", flat=True)
+        return Response({"results": {"enabled": True, **cluster.snapshot(camera_ids)}, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Stream admission state",
+        operation_description=(
+            "Shows this node's stream budget (max streams, CPU cores, memory), what running streams use as "
+            "measured from /proc, the priority each stream runs at and the queue of streams waiting for room. "
+            f"Priorities: {', '.join(f'{name}={value}' for name, value in PRIORITIES.items())}; "
+            "higher priorities preempt lower ones when the node is full."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Admission budget, usage, running streams and queue",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "budget": {"max_streams": 30, "cpu_cores": 6.4, "memory_mb": 11200.0},
+                            "used": {"streams": 2, "cpu_cores": 0.34, "memory_mb": 139.4},
+                            "estimated_stream_cost": {"cpu_cores": 0.305, "memory_mb": 120.2},
+                            "streams": [
+                                {"camera_id": 1, "kind": "ingest", "priority": 20, "cpu_cores": 0.32, "memory_mb": 121.0,
+                                 "measured": True, "running_seconds": 84.2},
+                                {"camera_id": 3, "kind": "hls", "priority": 10, "cpu_cores": 0.02, "memory_mb": 18.4,
+                                 "measured": True, "running_seconds": 40.0}
+                            ],
+                            "queue": [{"camera_id": 7, "kind": "ingest", "priority": 10, "waiting_seconds": 3.1}],
+                            "preemptions": 1,
+                            "rejections": 0
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="admission")
+    def admission(self, request):
+        runtime = peek_runtime()
+        if runtime is None:
+            return Response({"results": {"streams": [], "queue": []}, "status": status.HTTP_200_OK})
+        return Response({"results": runtime.admission.snapshot(), "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Per-viewer delivery metrics",
+        operation_description=(
+            "Lists every open video_feed viewer in this process with its target fps, the fps actually delivered "
+            "over the last few seconds, frames delivered and frames dropped because the client was still "
+            "receiving an earlier one. A viewer is disconnected once a single frame write stalls past the deadline, "
+            "or when its camera has sent no frame for a while."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Open viewers",
+                examples={
+                    "application/json": {
+                        "results": [
+                            {"viewer_id": "9b0c4e1f2a3d", "camera_id": 1, "roi": None, "client": "10.2.0.14", "target_fps": 5,
+                             "delivered_fps": 2.4, "delivered": 412, "dropped": 377, "stalled": False,
+                             "seconds_since_delivery": 0.31, "connected_seconds": 170.2}
+                        ],
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="viewers")
+    def viewers(self, request):
+        runtime = peek_runtime()
+        return Response({"results": runtime.hub.snapshot() if runtime else [], "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Ingest pipeline metrics",
+        operation_description=(
+            "Per-camera counters from the ingest workers: frames read from ffmpeg and JPEG-encoded, raw frames "
+            "dropped because a newer one arrived before the encoder was free, the share of time the reader "
+            "waits on ffmpeg and the encoder is busy, and how the preallocated frame buffers are occupied. "
+            "`reconnects` counts ffmpeg respawns after a dropped camera; `stale` is true while viewers are "
+            "shown the last good frame. `rois` lists the regions cut from each frame for `video_feed?roi=` viewers. "
+            "`profile` is the stream profile the worker runs with; `frames_skipped` counts frames read but not "
+            "encoded while a degraded profile runs below the capture fps."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Ingest counters per camera",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "1": {"frames_read": 600, "frames_encoded": 598, "frames_dropped": 2, "reads_per_frame": 15.1,
+                                  "read_fps": 5.0, "encode_fps": 4.98, "reader_wait": 0.91, "encoder_busy": 0.04,
+                                  "publish_busy": 0.01, "avg_encode_ms": 7.9,
+                                  "buffers": {"free": 1, "reading": 1, "ready": 0, "encoding": 1},
+                                  "recent_encode_ms": 8.3, "frames_skipped": 0,
+                                  "profile": {"capture_fps": 5, "width": 640, "height": 480, "fps": 5, "quality": 80, "level": 0},
+                                  "reconnects": 1, "last_exit_code": 1, "stale": False, "stale_seconds": None,
+                                  "rois": ["25,40,30,30"], "roi_frames_encoded": 290, "avg_roi_encode_ms": 1.2}
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="ingest")
+    def ingest(self, request):
+        runtime = peek_runtime()
+        return Response({"results": dict(runtime.ingest_stats) if runtime else {}, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Stream degradation state and events",
+        operation_description=(
+            "Node CPU and mean encode latency as last sampled, the thresholds, the effective profile of every "
+            "stream this process runs (capture fps and resolution from the camera, output `fps` and `quality` "
+            "after degradation, and the degradation `level`), and the most recent degrade/restore events, newest "
+            "first. Cameras with priority 2 (high) are never degraded."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                name="limit",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Number of most recent events to return (default 50)",
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Degradation state",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "enabled": True,
+                            "thresholds": {"cpu_high": 0.85, "cpu_low": 0.6, "encode_ms_high": 50.0},
+                            "load": {"cpu": 0.91, "encode_ms": 14.2},
+                            "cameras": [
+                                {"camera_id": 1, "priority": 0, "capture_fps": 5, "width": 640, "height": 480,
+                                 "fps": 3.0, "quality": 60, "level": 2}
+                            ],
+                            "events": [
+                                {"time": 1760000000.1, "action": "degrade", "level": 2, "priority": 0, "camera_ids": [1, 4],
+                                 "fps_factor": 0.6, "quality_factor": 0.75, "reason": "node CPU 91% >= 85%"}
+                            ]
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="degradation")
+    def degradation(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 50))
+        except ValueError:
+            limit = 50
+        runtime = peek_runtime()
+        if runtime is None:
+            return Response({"results": {"cameras": [], "events": []}, "status": status.HTTP_200_OK})
+        return Response({"results": runtime.degradation.snapshot(limit), "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Instant replay buffer",
+        operation_description=(
+            "Usage of this node's replay arena: the shared-memory ring holding every streaming camera's recent "
+            "frames, and those of stopped cameras until they are evicted. The oldest frames of all cameras are "
+            "evicted first, so each keeps about the same `seconds` of history; replays and clips serve up to "
+            "STREAM_REPLAY_SECONDS of it. Replay at /api/replay/<camera_id>/?seconds=&speed= or download from "
+            "/api/replay/<camera_id>/clip/?seconds=&file_format=mjpeg|zip."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Replay arena usage",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "budget_mb": 256.0,
+                            "used_mb": 212.4,
+                            "frames": 9012,
+                            "max_frames": 65536,
+                            "oldest_frame_age": 61.3,
+                            "frames_evicted": 120455,
+                            "frames_carried_over": 3,
+                            "replay_seconds": 60.0,
+                            "cameras": {"1": {"live": True, "frames": 301, "bytes": 7421660, "seconds": 60.0}}
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="replay")
+    def replay(self, request):
+        runtime = peek_runtime()
+        if runtime is None:
+            return Response({"results": {"cameras": {}}, "status": status.HTTP_200_OK})
+        results = {**runtime.replay.snapshot(), "replay_seconds": settings.STREAM_REPLAY_SECONDS}
+        return Response({"results": results, "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Frame analytics results",
+        operation_description=(
+            "Latest result of each configured frame processor (STREAM_ANALYTICS_PROCESSORS) per streaming camera, "
+            "with the capture time of the analysed frame, plus per-processor batch counters. Processors only see "
+            "cameras while they are streaming."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Analytics results per camera",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "1": {"motion": {"result": {"level": 0.0132}, "captured_at": 1760000000.2,
+                                             "processed_at": 1760000000.5, "batch_size": 12}}
+                        },
+                        "scheduler": {
+                            "workers": 2,
+                            "pool_restarts": 0,
+                            "processors": [{"name": "motion", "path": "multi_cam_stream.analytics.MotionLevelProcessor",
+                                            "cameras": "all", "interval": 1.0, "in_flight": 0, "batches": 310,
+                                            "frames": 3720, "avg_batch_ms": 9.4, "skipped_passes": 0, "errors": 0}]
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="analytics")
+    def analytics(self, request):
+        runtime = peek_runtime()
+        scheduler = runtime.analytics if runtime else None
+        return Response({
+            "results": dict(runtime.analytics_results) if runtime else {},
+            "scheduler": scheduler.snapshot() if scheduler else None,
+            "status": status.HTTP_200_OK,
+        })
+
+    @swagger_auto_schema(
+        operation_summary="Section-switch latency traces (debug)",
+        operation_description=(
+            "Returns recent section-switch traces from this process with per-step timings "
+            "(db_query, subscribe, lock_wait, teardown, spawn, first_frame) and p50/p95 per step. "
+            "Only available when DEBUG is on or to staff users."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                name="limit",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description=f"Number of most recent traces to return (default 50, at most {TRACE_BUFFER_SIZE})",
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Trace summary and recent traces",
+                examples={
+                    "application/json": {
+                        "results": {
+                            "summary": {
+                                "db_query": {"count": 12, "p50_ms": 3.1, "p95_ms": 9.8, "max_ms": 11.2},
+                                "spawn": {"count": 30, "p50_ms": 14.5, "p95_ms": 41.0, "max_ms": 52.3}
+                            },
+                            "traces": []
+                        },
+                        "status": "200 OK"
+                    }
+                }
+            ),
+            403: openapi.Response(description="Not available outside DEBUG for non-staff users"),
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="traces")
+    def traces(self, request):
+        if not (settings.DEBUG or request.user.is_staff):
+            return Response(
+                {"message": "Traces are only available in DEBUG mode", "status": status.HTTP_403_FORBIDDEN},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            limit = min(max(int(request.query_params.get("limit", 50)), 0), TRACE_BUFFER_SIZE)
+        except ValueError:
+            limit = 50
+
+        runtime = peek_runtime()
+        if runtime is None:
+            return Response({"results": {"summary": {}, "traces": []}, "status": status.HTTP_200_OK})
+
+        runtime.tracer.resolve_first_frames(runtime.first_frame_times)
+        return Response({
+            "results": {"summary": runtime.tracer.summary(), "traces": runtime.tracer.recent(limit)},
+            "status": status.HTTP_200_OK,
+        })
+
+
+
+def parse_query_datetime(value):
+    """ISO 8601 date-time from a query parameter; naive values are in the server's time zone."""
+    try:
+        parsed = parse_datetime(value) if value else None
+    except ValueError:  # Well formed but out of range, e.g. hour 25
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class MotionEventViewSet(viewsets.ViewSet):
+    """
+    Searches the motion event timeline recorded by MotionEventProcessor.
+    """
+    lookup_value_regex = r"\d+"
+    @swagger_auto_schema(
+        operation_summary="Search motion events",
+        operation_description=(
+            "Returns the motion events of the given cameras that overlap `start`..`end`, oldest first. "
+            "Events are recorded while a camera streams with `multi_cam_stream.motion.MotionEventProcessor` "
+            "enabled in STREAM_ANALYTICS_PROCESSORS; an event still in progress shows its end as of the last save."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                name="start",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Range start, ISO 8601 (e.g. 2025-01-31T02:00). Without an offset, server local time.",
+                required=True
+            ),
+            openapi.Parameter(
+                name="end",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Range end, ISO 8601",
+                required=True
+            ),
+            openapi.Parameter(
+                name="cameras",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Comma-separated camera IDs, e.g. 12,13. All cameras if omitted.",
+                required=False
+            ),
+            openapi.Parameter(
+                name="min_intensity",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                description="Only events whose peak share of changed pixels (0..1) reaches this",
+                required=False
+            ),
+            openapi.Parameter(
+                name="limit",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description=f"Maximum events returned (default {MOTION_SEARCH_LIMIT}, at most {MOTION_SEARCH_MAX_LIMIT})",
+                required=False
+            ),
+            openapi.Parameter(
+                name="thumbnails",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_BOOLEAN,
+                description="Add `thumbnail_url` to events that have a thumbnail of their peak frame",
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Matching motion events",
+                examples={
+                    "application/json": {
+                        "results": [
+                            {
+                                "id": 5121,
+                                "camera_id": 12,
+                                "start_time": "2025-01-31T02:14:03.200000+05:30",
+                                "end_time": "2025-01-31T02:15:41.800000+05:30",
+                                "peak_intensity": 0.2133,
+                                "closed": True,
+                                "thumbnail_url": "/api/motion_events/5121/thumbnail/"
+                            }
+                        ],
+                        "count": 1,
+                        "status": 200
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description="Missing or invalid query parameter",
+                examples={
+                    "application/json": {
+                        "message": "start and end must be ISO 8601 date-times",
+                        "status": 400
+                    }
+                }
+            )
+        }
+    )
+    def list(self, request):
+        start = parse_query_datetime(request.query_params.get("start"))
+        end = parse_query_datetime(request.query_params.get("end"))
+        if start is None or end is None:
+            return Response(
+                {"message": "start and end must be ISO 8601 date-times", "status": status.HTTP_400_BAD_REQUEST},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            cameras = [int(c) for c in request.query_params.get("cameras", "").split(",") if c.strip()]
+            min_intensity = request.query_params.get("min_intensity")
+            min_intensity = float(min_intensity) if min_intensity else None
+            limit = min(int(request.query_params.get("limit", MOTION_SEARCH_LIMIT)), MOTION_SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {"message": "cameras, min_intensity and limit must be numbers", "status": status.HTTP_400_BAD_REQUEST},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        events = search_motion_events(start, end, cameras, min_intensity, max(limit, 0))
+        with_thumbnails = request.query_params.get("thumbnails", "").lower() in ("1", "true", "yes")
+        for event in events:
+            event["start_time"] = timezone.localtime(event["start_time"])
+            event["end_time"] = timezone.localtime(event["end_time"])
+            thumbnail = event.pop("thumbnail")
+            if with_thumbnails and thumbnail:
+                event["thumbnail_url"] = reverse("motion-event-thumbnail", args=[event["id"]])
+        return Response({"results": events, "count": len(events), "status": status.HTTP_200_OK})
+
+    @swagger_auto_schema(
+        operation_summary="Motion event thumbnail",
+        operation_description=(
+            "Returns a JPEG of the event's most active frame. While the event is still open the image may be "
+            "replaced by a more active frame, so it is only cacheable once the event has closed."
+        ),
+        responses={
+            200: openapi.Response(description="image/jpeg"),
+            404: openapi.Response(
+                description="Unknown event or no thumbnail",
+                examples={"application/json": {"message": "No thumbnail for this event", "status": 404}}
+            )
+        }
+    )
+    @action(detail=True, methods=["get"], url_path="thumbnail")
+    def thumbnail(self, request, pk=None):
+        name, closed = MotionEvent.objects.filter(id=pk).values_list("thumbnail", "closed").first() or (None, False)
+        try:
+            with open(motion_thumbnail_path(name), "rb") as f:
+                data = f.read()
+        except (OSError, TypeError):
+            return JsonResponse(
+                {"message": "No thumbnail for this event", "status": status.HTTP_404_NOT_FOUND},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        response = HttpResponse(data, content_type="image/jpeg")
+        # CCTV imagery stays out of shared caches; an open event's thumbnail is rewritten as its peak rises.
+        response["Cache-Control"] = "private, max-age=86400" if closed else "private, no-cache"
+        return response
 
 ################################################### End Code ###################################################
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+WebSocket frame transport: one socket carries frames for many cameras.
+
+Connect with ?token=<JWT access token>; required when STREAM_REQUIRE_SIGNED_URLS is on.
+
+Client -> server, JSON text messages:
+    {"action": "subscribe", "cameras": [1, 2, 3], "fps": 5, "priority": "grid"}
+    {"action": "unsubscribe", "cameras": [2]}
+
+Server -> client:
+    text    JSON events ("subscribed", "unsubscribed", "error")
+    binary  FRAME_HEADER (camera id, frame sequence, capture time in ms) followed by the JPEG
+
+"subscribed" reports each camera's admission state. Only admitted cameras send frames;
+cameras that were queued or rejected should be subscribed again after `retry_after` seconds.
+"""
+import json
+import time
+import struct
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .admission import ADMITTED, QUEUED, REJECTED, RETRY_AFTER, parse_priority
+from .fanout import STALL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+WS_PATH = "/ws/streams/"
+FRAME_HEADER = struct.Struct("!IIQ")  # camera id, frame sequence, capture time (ms since epoch); 16 bytes
+MAX_CAMERAS_PER_SOCKET = 64
+IDLE_WAKE = 1.0  # Seconds the sender sleeps when no frame is pending
+
+
+@sync_to_async
+def authenticate_socket(scope):
+    """Returns the token's user, None without a usable token."""
+    from users.authentication import authenticate_token
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return authenticate_token(query.get("token", [""])[0])
+
+
+@sync_to_async
+def stream_hub():
+    """This process's FrameHub; the first call starts the stream runtime, so it stays off the event loop."""
+    from .streaming import get_runtime
+
+    return get_runtime().hub
+
+
+@sync_to_async
+def start_streams(camera_ids, priority):
+    """Starts (through admission control) the cameras that exist; returns {camera_id: state}."""
+    from .models import Camera
+    from .streaming import get_runtime, get_stream_cluster, start_camera_process
+
+    runtime = get_runtime()
+    cluster = get_stream_cluster()
+    states = {}
+    cameras = {camera.id: camera for camera in Camera.objects.filter(id__in=camera_ids, is_active=True)}
+    for camera_id in camera_ids:
+        camera = cameras.get(camera_id)
+        if camera is None:
+            states[camera_id] = "not_found"
+        elif cluster and not cluster.is_local(camera_id):
+            states[camera_id] = "remote:" + cluster.stream_url(camera_id, WS_PATH)
+        else:
+            runtime.subscriptions.viewer_opened(camera_id)
+            states[camera_id] = start_camera_process(camera_id, camera.get_rtsp_url(), priority=priority).state
+            if states[camera_id] != ADMITTED:
+                runtime.subscriptions.viewer_closed(camera_id)  # Nothing to watch until the client retries
+    return states
+
+
+@sync_to_async
+def release_streams(camera_ids):
+    from .streaming import get_runtime, stop_camera_streams
+
+    if not camera_ids:
+        return
+    runtime = get_runtime()
+    unwanted = {camera_id for camera_id in camera_ids if runtime.subscriptions.viewer_closed(camera_id)}
+    stop_camera_streams(unwanted)
+
+
+class StreamSocket:
+    """One client connection: its viewer slots and the task that sends their frames."""
+
+    def __init__(self, send, client):
+        self.send = send
+        self.client = client
+        self.hub = None  # FrameHub, fetched on the first subscribe
+        self.slots = {}  # {camera_id: ViewerSlot}
+        self.next_due = {}  # {camera_id: monotonic time the next frame may go out}
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+
+    def _notify(self):
+        self.loop.call_soon_threadsafe(self.wake.set)
+
+    async def send_event(self, event, **data):
+        await self.send({"type": "websocket.send", "text": json.dumps({"event": event, **data})})
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            action = message["action"]
+            cameras = message.get("cameras", [])
+            if not isinstance(cameras, list):
+                raise TypeError("cameras must be a list")  # A string would be read one digit at a time
+            camera_ids = [int(camera_id) for camera_id in cameras]
+        except (ValueError, KeyError, TypeError):
+            await self.send_event("error", message="Expected {\"action\": ..., \"cameras\": [ids]}")
+            return
+
+        if action == "subscribe":
+            await self.subscribe(camera_ids, message.get("fps"), parse_priority(message.get("priority")))
+        elif action == "unsubscribe":
+            await self.unsubscribe(camera_ids)
+        else:
+            await self.send_event("error", message=f"Unknown action {action!r}")
+
+    async def subscribe(self, camera_ids, fps, priority):
+        new_ids = [camera_id for camera_id in dict.fromkeys(camera_ids) if camera_id not in self.slots]
+        if len(self.slots) + len(new_ids) > MAX_CAMERAS_PER_SOCKET:
+            await self.send_event("error", message=f"At most {MAX_CAMERAS_PER_SOCKET} cameras per socket")
+            return
+
+        target_fps = getattr(settings, "STREAM_TARGET_FPS", 5)
+        try:
+            fps = min(float(fps), target_fps) if fps else target_fps
+        except (TypeError, ValueError):
+            fps = target_fps
+        if fps <= 0:
+            fps = target_fps
+
+        if self.hub is None:
+            self.hub = await stream_hub()
+        states = await start_streams(new_ids, priority)
+        for camera_id, state in states.items():
+            if state != ADMITTED:
+                continue  # Not found, owned by another node, queued or rejected: no stream to open a slot on
+            slot = self.hub.open(camera_id, fps, self.client)
+            slot.listener = self._notify
+            self.slots[camera_id] = slot
+        await self.send_event(
+            "subscribed", cameras={str(camera_id): state for camera_id, state in states.items()}, fps=fps,
+            retry_after=RETRY_AFTER if any(state in (QUEUED, REJECTED) for state in states.values()) else None,
+        )
+
+    async def unsubscribe(self, camera_ids):
+        released = [camera_id for camera_id in camera_ids if camera_id in self.slots]
+        for camera_id in released:
+            self.hub.close(self.slots.pop(camera_id))
+            self.next_due.pop(camera_id, None)
+        await release_streams(released)
+        await self.send_event("unsubscribed", cameras=released)
+
+    async def pump(self):
+        """Sends each camera's newest frame, paced per camera; a slow socket skips frames instead of queueing them."""
+        while True:
+            self.wake.clear()
+            soonest = IDLE_WAKE
+            for camera_id, slot in list(self.slots.items()):
+                wait = self.next_due.get(camera_id, 0) - time.monotonic()
+                if wait > 0:
+                    soonest = min(soonest, wait)
+                    continue
+                frame = slot.take(0)
+                if frame is None:
+                    continue
+                seq, timestamp, jpeg = frame
+                header = FRAME_HEADER.pack(camera_id, seq & 0xFFFFFFFF, int(timestamp * 1000))
+                sent_at = time.monotonic()
+                try:
+                    await asyncio.wait_for(self.send({"type": "websocket.send", "bytes": header + jpeg}), STALL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    slot.stalled = True
+                    logger.warning(f"WebSocket client {self.client} stalled for {STALL_TIMEOUT}s; disconnecting")
+                    await self.send({"type": "websocket.close", "code": 1008})
+                    return
+                slot.mark_delivered(time.time())
+                self.next_due[camera_id] = sent_at + 1.0 / slot.fps
+                soonest = min(soonest, 1.0 / slot.fps)
+
+            try:
+                await asyncio.wait_for(self.wake.wait(), soonest)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        camera_ids = list(self.slots)
+        for slot in self.slots.values():
+            self.hub.close(slot)
+        self.slots.clear()
+        await release_streams(camera_ids)
+
+
+async def stream_socket(scope, receive, send):
+    """ASGI app for WS_PATH."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    user = await authenticate_socket(scope)
+    if user is None and settings.STREAM_REQUIRE_SIGNED_URLS:
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    await send({"type": "websocket.accept"})
+
+    client = (scope.get("client") or ("", 0))[0]
+    socket = StreamSocket(send, client)
+    pump = asyncio.create_task(socket.pump())
+    receiving = None
+    try:
+        while True:
+            # Waits on the sender too, so a socket it closed (or a crash) is noticed while the client is quiet.
+            receiving = asyncio.ensure_future(receive())
+            done, _ = await asyncio.wait({receiving, pump}, return_when=asyncio.FIRST_COMPLETED)
+            if pump in done:
+                if pump.exception() is not None:
+                    logger.error(f"WebSocket sender for client {client} failed: {pump.exception()}")
+                    await send({"type": "websocket.close", "code": 1011})
+                break  # Otherwise closed for stalling
+            message = receiving.result()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                await socket.handle(message["text"])
+    finally:
+        pump.cancel()
+        if receiving is not None:
+            receiving.cancel()
+        await socket.close()
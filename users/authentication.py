@@ -0,0 +1,204 @@
+"""
+Stateless JWT authentication. Access tokens carry the user's id, username and staff flags,
+so requests are authenticated without a session or user lookup. Decoded tokens are kept in
+a small in-process cache, and a Redis revocation list handles logout and password resets.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+import redis
+from django.conf import settings
+from rest_framework import exceptions, status
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------
+# Constants
+# -----------------------------------------
+SESSION_CLAIM = "sid"  # Jti of the refresh token an access token was derived from
+REVOKED_SESSION_KEY = "jwt:revoked:sid:{}"
+NOT_BEFORE_KEY = "jwt:not_before:{}"  # Tokens of this user issued before this time are revoked
+
+
+class RevocationUnavailable(exceptions.APIException):
+    """Raised for a token that is due for a revocation check while Redis is unreachable."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Token revocation list unavailable, try again shortly."
+    default_code = "revocation_unavailable"
+
+
+# -----------------------------------------
+# FUNCTION: Issuing Tokens
+# -----------------------------------------
+def issue_tokens(user):
+    """Returns a refresh/access pair carrying the claims TokenUser reads."""
+    refresh = RefreshToken.for_user(user)
+    refresh[SESSION_CLAIM] = refresh[api_settings.JTI_CLAIM]
+    refresh["username"] = user.username
+    refresh["is_staff"] = user.is_staff
+    refresh["is_superuser"] = user.is_superuser
+    return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+
+# -----------------------------------------
+# FUNCTION: Revocation List
+# -----------------------------------------
+class RevocationList:
+    """
+    Revoked login sessions and per-user "not before" times in Redis. Keys expire with the
+    refresh token lifetime, so the list only ever holds tokens that could still be used.
+    """
+
+    def __init__(self, redis_url):
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+
+    def revoke_session(self, token):
+        """Revokes a refresh token together with every access token derived from it."""
+        ttl = max(int(token["exp"] - time.time()), 1)
+        self.redis.set(REVOKED_SESSION_KEY.format(token[SESSION_CLAIM]), 1, ex=ttl)
+
+    def revoke_user(self, user_id):
+        ttl = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+        self.redis.set(NOT_BEFORE_KEY.format(user_id), int(time.time()), ex=ttl)
+
+    def is_revoked(self, token):
+        revoked, not_before = self.redis.mget(
+            REVOKED_SESSION_KEY.format(token.get(SESSION_CLAIM)),
+            NOT_BEFORE_KEY.format(token.get(api_settings.USER_ID_CLAIM)),
+        )
+        # Tokens issued in the same second as a password reset are kept, so an immediate re-login works.
+        return revoked is not None or (not_before is not None and token.get("iat", 0) < int(not_before))
+
+
+_revocations = None
+_revocations_lock = threading.Lock()
+
+
+def get_revocation_list():
+    global _revocations
+    with _revocations_lock:
+        if _revocations is None:
+            _revocations = RevocationList(settings.JWT_REVOCATION_REDIS_URL)
+        return _revocations
+
+
+def revoke_session(token):
+    get_revocation_list().revoke_session(token)
+    _claims_cache.clear()  # Other workers notice within JWT_REVOCATION_CHECK_INTERVAL
+
+
+def revoke_user_tokens(user_id):
+    get_revocation_list().revoke_user(user_id)
+    _claims_cache.clear()
+
+
+# -----------------------------------------
+# FUNCTION: Claims Cache
+# -----------------------------------------
+class ClaimsCache:
+    """LRU of raw token -> (user, token, last revocation check), so a token is decoded once per worker."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is not None:
+                self._entries.move_to_end(raw_token)
+            return entry
+
+    def put(self, raw_token, user, token, checked_at):
+        with self._lock:
+            self._entries[raw_token] = (user, token, checked_at)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, raw_token):
+        with self._lock:
+            self._entries.pop(raw_token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_claims_cache = ClaimsCache(getattr(settings, "JWT_CLAIMS_CACHE_SIZE", 2048))
+
+
+class CachedJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Bearer token authentication without DB access: request.user is a TokenUser built from
+    the token's claims. Revocation is rechecked at most every JWT_REVOCATION_CHECK_INTERVAL
+    seconds per token. If Redis is unreachable, tokens checked within the interval are still
+    accepted; tokens due for a check get a 503, unless JWT_REVOCATION_FAIL_OPEN accepts them.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.authenticate_raw(raw_token)
+
+    def authenticate_raw(self, raw_token):
+        now = time.time()
+        entry = _claims_cache.get(raw_token)
+        if entry is not None and entry[1]["exp"] <= now:
+            _claims_cache.discard(raw_token)
+            entry = None
+        if entry is None:
+            token = self.get_validated_token(raw_token)
+            user, checked_at = self.get_user(token), 0
+        else:
+            user, token, checked_at = entry
+
+        if now - checked_at >= settings.JWT_REVOCATION_CHECK_INTERVAL:
+            try:
+                revoked = get_revocation_list().is_revoked(token)
+            except redis.RedisError as e:
+                logger.warning(f"Token revocation list unavailable: {e}")
+                if not settings.JWT_REVOCATION_FAIL_OPEN:
+                    raise RevocationUnavailable()
+                # Accepted unchecked; checked_at stays stale, so the next request checks again.
+                revoked = None
+            if revoked:
+                _claims_cache.discard(raw_token)
+                raise InvalidToken("Token has been revoked")
+            if revoked is not None:
+                checked_at = now
+        _claims_cache.put(raw_token, user, token, checked_at)
+        return user, token
+
+
+_authenticator = CachedJWTAuthentication()
+
+
+def authenticate_token(raw_token):
+    """Returns the TokenUser for a raw access token, or None if it is invalid, expired or revoked."""
+    if not raw_token:
+        return None
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    try:
+        return _authenticator.authenticate_raw(raw_token)[0]
+    except (InvalidToken, TokenError, RevocationUnavailable):
+        return None
+
+
+def authenticate_bearer(request):
+    """Stream variant of CachedJWTAuthentication for plain Django views and middleware."""
+    header = request.META.get(api_settings.AUTH_HEADER_NAME, "").split()
+    if len(header) != 2 or header[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    return authenticate_token(header[1])
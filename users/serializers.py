@@ -54,3 +54,8 @@ class PasswordResetSerializer(serializers.Serializer):
         if data['new_password'] != data['confirm_password']:
             raise serializers.ValidationError({"confirm_password": "Passwords do not match."})
         return data
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for token refresh and logout"""
+    refresh = serializers.CharField()
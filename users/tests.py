@@ -1,3 +1,122 @@
-from django.test import TestCase
+import time
+from unittest import mock
+import redis
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from . import authentication
+from .authentication import (
+    RevocationList, RevocationUnavailable, authenticate_token, issue_tokens, revoke_session, SESSION_CLAIM,
+)
+from .models import User
 
-# Create your tests here.
+
+# -----------------------------------------
+# JWT Revocation
+# -----------------------------------------
+@override_settings(JWT_REVOCATION_CHECK_INTERVAL=5, JWT_REVOCATION_FAIL_OPEN=False)
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="alice", email="alice@example.com", password="secret")
+        self.access = issue_tokens(self.user)["access"]
+        authentication._claims_cache.clear()
+        self.addCleanup(authentication._claims_cache.clear)
+        self.revocations = mock.Mock()
+        self.revocations.is_revoked.return_value = False
+        patcher = mock.patch.object(authentication, "get_revocation_list", return_value=self.revocations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def authenticate(self, at=None):
+        with mock.patch.object(authentication.time, "time", return_value=at or time.time()):
+            return authenticate_token(self.access)
+
+    def test_valid_token_authenticates_without_a_user_lookup(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+
+        self.assertEqual(user.username, "alice")
+
+    def test_revoked_token_is_rejected(self):
+        self.revocations.is_revoked.return_value = True
+
+        self.assertIsNone(self.authenticate())
+
+    def test_revocation_is_checked_once_per_interval(self):
+        now = time.time()
+        self.authenticate(now)
+        self.authenticate(now + 1)
+        self.assertEqual(self.revocations.is_revoked.call_count, 1)
+
+        self.authenticate(now + 6)
+        self.assertEqual(self.revocations.is_revoked.call_count, 2)
+
+    def test_token_revoked_after_its_last_check_is_rejected_at_the_next_check(self):
+        now = time.time()
+        self.assertIsNotNone(self.authenticate(now))
+        self.revocations.is_revoked.return_value = True
+
+        self.assertIsNotNone(self.authenticate(now + 1))  # Still within the check interval
+        self.assertIsNone(self.authenticate(now + 6))
+
+    def test_unreachable_redis_fails_closed_for_tokens_due_for_a_check(self):
+        self.revocations.is_revoked.side_effect = redis.ConnectionError("down")
+
+        with self.assertRaises(RevocationUnavailable):
+            authentication._authenticator.authenticate_raw(self.access.encode())
+        self.assertIsNone(self.authenticate())
+
+    def test_unreachable_redis_keeps_tokens_checked_within_the_interval(self):
+        now = time.time()
+        self.authenticate(now)
+        self.revocations.is_revoked.side_effect = redis.ConnectionError("down")
+
+        self.assertIsNotNone(self.authenticate(now + 1))
+        self.assertIsNone(self.authenticate(now + 6))
+
+    @override_settings(JWT_REVOCATION_FAIL_OPEN=True)
+    def test_fail_open_accepts_tokens_but_checks_again_next_time(self):
+        now = time.time()
+        self.revocations.is_revoked.side_effect = redis.ConnectionError("down")
+
+        self.assertIsNotNone(self.authenticate(now))
+        self.assertIsNotNone(self.authenticate(now + 1))
+        self.assertEqual(self.revocations.is_revoked.call_count, 2)
+
+    def test_logout_drops_cached_checks(self):
+        now = time.time()
+        self.authenticate(now)
+        self.revocations.is_revoked.return_value = True
+
+        revoke_session({"exp": now + 60, SESSION_CLAIM: "abc"})
+
+        self.assertIsNone(self.authenticate(now + 1))
+
+
+class RevocationListTests(TestCase):
+    def setUp(self):
+        self.revocations = RevocationList("redis://localhost:6379/3")
+        self.revocations.redis = mock.Mock()
+        self.token = {SESSION_CLAIM: "abc", "user_id": 7, "iat": 1000}
+
+    def test_revoked_session(self):
+        self.revocations.redis.mget.return_value = [b"1", None]
+
+        self.assertTrue(self.revocations.is_revoked(self.token))
+
+    def test_tokens_issued_before_a_password_reset_are_revoked(self):
+        self.revocations.redis.mget.return_value = [None, b"1001"]
+        self.assertTrue(self.revocations.is_revoked(self.token))
+
+        # Issued in the same second as the reset: an immediate re-login keeps working.
+        self.revocations.redis.mget.return_value = [None, b"1000"]
+        self.assertFalse(self.revocations.is_revoked(self.token))
+
+    def test_revoke_session_expires_with_the_token(self):
+        token = AccessToken()
+        token[SESSION_CLAIM] = "abc"
+
+        self.revocations.revoke_session(token)
+
+        key, value = self.revocations.redis.set.call_args.args
+        self.assertEqual(key, authentication.REVOKED_SESSION_KEY.format("abc"))
+        self.assertLessEqual(self.revocations.redis.set.call_args.kwargs["ex"], token.lifetime.total_seconds())
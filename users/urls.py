@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserAPIView, LoginAPIView, PasswordResetAPIView
+from .views import UserAPIView, LoginAPIView, LogoutAPIView, TokenRefreshAPIView, PasswordResetAPIView
 
 # Create a router and register UserAPIView
 router = DefaultRouter()
@@ -9,5 +9,7 @@ router.register(r'users', UserAPIView, basename='user')
 urlpatterns = [
     path('', include(router.urls)),  # Include the router URLs
     path('login/', LoginAPIView.as_view(), name='user-login'),
+    path('logout/', LogoutAPIView.as_view(), name='user-logout'),
+    path('token/refresh/', TokenRefreshAPIView.as_view(), name='token-refresh'),
     path('password-reset/', PasswordResetAPIView.as_view(), name='password-reset'),
 ]
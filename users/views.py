@@ -2,11 +2,16 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from HUL_CCTV_PROJ.api_schema import swagger_auto_schema, openapi
 from django.contrib.auth import get_user_model
 
-from .serializers import UserSerializer, UserLoginSerializer, PasswordResetSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+import redis
+
+from .serializers import UserSerializer, UserLoginSerializer, PasswordResetSerializer, RefreshTokenSerializer
+from .authentication import SESSION_CLAIM, issue_tokens, get_revocation_list, revoke_session, revoke_user_tokens
 
 User = get_user_model()
 
@@ -81,16 +86,31 @@ class LoginAPIView(APIView):
     """
 
     permission_classes = [AllowAny]
+    authentication_classes = []  # A stale token must not block logging in again
 
     @swagger_auto_schema(
         operation_summary="User login",
+        operation_description="Returns an access token for the Authorization: Bearer header and a refresh token.",
         request_body=UserLoginSerializer,
-        responses={200: "Login successful", 400: "Invalid credentials"}
+        responses={
+            200: openapi.Response(
+                description="Login successful",
+                examples={
+                    "application/json": {
+                        "message": "Login successful",
+                        "results": {"access": "eyJhbGciOi...", "refresh": "eyJhbGciOi..."},
+                        "status": 200
+                    }
+                }
+            ),
+            400: "Invalid credentials"
+        }
     )
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
-            return Response({"message": "Login successful", "status": status.HTTP_200_OK})
+            tokens = issue_tokens(serializer.validated_data)
+            return Response({"message": "Login successful", "results": tokens, "status": status.HTTP_200_OK})
         return Response({"message": "Invalid username or password", "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -100,6 +120,7 @@ class PasswordResetAPIView(APIView):
     """
 
     permission_classes = [AllowAny]
+    authentication_classes = []
 
     @swagger_auto_schema(
         operation_summary="Reset user password using username",
@@ -119,6 +140,76 @@ class PasswordResetAPIView(APIView):
 
             user.set_password(new_password)
             user.save()
+            try:
+                revoke_user_tokens(user.pk)
+            except redis.RedisError as e:
+                return Response(
+                    {"message": f"Password changed, but existing logins could not be revoked: {e}", "status": status.HTTP_503_SERVICE_UNAVAILABLE},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
             return Response({"message": "Password reset successful", "status": status.HTTP_200_OK})
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TokenRefreshAPIView(APIView):
+    """
+    API for exchanging a refresh token for a new access token.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_summary="Refresh access token",
+        request_body=RefreshTokenSerializer,
+        responses={200: "New access token", 401: "Refresh token invalid, expired or revoked"}
+    )
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = RefreshToken(serializer.validated_data['refresh'])
+        except TokenError as e:
+            return Response({"message": str(e), "status": status.HTTP_401_UNAUTHORIZED}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            revoked = get_revocation_list().is_revoked(refresh)
+        except redis.RedisError as e:
+            return Response({"message": f"Token revocation list unavailable: {e}", "status": status.HTTP_503_SERVICE_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # Refreshing is rare, so this is where a deleted or deactivated user is caught.
+        if revoked or not User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM), is_active=True).exists():
+            return Response({"message": "Token has been revoked", "status": status.HTTP_401_UNAUTHORIZED}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"results": {"access": str(refresh.access_token)}, "status": status.HTTP_200_OK})
+
+
+class LogoutAPIView(APIView):
+    """
+    API for logging out: revokes the refresh token and every access token issued from it.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # Logging out must work with an expired access token
+
+    @swagger_auto_schema(
+        operation_summary="User logout",
+        request_body=RefreshTokenSerializer,
+        responses={200: "Logout successful", 400: "Invalid refresh token"}
+    )
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = RefreshToken(serializer.validated_data['refresh'])
+        except TokenError as e:
+            return Response({"message": str(e), "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
+        if SESSION_CLAIM not in refresh:
+            return Response({"message": "Token was not issued by login", "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            revoke_session(refresh)
+        except redis.RedisError as e:
+            return Response({"message": f"Token revocation list unavailable: {e}", "status": status.HTTP_503_SERVICE_UNAVAILABLE}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"message": "Logout successful", "status": status.HTTP_200_OK})